@@ -0,0 +1,285 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+from groq import AsyncGroq
+from client_registry import get_async_client
+from conversation_history import ConversationHistory
+from itinerary_cache import ItineraryCache
+from itinerary_sections import section_prompts
+from metrics import record_speculation
+from model_router import ModelRouter
+from destination_facts import FactStore
+from relevance import RelevanceFilter
+from resilient_client import AsyncResilientClient, LLMError, aclose_stream
+from slot_extractor import parse_extraction
+from slots import GREETING, fallback_prompt
+from structured_itinerary import PlanRenderer
+from travel_planner_bot import BaseTravelPlanner, REVISION_MAX_TOKENS
+
+
+class AsyncTravelPlannerBot(BaseTravelPlanner):
+    """asyncio counterpart of ``TravelPlannerBot``.
+
+    Slot filling and prompt building come from ``BaseTravelPlanner``; only the
+    model calls differ, so one event loop can drive many sessions at once.
+    Itinerary cache reads and writes block, so they run in a worker thread.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, client: Optional[AsyncGroq] = None,
+                 cache: Optional[ItineraryCache] = None,
+                 history: Optional[ConversationHistory] = None, sectioned: bool = False,
+                 llm_extraction: bool = False, speculative: bool = False,
+                 relevance: Optional[RelevanceFilter] = None, fact_store: Optional[FactStore] = None,
+                 structured: bool = False, router: Optional[ModelRouter] = None):
+        super().__init__(cache, history, sectioned=sectioned, llm_extraction=llm_extraction,
+                         speculative=speculative, relevance=relevance, fact_store=fact_store,
+                         structured=structured, router=router)
+        # Without an explicit ``client``, borrow the process-wide pooled one
+        if client is None:
+            client = get_async_client(api_key)
+        self.client = client if isinstance(client, AsyncResilientClient) else AsyncResilientClient(client)
+
+    async def get_model_response(self, prompt: str, call_type: str = 'chat',
+                                 max_tokens: Optional[int] = None) -> str:
+        messages = self._build_messages(prompt, call_type)
+        call = self._route(call_type, max_tokens=max_tokens)
+        while True:
+            started = time.perf_counter()
+            try:
+                chat_completion = await self.client.chat.completions.create(messages=messages, **call.options())
+            except LLMError as e:
+                call = self._failover(call, e, time.perf_counter() - started)
+                continue
+            self.router.record(call, time.perf_counter() - started)
+            return chat_completion.choices[0].message.content
+
+    async def stream_model_response(self, prompt: str, call_type: str = 'chat',
+                                    max_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        started = time.perf_counter()
+        messages = self._build_messages(prompt, call_type)
+        call = self._route(call_type, stream=True, max_tokens=max_tokens)
+        while True:
+            attempt = time.perf_counter()
+            first_token = None
+            try:
+                stream = await self.client.chat.completions.create(messages=messages, **call.options())
+                try:
+                    async for chunk in stream:
+                        if not chunk.choices:
+                            continue
+                        content = chunk.choices[0].delta.content
+                        if not content:
+                            continue
+                        if first_token is None:
+                            first_token = time.perf_counter() - attempt
+                            self.router.record(call, first_token)
+                        if self.last_time_to_first_token is None:
+                            self.last_time_to_first_token = time.perf_counter() - started
+                        yield content
+                finally:
+                    await aclose_stream(stream)
+            except LLMError as e:
+                if first_token is not None:
+                    raise
+                call = self._failover(call, e, time.perf_counter() - attempt)
+                continue
+            if first_token is None:
+                self.router.record(call, time.perf_counter() - attempt)
+            return
+
+    async def stream_plan(self, prompt: str, renderer: PlanRenderer) -> AsyncIterator[str]:
+        async for chunk in self.stream_model_response(prompt, 'structured'):
+            text = renderer.feed(chunk)
+            if text:
+                yield text
+        rest = renderer.close()
+        if rest:
+            yield rest
+
+    async def _extract_with_model(self, user_input: str) -> Optional[Dict[str, object]]:
+        if not self._wants_model_extraction(user_input):
+            return None
+        try:
+            return parse_extraction(await self.get_model_response(self._extraction_prompt(user_input), 'extract'))
+        except LLMError:
+            return None
+
+    def _speculate(self):
+        """Start the sections the profile already supports as tasks on the running loop."""
+        for part in self._speculative_parts():
+            self.speculation.start(part.prompt, lambda prompt: asyncio.ensure_future(
+                self.get_model_response(prompt, 'section', part.max_tokens)
+            ))
+
+    async def get_next_question(self) -> str:
+        if self.conversation_state == 'init':
+            self.conversation_state = 'name'
+            if not any(self.user_info.values()):
+                return GREETING
+
+        slot = self._next_slot()
+        if slot is None:
+            return await self.generate_itinerary()
+        if slot.question is not None:
+            return slot.question
+        return await self.get_model_response(fallback_prompt(slot.field), 'slot')
+
+    async def process_input(self, user_input: str) -> str:
+        with self._observed_turn():
+            if self.conversation_state == 'follow_up':
+                reply = "".join([chunk async for chunk in self._follow_up(user_input)])
+            else:
+                reply = self._apply_input(user_input, await self._extract_with_model(user_input))
+                self._speculate()
+                if reply is None:
+                    reply = self._acknowledgement() + await self.get_next_question()
+        self._record_exchange(user_input, reply)
+        return reply
+
+    async def process_input_stream(self, user_input: str) -> AsyncIterator[str]:
+        self.last_time_to_first_token = None
+        reply = []
+        with self._observed_turn():
+            async for chunk in self._stream_reply(user_input):
+                reply.append(chunk)
+                yield chunk
+        self._record_exchange(user_input, "".join(reply))
+
+    async def _stream_reply(self, user_input: str) -> AsyncIterator[str]:
+        if self.conversation_state == 'follow_up':
+            async for chunk in self._follow_up(user_input):
+                yield chunk
+            return
+        error = self._apply_input(user_input, await self._extract_with_model(user_input))
+        self._speculate()
+        if error is not None:
+            yield error
+        elif not self.is_complete():
+            yield self._acknowledgement() + await self.get_next_question()
+        else:
+            async for chunk in self.generate_itinerary_stream():
+                yield chunk
+
+    async def _follow_up(self, user_input: str) -> AsyncIterator[str]:
+        plan = self._plan_follow_up(user_input)
+        if plan.answer is not None:
+            yield plan.answer
+        elif plan.kind == 'question':
+            async for chunk in self.stream_model_response(self._answer_prompt(user_input, plan), 'follow_up'):
+                yield chunk
+        elif plan.kind == 'revise':
+            yield self._apply_revisions(plan, await self._revise(self._revision_prompts(user_input, plan)))
+        elif plan.kind == 'profile':
+            async for chunk in self.generate_itinerary_stream():
+                yield chunk
+        else:
+            renderer = self._plan_renderer()
+            if renderer is not None:
+                source = self.stream_plan(self._replan_prompt(user_input), renderer)
+            else:
+                source = self.stream_model_response(self._replan_prompt(user_input), 'itinerary')
+            chunks = []
+            async for chunk in source:
+                chunks.append(chunk)
+                yield chunk
+            self._keep_itinerary("".join(chunks), renderer.plan if renderer is not None else None)
+
+    async def _remember_itinerary(self, itinerary: str, plan: Optional[Dict[str, Any]] = None):
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put, self.user_info, itinerary, self._output_mode(), plan)
+        self._keep_itinerary(itinerary, plan)
+
+    async def _revise(self, prompts: List[str]) -> List[str]:
+        return list(await asyncio.gather(*(self.get_model_response(prompt, 'section', REVISION_MAX_TOKENS)
+                                           for prompt in prompts)))
+
+    async def generate_itinerary(self) -> str:
+        if not self.is_complete():
+            return await self.get_next_question()
+
+        stored, similar = await asyncio.to_thread(self._look_up)
+        cached = self._cached_itinerary(stored, similar)
+        if cached is not None:
+            self._keep_itinerary(cached.text, cached.plan)
+            return cached.text
+        adaptation = self._adaptation(similar)
+        renderer = None
+        if adaptation is not None:
+            itinerary = self._adapted_itinerary(adaptation, await self._revise(adaptation.prompts))
+        elif self.structured:
+            renderer = self._plan_renderer()
+            itinerary = renderer.feed(await self.get_model_response(self._build_itinerary_prompt(), 'structured'))
+            itinerary += renderer.close()
+        elif self.sectioned:
+            itinerary = "".join([part async for part in self.generate_sections()])
+        else:
+            itinerary = await self.get_model_response(self._build_itinerary_prompt(), 'itinerary')
+        await self._remember_itinerary(itinerary, renderer.plan if renderer is not None else None)
+        return itinerary
+
+    async def generate_itinerary_stream(self) -> AsyncIterator[str]:
+        if not self.is_complete():
+            yield await self.get_next_question()
+            return
+
+        stored, similar = await asyncio.to_thread(self._look_up)
+        cached = self._cached_itinerary(stored, similar)
+        if cached is not None:
+            self._keep_itinerary(cached.text, cached.plan)
+            yield cached.text
+            return
+        adaptation = self._adaptation(similar)
+        if adaptation is not None:
+            itinerary = self._adapted_itinerary(adaptation, await self._revise(adaptation.prompts))
+            await self._remember_itinerary(itinerary)
+            yield itinerary
+            return
+        renderer = self._plan_renderer()
+        if renderer is not None:
+            source = self.stream_plan(self._build_itinerary_prompt(), renderer)
+        elif self.sectioned:
+            source = self.generate_sections()
+        else:
+            source = self.stream_model_response(self._build_itinerary_prompt(), 'itinerary')
+        chunks = []
+        async for chunk in source:
+            chunks.append(chunk)
+            yield chunk
+        await self._remember_itinerary("".join(chunks), renderer.plan if renderer is not None else None)
+
+    async def generate_sections(self) -> AsyncIterator[str]:
+        """Concurrent per-section generation, yielded in itinerary order."""
+        started = time.perf_counter()
+        parts = section_prompts(self.user_info, facts=self._destination_facts())
+        tasks = []
+        speculative = set()
+        for part in parts:
+            task = self._take_speculative(part.prompt)
+            if task is None:
+                task = asyncio.ensure_future(self.get_model_response(part.prompt, 'section', part.max_tokens))
+            else:
+                speculative.add(task)
+            tasks.append(task)
+        self.cancel_speculation('stale')
+        try:
+            for index, (part, task) in enumerate(zip(parts, tasks)):
+                try:
+                    text = await task
+                except LLMError:
+                    if task not in speculative:
+                        raise
+                    speculative.discard(task)
+                    record_speculation('failed')
+                    text = await self.get_model_response(part.prompt, 'section', part.max_tokens)
+                else:
+                    if task in speculative:
+                        speculative.discard(task)
+                        record_speculation('used')
+                if self.last_time_to_first_token is None:
+                    self.last_time_to_first_token = time.perf_counter() - started
+                yield ("\n\n" if index else "") + f"{part.heading}\n{text.strip()}"
+        finally:
+            for task in tasks:
+                task.cancel()
+            if speculative:
+                record_speculation('cancelled', len(speculative))
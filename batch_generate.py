@@ -0,0 +1,223 @@
+"""Generate itineraries in bulk from a CSV or JSONL file of traveler profiles.
+
+    python batch_generate.py profiles.csv itineraries.jsonl --concurrency 8
+
+Each input row needs name, email, destination, source, days, budget and
+dates (an optional ``id`` column identifies the row; otherwise its position
+is used). Rows are read and results written one at a time, so the input can
+be arbitrarily large. Every result is one JSON line with ``status`` set to
+``ok``, ``invalid`` (including JSONL lines that are not a JSON object) or
+``error`` (a model error, or anything else that went wrong with that row).
+
+Completed row ids are appended to a checkpoint file after their result has
+been written; re-running the same command after a crash skips them. Rows
+that failed with ``error`` are not checkpointed, so a re-run retries them
+and appends another line for the same id: the last line written for an id
+is its result. All workers share one rate-limited client, so
+``--concurrency`` beyond what the ``--requests-per-minute``/
+``--tokens-per-minute`` limits allow only queues.
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, Optional, Set, Tuple, Union
+
+from dotenv import load_dotenv
+
+from client_registry import BACKENDS, PoolLimits, get_client, requires_api_key, shutdown
+from itinerary_cache import ItineraryCache
+from itinerary_similarity import ADAPT_THRESHOLD, REUSE_THRESHOLD, SimilarityIndex
+from metrics import enable_event_log, write_metrics
+from resilient_client import (
+    LLMError, REQUESTS_PER_MINUTE, ResiliencePolicy, ResilientClient, TOKENS_PER_MINUTE
+)
+from slots import SLOTS
+from travel_planner_bot import TravelPlannerBot
+
+
+def read_jsonl(f) -> Iterator[Union[Dict[str, Any], str]]:
+    """Each non-blank line as a dict, or as a description of why it is not one."""
+    for line_number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield f"line {line_number}: not valid JSON ({e})"
+            continue
+        yield row if isinstance(row, dict) else f"line {line_number}: expected a JSON object"
+
+
+def read_profiles(path: str) -> Iterator[Tuple[str, Union[Dict[str, Any], str]]]:
+    """Yield (row id, raw profile) pairs from a .csv or .jsonl file; an unreadable
+    row comes with the reason instead of a profile."""
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = csv.DictReader(f) if path.lower().endswith('.csv') else read_jsonl(f)
+        for number, row in enumerate(rows, 1):
+            if isinstance(row, str):
+                yield str(number), row
+            else:
+                yield str(row.get('id') or number), row
+
+
+def validate_profile(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Apply the same parsing and validation as the interactive intake."""
+    profile = {}
+    for slot in SLOTS:
+        value = raw.get(slot.field)
+        if value is None or not str(value).strip():
+            raise ValueError(f"missing {slot.field}")
+        profile[slot.field] = slot.parse(str(value))
+    return profile
+
+
+def load_checkpoint(path: str) -> Set[str]:
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding='utf-8') as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+class BatchGenerator:
+    def __init__(self, client: ResilientClient, cache: Optional[ItineraryCache] = None,
+                 sectioned: bool = False, structured: bool = False):
+        self.client = client
+        self.cache = cache
+        self.sectioned = sectioned
+        self.structured = structured
+
+    def generate(self, row_id: str, raw: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            return self._generate(row_id, raw)
+        except Exception as e:
+            # One bad row must not take the rest of the run down with it
+            return {'id': row_id, 'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+
+    def _generate(self, row_id: str, raw: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            profile = validate_profile(raw)
+        except ValueError as e:
+            return {'id': row_id, 'status': 'invalid', 'error': str(e)}
+
+        bot = TravelPlannerBot(client=self.client, cache=self.cache, sectioned=self.sectioned,
+                               structured=self.structured)
+        bot.user_info.update(profile)
+        try:
+            itinerary = bot.generate_itinerary()
+        except LLMError as e:
+            return {'id': row_id, 'status': 'error', 'error': str(e)}
+        result = {'id': row_id, 'status': 'ok', 'profile': profile, 'itinerary': itinerary}
+        if bot.plan is not None:
+            check = bot.budget_check()
+            result['plan'] = bot.plan
+            result['budget_check'] = check._asdict() if check is not None else None
+        return result
+
+    def run(self, input_path: str, output_path: str, checkpoint_path: str,
+            concurrency: int = 4) -> Dict[str, Any]:
+        done = load_checkpoint(checkpoint_path)
+        counts = {'ok': 0, 'invalid': 0, 'error': 0, 'skipped': 0}
+        started = time.perf_counter()
+
+        with open(output_path, 'a', encoding='utf-8') as output, \
+                open(checkpoint_path, 'a', encoding='utf-8') as checkpoint, \
+                ThreadPoolExecutor(max_workers=concurrency) as executor:
+
+            def write(result: Dict[str, Any]):
+                output.write(json.dumps(result, ensure_ascii=False) + '\n')
+                output.flush()
+                # Only checkpoint a row once its result is safely on disk
+                if result['status'] != 'error':
+                    checkpoint.write(result['id'] + '\n')
+                    checkpoint.flush()
+                counts[result['status']] += 1
+
+            pending: Set[Future] = set()
+            for row_id, raw in read_profiles(input_path):
+                if row_id in done:
+                    counts['skipped'] += 1
+                    continue
+                if isinstance(raw, str):
+                    write({'id': row_id, 'status': 'invalid', 'error': raw})
+                    continue
+                # Keep at most ``concurrency`` rows in flight so memory stays bounded
+                while len(pending) >= concurrency:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        write(future.result())
+                pending.add(executor.submit(self.generate, row_id, raw))
+            for future in wait(pending).done:
+                write(future.result())
+
+        elapsed = time.perf_counter() - started
+        processed = counts['ok'] + counts['invalid'] + counts['error']
+        counts['elapsed_seconds'] = round(elapsed, 2)
+        counts['profiles_per_minute'] = round(processed / elapsed * 60, 1) if elapsed else 0.0
+        return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate itineraries for a file of traveler profiles")
+    parser.add_argument('input', help="profiles as .csv or .jsonl")
+    parser.add_argument('output', help="results are appended here as JSONL")
+    parser.add_argument('--checkpoint', help="completed row ids (default: <output>.checkpoint)")
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--sectioned', action='store_true',
+                        help="generate each itinerary as concurrent per-section requests")
+    parser.add_argument('--structured', action='store_true',
+                        help="generate JSON plans; results also carry the plan and its budget check")
+    parser.add_argument('--requests-per-minute', type=float, default=REQUESTS_PER_MINUTE)
+    parser.add_argument('--tokens-per-minute', type=float, default=TOKENS_PER_MINUTE)
+    parser.add_argument('--backend', choices=BACKENDS,
+                        help="model backend; 'fake' runs offline (default: $TRAVEL_PLANNER_BACKEND or groq)")
+    parser.add_argument('--similar', action='store_true',
+                        help="reuse or adapt itineraries stored for similar profiles")
+    parser.add_argument('--reuse-threshold', type=float, default=REUSE_THRESHOLD,
+                        help="similarity at which a stored itinerary is served as is")
+    parser.add_argument('--adapt-threshold', type=float, default=ADAPT_THRESHOLD,
+                        help="similarity at which a stored itinerary is adapted instead of regenerated")
+    parser.add_argument('--metrics-file', help="write Prometheus metrics here when done")
+    parser.add_argument('--log-events', action='store_true',
+                        help="log every model call as a JSON line on stderr")
+    args = parser.parse_args()
+
+    if args.log_events:
+        enable_event_log()
+    load_dotenv()
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key and requires_api_key(args.backend):
+        print("Error: GROQ_API_KEY not found in environment variables")
+        return
+
+    generator = BatchGenerator(
+        get_client(
+            api_key,
+            # Keep one warm connection per worker (sections fan out further)
+            limits=PoolLimits(max_keepalive_connections=args.concurrency * 8),
+            policy=ResiliencePolicy(requests_per_minute=args.requests_per_minute,
+                                    tokens_per_minute=args.tokens_per_minute),
+            backend=args.backend
+        ),
+        cache=ItineraryCache(
+            path=os.getenv("ITINERARY_CACHE_PATH"),
+            similarity=SimilarityIndex(args.reuse_threshold, args.adapt_threshold) if args.similar else None
+        ),
+        sectioned=args.sectioned,
+        structured=args.structured
+    )
+    summary = generator.run(args.input, args.output,
+                            args.checkpoint or args.output + '.checkpoint',
+                            concurrency=args.concurrency)
+    shutdown()
+    if args.metrics_file:
+        write_metrics(args.metrics_file)
+    print(f"{summary['ok']} generated, {summary['invalid']} invalid, {summary['error']} failed, "
+          f"{summary['skipped']} already done in {summary['elapsed_seconds']}s "
+          f"({summary['profiles_per_minute']} profiles/min)")
+
+
+if __name__ == "__main__":
+    main()
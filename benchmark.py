@@ -0,0 +1,387 @@
+"""Benchmark full planning conversations against the offline fake backend.
+
+    python benchmark.py --sessions 20 --output bench.json
+    python benchmark.py --baseline bench.json     # exit 1 on regressions
+
+Every session greets the bot, answers the seven intake questions and gets
+its itinerary, exactly as a user of the CLI would (with ``--one-shot``, the
+first answer states the whole profile and only what the bot still asks for
+is answered afterwards), then sends the ``FOLLOW_UPS``: a change request, a
+question about the itinerary and a factual question the bots answer from
+``destination_facts`` without a model call. Recorded per session: messages until the
+itinerary, latency of each intake turn, time to build the itinerary prompt,
+model calls and input tokens during intake, for the itinerary and for the
+follow-ups, output tokens of the itinerary and the follow-ups, time to first token and end-to-end time of the itinerary,
+follow-up latency, and the memory a finished session keeps alive. Calls
+are also counted per model, as ``model_router`` picked it.
+
+With ``--speculative`` the bots start itinerary sections during intake; add
+``--think-time`` (seconds the traveler takes to type each answer) to see how
+much of the itinerary latency that hides.
+
+With ``--similar`` the sessions share an itinerary cache with a similarity
+index, and every traveler after the first round is a near duplicate of an
+earlier one (the destination spelled with its country and a slightly larger
+budget, which does not fold to the same place and is generated afresh once,
+or another departure city); the results then report how many itineraries
+were reused or adapted and the tokens that saved.
+
+With ``--structured`` itineraries are requested as JSON plans and rendered
+locally (see ``structured_itinerary``); compare its output tokens with a
+plain run.
+
+Results are written as JSON. With ``--baseline`` they are compared with an
+earlier run: any extra model call, or input or output tokens or a median that grew by
+more than ``--tolerance``, is reported and makes the exit status non-zero. Rate
+limiting is disabled so the numbers reflect the planner, not the throttle.
+"""
+import argparse
+import gc
+import json
+import math
+import platform
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Sequence
+
+from conversation_history import count_message_tokens, count_tokens
+from itinerary_cache import ItineraryCache, parse_budget
+from itinerary_similarity import SimilarityIndex
+from llm_backends import PROFILES, FakeBackend
+from metrics import ITINERARY_REUSE, REUSE_TOKENS_SAVED
+from resilient_client import ResiliencePolicy, ResilientClient
+from slots import SLOTS
+from travel_planner_bot import TravelPlannerBot
+
+TRAVELERS = (
+    {'name': "Ana", 'email': "ana@example.com", 'destination': "Lisbon", 'source': "New York",
+     'days': "5", 'budget': "3000", 'dates': "June 10-15"},
+    {'name': "Kenji", 'email': "kenji@example.com", 'destination': "Reykjavik", 'source': "Osaka",
+     'days': "8", 'budget': "$4,500", 'dates': "next March"},
+    {'name': "Priya", 'email': "priya@example.com", 'destination': "Marrakech", 'source': "London",
+     'days': "3", 'budget': "1200", 'dates': "October 2-4"},
+    {'name': "Lucas", 'email': "lucas@example.com", 'destination': "Tokyo", 'source': "Sao Paulo",
+     'days': "14", 'budget': "7k", 'dates': "cherry blossom season"},
+)
+
+COUNTRIES = {'Lisbon': "Portugal", 'Reykjavik': "Iceland", 'Marrakech': "Morocco", 'Tokyo': "Japan"}
+OTHER_SOURCES = ("Boston", "Toronto", "Paris", "Lima")
+
+FOLLOW_UPS = ("Can you swap day 2 for a beach day?", "What should I pack?",
+              "What currency do they use there?")
+
+# Medians compared against a baseline, with the direction "bigger is worse"
+COMPARED_MEDIANS = ('turn_latency_ms', 'prompt_build_ms', 'time_to_first_token_ms', 'itinerary_ms',
+                    'follow_up_ms')
+PHASES = ('intake_per_session', 'itinerary_per_session', 'follow_up_per_session')
+
+
+class CountingBackend:
+    """Passes calls through to ``backend``, counting them and their input and output tokens."""
+
+    def __init__(self, backend: Any):
+        self.backend = backend
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.models: Dict[str, int] = {}
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs) -> Any:
+        self.calls += 1
+        self.models[kwargs['model']] = self.models.get(kwargs['model'], 0) + 1
+        self.input_tokens += count_message_tokens(kwargs['messages'])
+        result = self.backend.chat.completions.create(**kwargs)
+        if kwargs.get('stream'):
+            return self._count_stream(result)
+        self.output_tokens += count_tokens(result.choices[0].message.content)
+        return result
+
+    def _count_stream(self, stream: Iterator[Any]) -> Iterator[Any]:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                self.output_tokens += count_tokens(chunk.choices[0].delta.content)
+            yield chunk
+
+
+def unthrottled(backend: Any) -> ResilientClient:
+    return ResilientClient(backend, ResiliencePolicy(requests_per_minute=1e9, tokens_per_minute=1e12))
+
+
+def conversation(traveler: Dict[str, str]) -> List[str]:
+    """The user's side of a complete intake, greeting first."""
+    return ["Hi!"] + [traveler[slot.field] for slot in SLOTS]
+
+
+def near_duplicate(traveler: Dict[str, str], round_number: int) -> Dict[str, str]:
+    """``traveler`` as someone else would put it in round ``round_number`` (> 0)."""
+    if round_number % 2:
+        return {**traveler, 'destination': f"{traveler['destination'].lower()} {COUNTRIES[traveler['destination']]}",
+                'budget': str(round(parse_budget(traveler['budget']) * 1.05))}
+    return {**traveler, 'source': OTHER_SOURCES[round_number // 2 % len(OTHER_SOURCES)]}
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    """Linearly interpolated percentile of ``values`` (``fraction`` in 0..1)."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * fraction
+    low, high = math.floor(position), math.ceil(position)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def summarize(seconds: Sequence[float]) -> Dict[str, float]:
+    """Count, mean and percentiles of ``seconds``, reported in milliseconds."""
+    if not seconds:
+        return {'count': 0}
+    return {
+        'count': len(seconds),
+        'mean': round(sum(seconds) / len(seconds) * 1000, 3),
+        'p50': round(percentile(seconds, 0.50) * 1000, 3),
+        'p95': round(percentile(seconds, 0.95) * 1000, 3),
+        'p99': round(percentile(seconds, 0.99) * 1000, 3),
+        'max': round(max(seconds) * 1000, 3),
+    }
+
+
+def one_shot_message(traveler: Dict[str, str]) -> str:
+    """The whole profile in one sentence, the way people often open."""
+    return (f"I'm {traveler['name']}, {traveler['email']}, flying {traveler['source']} to "
+            f"{traveler['destination']} for {traveler['days']} days in {traveler['dates']} "
+            f"with a budget of {traveler['budget']}")
+
+
+def run_session(bot: TravelPlannerBot, backend: CountingBackend, traveler: Dict[str, str],
+                stream: bool, one_shot: bool = False, think_time: float = 0.0) -> Dict[str, Any]:
+    script = iter(["Hi!", one_shot_message(traveler)] if one_shot else conversation(traveler))
+    turns = []
+    intake_calls = intake_tokens = 0
+    while True:
+        # Answer whatever the bot still asks for once the script runs out
+        message = next(script, None) or traveler[bot.conversation_state]
+        time.sleep(think_time)
+        calls_before, tokens_before, output_before = backend.calls, backend.input_tokens, backend.output_tokens
+        started = time.perf_counter()
+        if stream:
+            reply = "".join(bot.process_input_stream(message))
+        else:
+            reply = bot.process_input(message)
+        elapsed = time.perf_counter() - started
+        if bot.is_complete():
+            # This answer completed the profile, so the reply is the itinerary
+            itinerary = reply
+            break
+        turns.append(elapsed)
+        intake_calls += backend.calls - calls_before
+        intake_tokens += backend.input_tokens - tokens_before
+
+    itinerary_calls = backend.calls - calls_before
+    itinerary_tokens = backend.input_tokens - tokens_before
+    itinerary_output = backend.output_tokens - output_before
+    started = time.perf_counter()
+    bot._build_messages(bot._build_itinerary_prompt())
+    prompt_build = time.perf_counter() - started
+
+    calls_before, tokens_before, output_before = backend.calls, backend.input_tokens, backend.output_tokens
+    follow_ups = []
+    for message in FOLLOW_UPS:
+        started = time.perf_counter()
+        bot.process_input(message)
+        follow_ups.append(time.perf_counter() - started)
+    return {
+        'turns': turns,
+        # The opening "Hi!" only fetches the greeting
+        'messages_to_itinerary': len(turns),
+        'intake_calls': intake_calls,
+        'itinerary_calls': itinerary_calls,
+        'follow_up_calls': backend.calls - calls_before,
+        'intake_tokens': intake_tokens,
+        'itinerary_tokens': itinerary_tokens,
+        'follow_up_tokens': backend.input_tokens - tokens_before,
+        'itinerary_output': itinerary_output,
+        'follow_up_output': backend.output_tokens - output_before,
+        'itinerary': elapsed,
+        'follow_ups': follow_ups,
+        'time_to_first_token': bot.last_time_to_first_token if stream else None,
+        'prompt_build': prompt_build,
+        'itinerary_chars': len(itinerary),
+    }
+
+
+def measure_session_memory(sessions: int, sectioned: bool) -> float:
+    """Traced bytes a finished session keeps alive (shared client excluded)."""
+    backend = CountingBackend(FakeBackend(PROFILES['instant']))
+    client = unthrottled(backend)
+    bots = []
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for number in range(sessions):
+        bot = TravelPlannerBot(client=client, sectioned=sectioned)
+        for message in conversation(TRAVELERS[number % len(TRAVELERS)]):
+            bot.process_input(message)
+        bots.append(bot)
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return allocated / sessions
+
+
+def run_benchmark(sessions: int = 10, profile: str = 'groq', sectioned: bool = False,
+                  stream: bool = True, cached: bool = False, one_shot: bool = False,
+                  speculative: bool = False, think_time: float = 0.0, similar: bool = False,
+                  structured: bool = False) -> Dict[str, Any]:
+    backend = CountingBackend(FakeBackend(PROFILES[profile], seed=0))
+    client = unthrottled(backend)
+    cache = ItineraryCache(similarity=SimilarityIndex() if similar else None) if cached or similar else None
+    reused, adapted, saved = ITINERARY_REUSE.value('reused'), ITINERARY_REUSE.value('adapted'), REUSE_TOKENS_SAVED.value()
+    results = []
+    started = time.perf_counter()
+    for number in range(sessions):
+        traveler = TRAVELERS[number % len(TRAVELERS)]
+        if similar and number >= len(TRAVELERS):
+            traveler = near_duplicate(traveler, number // len(TRAVELERS))
+        bot = TravelPlannerBot(client=client, cache=cache, sectioned=sectioned, speculative=speculative,
+                               structured=structured)
+        results.append(run_session(bot, backend, traveler, stream, one_shot, think_time))
+    elapsed = time.perf_counter() - started
+    reused, adapted = ITINERARY_REUSE.value('reused') - reused, ITINERARY_REUSE.value('adapted') - adapted
+
+    first_tokens = [r['time_to_first_token'] for r in results if r['time_to_first_token'] is not None]
+    return {
+        'config': {
+            'sessions': sessions, 'profile': profile, 'fake_backend': PROFILES[profile]._asdict(),
+            'sectioned': sectioned, 'stream': stream, 'cached': cached, 'one_shot': one_shot,
+            'speculative': speculative, 'think_time': think_time, 'similar': similar, 'structured': structured,
+            'python': platform.python_version(), 'platform': platform.platform(),
+        },
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'elapsed_seconds': round(elapsed, 3),
+        'messages_to_itinerary': sum(r['messages_to_itinerary'] for r in results) / sessions,
+        'model_calls': {
+            'intake_per_session': sum(r['intake_calls'] for r in results) / sessions,
+            'itinerary_per_session': sum(r['itinerary_calls'] for r in results) / sessions,
+            'follow_up_per_session': sum(r['follow_up_calls'] for r in results) / sessions,
+            'total': backend.calls,
+            'by_model': dict(backend.models),
+        },
+        'input_tokens': {
+            'intake_per_session': sum(r['intake_tokens'] for r in results) / sessions,
+            'itinerary_per_session': sum(r['itinerary_tokens'] for r in results) / sessions,
+            'follow_up_per_session': sum(r['follow_up_tokens'] for r in results) / sessions,
+            'total': backend.input_tokens,
+        },
+        'output_tokens': {
+            'itinerary_per_session': sum(r['itinerary_output'] for r in results) / sessions,
+            'follow_up_per_session': sum(r['follow_up_output'] for r in results) / sessions,
+            'total': backend.output_tokens,
+        },
+        'itinerary_reuse': {
+            'exact_hits': cache.hits if cache is not None else 0,
+            'reused': reused,
+            'adapted': adapted,
+            'rate': ((cache.hits if cache is not None else 0) + reused + adapted) / sessions,
+            'tokens_saved': REUSE_TOKENS_SAVED.value() - saved,
+        },
+        'turn_latency_ms': summarize([t for r in results for t in r['turns']]),
+        'prompt_build_ms': summarize([r['prompt_build'] for r in results]),
+        'time_to_first_token_ms': summarize(first_tokens),
+        'itinerary_ms': summarize([r['itinerary'] for r in results]),
+        'follow_up_ms': summarize([t for r in results for t in r['follow_ups']]),
+        'session_memory_bytes': round(measure_session_memory(min(sessions, 50), sectioned)),
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Describe every way ``results`` regressed against ``baseline``."""
+    regressions = []
+    for phase in PHASES:
+        now, before = results['model_calls'][phase], baseline['model_calls'].get(phase)
+        if before is not None and now > before:
+            regressions.append(f"model calls ({phase}): {before} -> {now}")
+        now, before = results['input_tokens'][phase], baseline.get('input_tokens', {}).get(phase)
+        if before is not None and now > before * (1 + tolerance):
+            regressions.append(f"input tokens ({phase}): {before:g} -> {now:g}")
+        now, before = results['output_tokens'].get(phase), baseline.get('output_tokens', {}).get(phase)
+        if now is not None and before is not None and now > before * (1 + tolerance):
+            regressions.append(f"output tokens ({phase}): {before:g} -> {now:g}")
+    for metric in COMPARED_MEDIANS:
+        now, before = results[metric].get('p50'), baseline.get(metric, {}).get('p50')
+        # Sub-millisecond medians are dominated by noise
+        if now is None or not before or max(now, before) < 1.0:
+            continue
+        if now > before * (1 + tolerance):
+            regressions.append(f"{metric} p50: {before:.3f} -> {now:.3f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark planning conversations offline")
+    parser.add_argument('--sessions', type=int, default=10)
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='groq',
+                        help="fake backend timing profile")
+    parser.add_argument('--sectioned', action='store_true')
+    parser.add_argument('--blocking', action='store_true',
+                        help="use process_input for the itinerary turn instead of streaming")
+    parser.add_argument('--cached', action='store_true', help="share an itinerary cache between sessions")
+    parser.add_argument('--one-shot', action='store_true',
+                        help="travelers state their whole profile in their first message")
+    parser.add_argument('--speculative', action='store_true',
+                        help="start itinerary sections during intake")
+    parser.add_argument('--think-time', type=float, default=0.0,
+                        help="seconds each intake answer takes to type")
+    parser.add_argument('--similar', action='store_true',
+                        help="near-duplicate travelers sharing a cache with a similarity index")
+    parser.add_argument('--structured', action='store_true',
+                        help="request itineraries as JSON plans rendered locally")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help="earlier results to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed relative slowdown of medians (default 0.25)")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.sessions, args.profile, args.sectioned,
+                            stream=not args.blocking, cached=args.cached, one_shot=args.one_shot,
+                            speculative=args.speculative, think_time=args.think_time, similar=args.similar,
+                            structured=args.structured)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+
+    calls = results['model_calls']
+    print(f"{args.sessions} sessions in {results['elapsed_seconds']}s; "
+          f"{results['messages_to_itinerary']:g} messages to the itinerary; model calls per session: "
+          f"{calls['intake_per_session']:g} intake, {calls['itinerary_per_session']:g} itinerary, "
+          f"{calls['follow_up_per_session']:g} follow-up")
+    print("  model calls by model: " + ", ".join(f"{model} {count}" for model, count in calls['by_model'].items()))
+    tokens = results['input_tokens']
+    print(f"  input tokens per session: {tokens['intake_per_session']:g} intake, "
+          f"{tokens['itinerary_per_session']:g} itinerary, {tokens['follow_up_per_session']:g} follow-up")
+    output = results['output_tokens']
+    print(f"  output tokens per session: {output['itinerary_per_session']:g} itinerary, "
+          f"{output['follow_up_per_session']:g} follow-up")
+    reuse = results['itinerary_reuse']
+    if args.cached or args.similar:
+        print(f"  itineraries from the cache: {reuse['rate']:.0%} ({reuse['exact_hits']} exact, "
+              f"{reuse['reused']:g} reused, {reuse['adapted']:g} adapted; ~{reuse['tokens_saved']:g} tokens saved)")
+    for metric in COMPARED_MEDIANS:
+        summary = results[metric]
+        if summary['count']:
+            print(f"  {metric:24} p50 {summary['p50']:>10.3f}  p95 {summary['p95']:>10.3f}  max {summary['max']:>10.3f}")
+    print(f"  {'session_memory_bytes':24} {results['session_memory_bytes']}")
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Process-wide registry of pooled, rate-limited Groq clients.
+
+Creating a ``Groq`` client builds a new HTTP connection pool, so every new
+bot used to pay for fresh TCP and TLS handshakes. Bots now borrow a client
+from this registry instead: one per API key (sync and async separately),
+backed by a single ``httpx`` pool with keep-alive and shared rate limits.
+
+Pool limits apply when a key's client is first created. Call ``shutdown``
+(or ``ashutdown`` for async clients) to close the pools; sync clients are
+also closed at interpreter exit.
+
+``backend`` picks what the clients talk to: ``groq`` (the default) or the
+offline ``fake`` backend from ``llm_backends``, whose timing profile is
+read from ``TRAVEL_PLANNER_FAKE_PROFILE``. The default itself comes from
+``TRAVEL_PLANNER_BACKEND``.
+"""
+import atexit
+import os
+import threading
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import httpx
+from groq import AsyncGroq, Groq
+
+from llm_backends import PROFILES, AsyncFakeBackend, FakeBackend
+from resilient_client import AsyncResilientClient, ResiliencePolicy, ResilientClient
+
+BACKENDS = ('groq', 'fake')
+
+
+class PoolLimits(NamedTuple):
+    max_connections: int = 100
+    max_keepalive_connections: int = 50
+    # Seconds an idle connection is kept warm for reuse
+    keepalive_expiry: float = 60.0
+    timeout: float = 60.0
+    connect_timeout: float = 5.0
+
+    def httpx_limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry
+        )
+
+    def httpx_timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(self.timeout, connect=self.connect_timeout)
+
+
+_lock = threading.Lock()
+_clients: Dict[Tuple[str, Optional[str]], ResilientClient] = {}
+_async_clients: Dict[Tuple[str, Optional[str]], AsyncResilientClient] = {}
+
+
+def default_backend() -> str:
+    return os.getenv("TRAVEL_PLANNER_BACKEND", "groq")
+
+
+def requires_api_key(backend: Optional[str] = None) -> bool:
+    return (backend or default_backend()) != 'fake'
+
+
+def fake_profile():
+    name = os.getenv("TRAVEL_PLANNER_FAKE_PROFILE", "groq")
+    if name not in PROFILES:
+        raise ValueError(f"unknown fake backend profile {name!r}; choose from {', '.join(PROFILES)}")
+    return PROFILES[name]
+
+
+def get_client(api_key: Optional[str] = None, limits: PoolLimits = PoolLimits(),
+               policy: Optional[ResiliencePolicy] = None,
+               backend: Optional[str] = None) -> ResilientClient:
+    """Return the shared client for ``api_key``, creating it on first use."""
+    backend = backend or default_backend()
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown backend {backend!r}; choose from {', '.join(BACKENDS)}")
+    with _lock:
+        client = _clients.get((backend, api_key))
+        if client is None:
+            if backend == 'fake':
+                client = ResilientClient(FakeBackend(fake_profile()), policy)
+            else:
+                http_client = httpx.Client(limits=limits.httpx_limits(), timeout=limits.httpx_timeout())
+                client = ResilientClient(Groq(api_key=api_key, http_client=http_client), policy)
+            _clients[(backend, api_key)] = client
+        return client
+
+
+def get_async_client(api_key: Optional[str] = None, limits: PoolLimits = PoolLimits(),
+                     policy: Optional[ResiliencePolicy] = None,
+                     backend: Optional[str] = None) -> AsyncResilientClient:
+    """Async counterpart of ``get_client``; use it from a single event loop."""
+    backend = backend or default_backend()
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown backend {backend!r}; choose from {', '.join(BACKENDS)}")
+    with _lock:
+        client = _async_clients.get((backend, api_key))
+        if client is None:
+            if backend == 'fake':
+                client = AsyncResilientClient(AsyncFakeBackend(fake_profile()), policy)
+            else:
+                http_client = httpx.AsyncClient(limits=limits.httpx_limits(), timeout=limits.httpx_timeout())
+                client = AsyncResilientClient(AsyncGroq(api_key=api_key, http_client=http_client), policy)
+            _async_clients[(backend, api_key)] = client
+        return client
+
+
+def shutdown():
+    """Close every pooled sync client and forget it."""
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.client.close()
+
+
+async def ashutdown():
+    """Close every pooled async client and forget it."""
+    with _lock:
+        clients = list(_async_clients.values())
+        _async_clients.clear()
+    for client in clients:
+        await client.client.close()
+
+
+atexit.register(shutdown)
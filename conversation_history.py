@@ -0,0 +1,94 @@
+"""Bounded conversation memory with a rolling summary.
+
+The most recent turns are kept verbatim in a ring buffer. Turns pushed out of
+the buffer are compressed to a one-line gist and folded into a rolling
+summary, which is itself capped, so a session's memory stays flat however
+long it runs. ``messages`` selects as much of this as fits in a token
+budget, newest turns first.
+
+Token counts are estimated at ~4 characters per token, which is close for
+English text with Llama tokenizers and needs no tokenizer download.
+"""
+import math
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+
+CHARS_PER_TOKEN = 4
+
+
+def count_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def count_message_tokens(messages: List[Dict[str, str]]) -> int:
+    # Each message carries a few tokens of role/formatting overhead
+    return sum(count_tokens(message["content"]) + 4 for message in messages)
+
+
+def clip_to_tokens(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars - 3].rstrip() + "..."
+
+
+def gist(text: str, max_words: int = 20) -> str:
+    """First sentence of ``text``, at most ``max_words`` words."""
+    first = text.strip().split("\n", 1)[0]
+    for end in ".!?":
+        index = first.find(end)
+        if 0 < index:
+            first = first[:index + 1]
+    words = first.split()
+    if len(words) > max_words:
+        return " ".join(words[:max_words]) + "..."
+    return " ".join(words)
+
+
+class ConversationHistory:
+    def __init__(self, max_turns: int = 8, max_turn_tokens: int = 300,
+                 max_summary_tokens: int = 200):
+        self.max_turn_tokens = max_turn_tokens
+        self.max_summary_tokens = max_summary_tokens
+        self.turns: Deque[Tuple[str, str]] = deque(maxlen=max_turns)
+        self.summary: Deque[str] = deque()
+        self.summary_tokens = 0
+
+    def add(self, role: str, content: str):
+        if len(self.turns) == self.turns.maxlen:
+            self._summarize(*self.turns[0])
+        self.turns.append((role, clip_to_tokens(content, self.max_turn_tokens)))
+
+    def _summarize(self, role: str, content: str):
+        line = f"{role}: {gist(content)}"
+        self.summary.append(line)
+        self.summary_tokens += count_tokens(line) + 1
+        while self.summary_tokens > self.max_summary_tokens and self.summary:
+            self.summary_tokens -= count_tokens(self.summary.popleft()) + 1
+
+    def messages(self, max_tokens: int) -> List[Dict[str, str]]:
+        """Summary plus the most recent turns, within ``max_tokens``."""
+        selected: List[Dict[str, str]] = []
+        remaining = max_tokens
+        for role, content in reversed(self.turns):
+            cost = count_tokens(content) + 4
+            if cost > remaining:
+                break
+            selected.append({"role": role, "content": content})
+            remaining -= cost
+        selected.reverse()
+
+        # Older context only makes sense if the recent turns all fit
+        if self.summary and len(selected) == len(self.turns):
+            summary = "Earlier in this conversation:\n" + "\n".join(self.summary)
+            if count_tokens(summary) + 4 <= remaining:
+                selected.insert(0, {"role": "system", "content": summary})
+        return selected
+
+    def clear(self):
+        self.turns.clear()
+        self.summary.clear()
+        self.summary_tokens = 0
+
+    def __len__(self) -> int:
+        return len(self.turns)
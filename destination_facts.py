@@ -0,0 +1,211 @@
+"""Destination facts the model should not have to recall.
+
+``destination_facts.tsv`` ships with the planner: one line per country with
+its currency, languages, emergency numbers, plugs and driving side, plus
+one line per city or alternative name pointing at its country::
+
+    japan<TAB>Japan<TAB>Japanese yen (JPY)<TAB>Japanese<TAB>110 police, ...<TAB>Type A/B, 100 V<TAB>left
+    kyoto<TAB>@japan
+
+Lines are sorted by their first column (the lower-cased, accent-free
+name), so ``FactStore`` memory-maps the file read-only, notes where each
+line starts and binary-searches those offsets: no fact is parsed before it
+is asked for, every process shares the pages, and a lookup reads about ten
+names (about 20 microseconds). ``python destination_facts.py --sort`` puts
+edited lines back in order; ``--check`` verifies order and aliases.
+
+Bots use the store twice: short factual follow-ups ("what currency do they
+use?", "emergency number in Italy?") are answered from it without a model
+call, and the itinerary prompt carries the destination's facts so the model
+copies them instead of recalling them. Facts are the same for every
+traveler; visa rules depend on the passport and are left to the model.
+"""
+import argparse
+import mmap
+import os
+import re
+import unicodedata
+from array import array
+from functools import lru_cache
+from typing import List, NamedTuple, Optional, Tuple
+
+DEFAULT_FACTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'destination_facts.tsv')
+
+FIELDS = ('currency', 'languages', 'emergency', 'plugs', 'driving')
+# Longest place name, in words, looked for in a message
+MAX_NAME_WORDS = 4
+# Longer questions want advice, not a fact
+MAX_FACT_QUESTION_WORDS = 12
+
+FACT_QUESTIONS = {
+    'currency': re.compile(r"\bcurrenc(?:y|ies)\b|\bwhat money\b", re.IGNORECASE),
+    'languages': re.compile(r"\blanguages?\b|\bwhat do they speak\b|\bspoken\b", re.IGNORECASE),
+    'emergency': re.compile(r"\bemergency\b|\bpolice number\b|\bambulance\b", re.IGNORECASE),
+    'plugs': re.compile(r"\bplugs?\b|\badapt[eo]rs?\b|\bsockets?\b|\bvoltage\b|\boutlets?\b", re.IGNORECASE),
+    'driving': re.compile(r"\bwhich side\b|\bdrive on\b|\bdriving side\b", re.IGNORECASE),
+}
+# Questions that name a fact but ask for more than it
+ADVICE = re.compile(r"\b(?:tips?|best|recommend\w*|how much|how many|cheap\w*|phrases?|learn|exchange|where|"
+                    r"rent\w*|budget|should i bring)\b", re.IGNORECASE)
+
+ANSWERS = {
+    'currency': "the currency is the {}",
+    'languages': "people speak {}",
+    'emergency': "the emergency numbers are {}",
+    'plugs': "sockets take {}",
+    'driving': "traffic drives on the {}",
+}
+LABELS = {
+    'currency': "Currency",
+    'languages': "Languages",
+    'emergency': "Emergency numbers",
+    'plugs': "Plugs and voltage",
+    'driving': "Driving side",
+}
+
+
+class Facts(NamedTuple):
+    country: str
+    currency: str
+    languages: str
+    emergency: str
+    plugs: str
+    driving: str
+
+
+def fold_name(text: str) -> str:
+    """Lower-case, accent-free words separated by single spaces: the file's key form."""
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+class FactStore:
+    """Read-only, memory-mapped view of a facts file."""
+
+    def __init__(self, path: str = DEFAULT_FACTS_PATH):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._starts = array('L', [0])
+        self._starts.extend(match.end() for match in re.finditer(rb"\n(?=.)", self._map))
+
+    def close(self):
+        self._map.close()
+
+    def _name(self, line: int) -> bytes:
+        start = self._starts[line]
+        return self._map[start:self._map.find(b"\t", start)]
+
+    def _search(self, key: bytes) -> Tuple[int, bytes]:
+        """(line number, first column) of the first line whose first column is not below ``key``."""
+        low, high = 0, len(self._starts)
+        while low < high:
+            middle = (low + high) // 2
+            if self._name(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low, self._name(low) if low < len(self._starts) else b""
+
+    def _facts(self, key: bytes) -> Optional[Facts]:
+        line, found = self._search(key)
+        if found != key:
+            return None
+        start = self._starts[line]
+        end = self._starts[line + 1] if line + 1 < len(self._starts) else len(self._map)
+        columns = self._map[start:end].decode('utf-8').rstrip('\r\n').split('\t')
+        if columns[1].startswith('@'):
+            return self._facts(columns[1][1:].encode('ascii'))
+        return Facts(*columns[1:])
+
+    def lookup(self, name: str) -> Optional[Facts]:
+        """Facts for a country, city or alternative name, if the file has it."""
+        return self._facts(fold_name(name).encode('ascii'))
+
+    def find(self, text: str) -> Optional[Facts]:
+        """Facts for the first place named in ``text``, preferring longer names ("new york")."""
+        words = fold_name(text).encode('ascii').split()
+        for index, word in enumerate(words):
+            # One search per word: only words that start a name are looked at further
+            _, found = self._search(word)
+            if found != word and not found.startswith(word + b" "):
+                continue
+            for length in range(min(MAX_NAME_WORDS, len(words) - index), 0, -1):
+                facts = self._facts(b" ".join(words[index:index + length]))
+                if facts is not None:
+                    return facts
+        return None
+
+
+@lru_cache(maxsize=None)
+def default_store() -> Optional[FactStore]:
+    """The process-wide store over the bundled file, or None when it is missing."""
+    if not os.path.exists(DEFAULT_FACTS_PATH):
+        return None
+    return FactStore(DEFAULT_FACTS_PATH)
+
+
+def asked_facts(question: str) -> List[str]:
+    """The ``FIELDS`` a short factual question asks for; empty for anything else."""
+    if len(question.split()) > MAX_FACT_QUESTION_WORDS or ADVICE.search(question):
+        return []
+    return [field for field in FIELDS if FACT_QUESTIONS[field].search(question)]
+
+
+def fact_answer(facts: Facts, fields: List[str]) -> str:
+    parts = [ANSWERS[field].format(getattr(facts, field)) for field in fields]
+    return f"In {facts.country}, " + "; ".join(parts) + "."
+
+
+def facts_block(facts: Optional[Facts], fields=FIELDS) -> str:
+    """Prompt lines giving the model ``fields`` of ``facts`` to use as they are."""
+    if facts is None:
+        return ""
+    lines = "".join(f"- {LABELS[field]}: {getattr(facts, field)}\n" for field in fields)
+    return f"DESTINATION FACTS ({facts.country}; use as given):\n{lines}"
+
+
+def sort_file(path: str):
+    with open(path, encoding='utf-8') as f:
+        lines = [line.rstrip('\r\n') for line in f if line.strip()]
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        f.writelines(line + "\n" for line in sorted(lines, key=lambda line: line.split('\t')[0].encode('utf-8')))
+
+
+def check_file(path: str) -> List[str]:
+    """Problems that would break lookups: unsorted or unfolded keys, bad columns, dangling aliases."""
+    with open(path, encoding='utf-8') as f:
+        rows = [line.rstrip('\r\n').split('\t') for line in f]
+    keys = [row[0] for row in rows]
+    countries = {row[0] for row in rows if len(row) > 1 and not row[1].startswith('@')}
+    problems = []
+    for number, (previous, key) in enumerate(zip([""] + keys, keys), 1):
+        if key.encode('utf-8') <= previous.encode('utf-8'):
+            problems.append(f"line {number}: {key!r} is out of order or repeated")
+        if fold_name(key) != key:
+            problems.append(f"line {number}: {key!r} is not in folded form ({fold_name(key)!r})")
+    for number, row in enumerate(rows, 1):
+        if len(row) == 2 and row[1].startswith('@'):
+            if row[1][1:] not in countries:
+                problems.append(f"line {number}: {row[0]!r} points at unknown {row[1][1:]!r}")
+        elif len(row) != 2 + len(FIELDS):
+            problems.append(f"line {number}: expected {2 + len(FIELDS)} columns, found {len(row)}")
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Look up or maintain the destination facts file")
+    parser.add_argument('names', nargs='*', help="countries, cities or whole questions to look up")
+    parser.add_argument('--path', default=DEFAULT_FACTS_PATH)
+    parser.add_argument('--sort', action='store_true', help="sort the file's lines in place")
+    parser.add_argument('--check', action='store_true', help="report lines that would break lookups")
+    args = parser.parse_args()
+    if args.sort:
+        sort_file(args.path)
+    if args.check:
+        problems = check_file(args.path)
+        print("\n".join(problems) or "ok")
+    store = FactStore(args.path)
+    for name in args.names:
+        facts = store.find(name)
+        print(f"{name}: " + (", ".join(f"{field}={value}" for field, value in facts._asdict().items())
+                             if facts else "not found"))
@@ -0,0 +1,194 @@
+"""Handle what the traveler says once the itinerary has been delivered.
+
+``classify_follow_up`` sorts a message, with regular expressions only, into
+
+* ``question``: answered from the parts of the itinerary it is about, in a
+  short completion (``answer_prompt``);
+* ``revise``: a change to particular days or sections ("swap day 3 for a
+  beach day", "cheaper hotels"); only those parts are rewritten
+  (``revision_prompt``) and spliced back into the ``ItineraryDocument``;
+* ``profile``: new trip details ("make it 10 days", "budget is now $5000");
+  the profile is updated and the itinerary generated again;
+* ``replan``: a change that names no part ("make it more relaxed"); the
+  whole itinerary is generated again with the request attached.
+"""
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from itinerary_document import ItineraryDocument, day_key
+from prompt_templates import PromptTemplate
+from slot_extractor import NUMBER_WORDS, extract_slots
+
+# Fields that shape the itinerary; a changed name or email does not
+TRIP_FIELDS = ('destination', 'source', 'days', 'budget', 'dates')
+# Characters of itinerary text given to the model to answer a question
+MAX_CONTEXT_CHARS = 2000
+
+ORDINALS = {
+    'first': 1, 'second': 2, 'third': 3, 'fourth': 4, 'fifth': 5, 'sixth': 6, 'seventh': 7,
+    'eighth': 8, 'ninth': 9, 'tenth': 10,
+}
+DAY_NUMBER = r"\d{1,2}|" + "|".join(NUMBER_WORDS)
+DAY_REFERENCES = (
+    # "day 3", "days 2-4", "day three", "days 2 and 5"
+    re.compile(rf"\bdays?\s+({DAY_NUMBER})(?:\s*(?:-|–|to|through|and|&)\s*({DAY_NUMBER}))?\b",
+               re.IGNORECASE),
+    # "the third day", "last day"
+    re.compile(rf"\b({'|'.join(ORDINALS)}|last|final)\s+day\b", re.IGNORECASE),
+)
+SECTION_WORDS = (
+    ('overview', r"overview|highlights?|must[\s-](?:do|see)"),
+    ('flights', r"flights?|fly|airlines?|airports?"),
+    ('accommodation', r"hotels?|hostels?|accommodations?|airbnb|lodging|stay(?:ing)?|neighbou?rhoods?"),
+    ('budget', r"budget|breakdown|total cost|spend(?:ing)?"),
+    ('season', r"pack(?:ing)?|weather|climate|seasons?|rain(?:y)?"),
+    ('tips', r"currency|customs|etiquette|safe(?:ty)?|phrases?|language|emergency|embassy|visas?"
+             r"|transport|metro|subway|buses|taxis?|getting around"),
+    ('money_saving', r"sav(?:e|ing)|free activit(?:y|ies)|tourist traps?"),
+    ('days', r"restaurants?|food|eat|breakfast|lunch|dinner|activit(?:y|ies)|schedule|sights?"),
+)
+SECTION_REFERENCES = tuple((key, re.compile(rf"\b(?:{words})\b", re.IGNORECASE)) for key, words in SECTION_WORDS)
+
+QUESTION = re.compile(r"^\s*(?:what|what's|where|when|which|who|why|how|is|are|was|do|does|did|can i|could i"
+                      r"|should|will|would it|any|tell me)\b", re.IGNORECASE)
+# "Can you ...?" is a polite change request, not a question
+REQUEST = re.compile(r"^\s*(?:please\s+)?(?:can|could|would|will)\s+you\b|^\s*(?:please|i'd|i would|i want"
+                     r"|let's|instead)\b|\bplease[.!]*\s*$", re.IGNORECASE)
+CHANGE = re.compile(r"\b(?:swap|replace|change|switch|instead|rather|remove|drop|skip|add|include|move"
+                    r"|shorten|extend|cut|update|redo|rewrite|make|cheaper|less expensive|more affordable"
+                    r"|different|fewer|less|actually|now)\b", re.IGNORECASE)
+# Words that must accompany a new value before it replaces the profile's
+FIELD_WORDS = {
+    'days': re.compile(r"\b(?:make it|(?:the|our|my|whole) trip|in total|altogether"
+                       r"|(?:we|i) (?:only )?have|extend|shorten)\b", re.IGNORECASE),
+    'budget': re.compile(r"\bbudget\b", re.IGNORECASE),
+    'destination': re.compile(r"\bdestination\b", re.IGNORECASE),
+    'source': re.compile(r"\b(?:fly(?:ing)? (?:out )?from|depart\w*|leaving from|home)\b", re.IGNORECASE),
+}
+
+REVISION = PromptTemplate('revision', """
+Revise one part of the traveler's itinerary. Rewrite the part below so it makes the requested change, keeping its heading, format and level of detail and everything the request does not touch. Reply with ONLY the rewritten part.
+
+Requested change: {request}
+
+{part}
+{profile}""")
+
+ANSWER = PromptTemplate('answer', """
+Answer the traveler's question about their itinerary in a few sentences. Be specific and do not repeat or rewrite the itinerary.
+
+Relevant parts of the itinerary:
+{context}
+{profile}
+Question: {question}""")
+
+REPLAN = PromptTemplate('replan', """
+The traveler has seen the itinerary and asked for this change to the whole trip: {request}
+""")
+
+TEMPLATES = (REVISION, ANSWER, REPLAN)
+
+
+class FollowUp(NamedTuple):
+    kind: str
+    # Document keys the message is about, in itinerary order
+    targets: Tuple[str, ...] = ()
+    # New values for ``TRIP_FIELDS`` (``profile`` follow-ups)
+    changes: Optional[Dict[str, Any]] = None
+    # The reply, when it is known without a model call
+    answer: Optional[str] = None
+
+
+def day_number(word: str) -> int:
+    word = word.lower()
+    return int(word) if word.isdigit() else NUMBER_WORDS.get(word) or ORDINALS[word]
+
+
+def find_days(message: str, days: List[int]) -> List[int]:
+    """Days of the itinerary ``message`` refers to."""
+    found = set()
+    for match in DAY_REFERENCES[0].finditer(message):
+        first = day_number(match.group(1))
+        last = day_number(match.group(2)) if match.group(2) else first
+        joined = match.group(0).lower()
+        if ' and ' in joined or '&' in joined:
+            found.update((first, last))
+        else:
+            found.update(range(first, last + 1))
+    for match in DAY_REFERENCES[1].finditer(message):
+        word = match.group(1).lower()
+        found.add(max(days, default=0) if word in ('last', 'final') else ORDINALS[word])
+    return sorted(found & set(days))
+
+
+def find_targets(message: str, document: ItineraryDocument) -> Tuple[str, ...]:
+    keys = document.keys()
+    days = find_days(message, document.days())
+    targets = {day_key(number) for number in days}
+    for key, pattern in SECTION_REFERENCES:
+        # Named days are more specific than the day-by-day section
+        if key in keys and pattern.search(message) and not (key == 'days' and days):
+            targets.add(key)
+    return tuple(key for key in keys if key in targets)
+
+
+def profile_changes(message: str, user_info: Dict[str, Any]) -> Dict[str, Any]:
+    """Trip details ``message`` changes, ignoring look-alikes such as "a day trip to Sintra"."""
+    changes = {}
+    for field, value in extract_slots(message).items():
+        current = str(user_info.get(field))
+        if field not in TRIP_FIELDS or str(value) == current:
+            continue
+        words = FIELD_WORDS.get(field)
+        # "Porto instead of Lisbon" names the place it replaces
+        if words is None or words.search(message) or (field in ('destination', 'source')
+                                                       and current.lower() in message.lower()):
+            changes[field] = value
+    return changes
+
+
+def classify_follow_up(message: str, document: ItineraryDocument,
+                       user_info: Dict[str, Any]) -> FollowUp:
+    targets = find_targets(message, document)
+    request = REQUEST.search(message) is not None
+    if not request and (message.rstrip().endswith('?') or QUESTION.search(message)):
+        return FollowUp('question', targets)
+
+    changes = profile_changes(message, user_info)
+    if changes:
+        return FollowUp('profile', targets, changes)
+    if not (request or CHANGE.search(message)):
+        # A remark ("thanks, looks great") is answered like a question
+        return FollowUp('question', targets)
+    if 'days' in targets and document.days():
+        # "different restaurants" touches every day
+        targets = tuple(key for key in targets if key != 'days') + tuple(
+            day_key(number) for number in document.days())
+    return FollowUp('revise', targets) if targets else FollowUp('replan')
+
+
+def answer_context(document: ItineraryDocument, targets: Tuple[str, ...]) -> str:
+    """The targeted parts (the overview when there are none), cut to ``MAX_CONTEXT_CHARS``."""
+    keys = targets or [key for key in ('overview', 'intro') if document.get(key)][:1]
+    context = "\n".join(document.get(key).strip() for key in keys)
+    return context[:MAX_CONTEXT_CHARS] or document.render()[:MAX_CONTEXT_CHARS]
+
+
+def revision_prompt(document: ItineraryDocument, key: str, request: str, profile: str) -> str:
+    return REVISION.render({'request': request, 'part': document.get(key).strip(), 'profile': profile})
+
+
+def answer_prompt(document: ItineraryDocument, targets: Tuple[str, ...], question: str,
+                  profile: str) -> str:
+    return ANSWER.render({'context': answer_context(document, targets), 'profile': profile,
+                          'question': question})
+
+
+def replan_prompt(itinerary_prompt: str, request: str) -> str:
+    return itinerary_prompt + REPLAN.render({'request': request})
+
+
+def revision_reply(document: ItineraryDocument, targets: Tuple[str, ...]) -> str:
+    """The rewritten parts, introduced for the traveler."""
+    parts = "\n\n".join(document.get(key).strip() for key in targets)
+    return f"Here is the updated plan; the rest of your itinerary stays the same.\n\n{parts}"
@@ -0,0 +1,239 @@
+"""Cache of generated itineraries keyed on the normalized traveler profile.
+
+Two profiles that differ only in case, spacing or budget formatting
+("$3,000" vs "3000 usd") share one entry. The traveler's name and email are
+left out of the key so popular routes are shared between travelers; the
+stored itinerary is re-addressed to the current traveler on a hit. The
+output mode is part of the key: a structured itinerary is stored with its
+plan, and a prose or sectioned one must not answer a structured lookup.
+
+Storage is pluggable: ``MemoryCache`` is an in-process LRU with a TTL and
+``SQLiteCache`` keeps entries on disk across restarts. Both count hits and
+misses. An optional ``SimilarityIndex`` (see ``itinerary_similarity``) also
+finds stored itineraries for profiles that are close but not equal.
+"""
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from itinerary_similarity import SimilarItinerary, SimilarityIndex
+
+PROFILE_FIELDS = ('destination', 'source', 'days', 'budget', 'dates')
+
+BUDGET_PATTERN = re.compile(r'(\d+(?:[.,]\d+)*)\s*(k)?\b', re.IGNORECASE)
+
+
+def fold_text(value: Any) -> str:
+    """Lower-case and collapse whitespace so trivially different answers match."""
+    return " ".join(str(value).split()).casefold()
+
+
+def parse_budget(value: Any) -> Optional[float]:
+    """Parse a free-form budget answer ("$3,000", "3k USD", "2500.50") into a number."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = BUDGET_PATTERN.search(str(value))
+    if not match:
+        return None
+    number = match.group(1)
+    # "3,000" and "3.000" are thousands separators, "2500.50" is a decimal
+    if re.fullmatch(r'\d{1,3}([.,]\d{3})+', number):
+        amount = float(re.sub(r'[.,]', '', number))
+    else:
+        amount = float(number.replace(',', ''))
+    if match.group(2):
+        amount *= 1000
+    return amount
+
+
+def profile_key(user_info: Dict[str, Any], mode: str = 'prose') -> str:
+    """Build the cache key for a traveler profile and output mode
+    ('prose', 'sectioned' or 'structured')."""
+    key = {'mode': mode}
+    for field in PROFILE_FIELDS:
+        value = user_info.get(field)
+        if field == 'days' and value is not None:
+            key[field] = int(value)
+        elif field == 'budget':
+            amount = parse_budget(value)
+            key[field] = amount if amount is not None else fold_text(value)
+        else:
+            key[field] = fold_text(value)
+    return json.dumps(key, sort_keys=True)
+
+
+class CachedItinerary(NamedTuple):
+    text: str
+    # The plan behind a structured itinerary, None for the other modes
+    plan: Optional[Dict[str, Any]] = None
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+
+class MemoryCache(CacheStats):
+    """Thread-safe LRU with a per-entry time to live."""
+
+    def __init__(self, max_entries: int = 256, ttl: float = 24 * 3600):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            self.record(entry is not None)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache(CacheStats):
+    """On-disk cache that survives restarts; expired rows are ignored and pruned."""
+
+    def __init__(self, path: str, ttl: float = 7 * 24 * 3600):
+        super().__init__()
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS itineraries "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, stored_at FROM itineraries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and time.time() - row[1] > self.ttl:
+                self._db.execute("DELETE FROM itineraries WHERE key = ?", (key,))
+                self._db.commit()
+                row = None
+            self.record(row is not None)
+            return row[0] if row is not None else None
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO itineraries (key, value, stored_at) VALUES (?, ?, ?)",
+                (key, value, time.time())
+            )
+            self._db.commit()
+
+    def recent(self, limit: int) -> List[Tuple[str, str, float]]:
+        """(key, value, stored_at) of the newest unexpired rows, oldest first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, value, stored_at FROM itineraries WHERE stored_at >= ? "
+                "ORDER BY stored_at DESC LIMIT ?", (time.time() - self.ttl, limit)
+            ).fetchall()
+        return rows[::-1]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class ItineraryCache(CacheStats):
+    """Profile-keyed itinerary cache in front of the model.
+
+    Lookups go to the in-memory LRU first and fall back to the optional disk
+    store, promoting disk hits into memory. With a ``similarity`` index,
+    ``similar`` finds the closest stored profile; the index is filled from
+    the disk store on start.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 24 * 3600,
+                 path: Optional[str] = None, similarity: Optional[SimilarityIndex] = None):
+        super().__init__()
+        self.memory = MemoryCache(max_entries=max_entries, ttl=ttl)
+        self.disk = SQLiteCache(path, ttl=ttl) if path else None
+        self.similarity = similarity
+        if similarity is not None and self.disk is not None:
+            # Disk rows carry wall-clock times; the index ages entries on the monotonic clock
+            offset = time.monotonic() - time.time()
+            for key, raw, stored_at in self.disk.recent(similarity.max_entries):
+                similarity.add(key, raw, stored_at + offset)
+
+    def get(self, user_info: Dict[str, Any], mode: str = 'prose') -> Optional[CachedItinerary]:
+        key = profile_key(user_info, mode)
+        raw = self.memory.get(key)
+        if raw is None and self.disk is not None:
+            raw = self.disk.get(key)
+            if raw is not None:
+                self.memory.set(key, raw)
+        self.record(raw is not None)
+        if raw is None:
+            return None
+        return stored_itinerary(raw, user_info)
+
+    def similar(self, user_info: Dict[str, Any], mode: str = 'prose') -> Optional[SimilarItinerary]:
+        """The closest stored itinerary of the same mode for a profile without an exact entry, re-addressed."""
+        if self.similarity is None:
+            return None
+        match = self.similarity.find(profile_key(user_info, mode))
+        if match is None:
+            return None
+        return match._replace(**stored_itinerary(match.text, user_info)._asdict())
+
+    def put(self, user_info: Dict[str, Any], text: str, mode: str = 'prose',
+            plan: Optional[Dict[str, Any]] = None):
+        key = profile_key(user_info, mode)
+        entry = {'name': user_info.get('name'), 'text': text}
+        if plan is not None:
+            entry['plan'] = plan
+        raw = json.dumps(entry)
+        self.memory.set(key, raw)
+        if self.disk is not None:
+            self.disk.set(key, raw)
+        if self.similarity is not None:
+            self.similarity.add(key, raw)
+
+
+def stored_itinerary(raw: str, user_info: Dict[str, Any]) -> CachedItinerary:
+    """A stored entry with its traveler's name replaced by the current one."""
+    entry = json.loads(raw)
+    text = entry['text']
+    if entry['name'] and user_info.get('name'):
+        # Whole words only: a stored "Al" must not turn "Alps" into "Bobps"
+        text = re.sub(rf"\b{re.escape(entry['name'])}\b", lambda _: user_info['name'], text)
+    return CachedItinerary(text, entry.get('plan'))
@@ -0,0 +1,106 @@
+"""A generated itinerary as ordered parts that can be replaced one at a time.
+
+``ItineraryDocument.parse`` cuts an itinerary at its numbered section
+headings (the ``SECTIONS`` of ``itinerary_sections``, however the model
+decorated them) and, inside the day-by-day section, at every "Day N" line.
+Parts keep their exact text, so ``render()`` returns the original itinerary
+unchanged until a part is replaced. An itinerary without recognizable
+headings is still split into days; text before the first heading is the
+``intro`` part.
+"""
+import re
+from typing import List, NamedTuple, Optional, Tuple
+
+# Section key -> how its title starts; a heading line holds nothing but the title
+HEADING_TITLES = (
+    ('overview', r"trip\s+overview"),
+    ('season', r"season(?:al)?[\s,&]+weather|weather\s+(?:&|and)\s+packing"),
+    ('flights', r"flights?(?:\s+recommendations?)?"),
+    ('accommodation', r"accommodations?(?:\s+strategy)?"),
+    ('days', r"(?:detailed\s+)?day[\s-]+by[\s-]+day"),
+    ('budget', r"(?:comprehensive\s+)?budget\s+breakdown"),
+    ('tips', r"(?:practical\s+)?travel\s+tips"),
+    ('money_saving', r"money[\s-]+saving"),
+)
+HEADING = re.compile(
+    r"^[#*_\s]*(?:\d{1,2}[.)]\s*)?[*_]*(?:"
+    + "|".join(f"(?P<{key}>{title})" for key, title in HEADING_TITLES)
+    + r")[^\n:$]{0,50}[:*#_\s]*$",
+    re.IGNORECASE | re.MULTILINE)
+DAY_LINE = re.compile(r"^[#*_\s-]*day\s+(\d{1,2})\b(?!\s*(?:-|–|to)\s*\d)", re.IGNORECASE | re.MULTILINE)
+
+
+class Part(NamedTuple):
+    # Section key, ``day_key(n)``, ``intro``, or "" for a repeated heading
+    key: str
+    text: str
+
+
+def day_key(number: int) -> str:
+    return f"day:{number}"
+
+
+def day_cuts(text: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """(offset, key) of the first "Day N" line of every day in ``text[start:end]``."""
+    cuts = []
+    seen = set()
+    for match in DAY_LINE.finditer(text, start, end):
+        number = int(match.group(1))
+        if number not in seen:
+            seen.add(number)
+            cuts.append((match.start(), day_key(number)))
+    return cuts
+
+
+class ItineraryDocument:
+    def __init__(self, parts: List[Part]):
+        self.parts = parts
+
+    @classmethod
+    def parse(cls, text: str) -> 'ItineraryDocument':
+        # (offset, key) of every cut, in order
+        cuts = [(0, 'intro')]
+        for match in HEADING.finditer(text):
+            key = match.lastgroup
+            # Sectioned itineraries repeat the day-by-day heading for every chunk
+            cuts.append((match.start(), "" if any(key == seen for _, seen in cuts) else key))
+
+        day_section = [index for index, (_, key) in enumerate(cuts) if key == 'days']
+        if day_section or len(cuts) == 1:
+            index = day_section[0] if day_section else 0
+            # The day-by-day section runs up to the next new section
+            following = [offset for offset, key in cuts[index + 1:] if key]
+            end = following[0] if following else len(text)
+            cuts += day_cuts(text, cuts[index][0], end)
+            cuts.sort(key=lambda cut: cut[0])
+
+        parts = []
+        for (offset, key), (following, _) in zip(cuts, cuts[1:] + [(len(text), "")]):
+            if following > offset:
+                parts.append(Part(key, text[offset:following]))
+        return cls(parts)
+
+    def keys(self) -> List[str]:
+        return [part.key for part in self.parts if part.key]
+
+    def days(self) -> List[int]:
+        return [int(part.key[4:]) for part in self.parts if part.key.startswith('day:')]
+
+    def get(self, key: str) -> Optional[str]:
+        for part in self.parts:
+            if part.key == key:
+                return part.text
+        return None
+
+    def replace(self, key: str, text: str):
+        """Swap in new text for ``key``, keeping the surrounding whitespace."""
+        for index, part in enumerate(self.parts):
+            if part.key == key:
+                leading = part.text[:len(part.text) - len(part.text.lstrip())]
+                trailing = part.text[len(part.text.rstrip()):]
+                self.parts[index] = Part(key, leading + text.strip() + trailing)
+                return
+        raise KeyError(key)
+
+    def render(self) -> str:
+        return "".join(part.text for part in self.parts)
@@ -0,0 +1,181 @@
+"""Itinerary prompt, described section by section.
+
+``itinerary_prompt`` asks for the whole itinerary in one completion.
+``section_prompts`` splits the same request into one prompt per section,
+with the day-by-day part cut into ranges of ``DAYS_PER_CHUNK`` days, so the
+parts can be generated concurrently (each with its own output-token cap) and
+merged back in order.
+
+Section bodies refer to the profile ("the travel dates", "the total
+budget") instead of repeating its values, so every prompt is its fixed
+instructions, built once at import, followed by the rendered profile.
+
+Each section also lists the late intake answers it ``needs`` (budget,
+dates), and its prompt carries only those profile lines, followed by the
+destination ``facts`` it is written from (see ``destination_facts``). The
+parts that need neither (overview, practical tips) can therefore be
+generated while the traveler is still answering: ``section_prompts`` leaves out whatever the
+profile cannot yet support, and a prompt made early is identical to the one
+made once the profile is complete.
+"""
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from destination_facts import FIELDS as FACT_FIELDS, Facts, facts_block
+from prompt_templates import PromptTemplate
+
+DAYS_PER_CHUNK = 5
+# Output caps: a section is a handful of bullets, a day plan about as long
+# as ``model_router`` budgets per day for the whole itinerary
+SECTION_MAX_TOKENS = 300
+DAY_MAX_TOKENS = 250
+
+PROFILE = PromptTemplate('profile', """TRAVELER PROFILE:
+- Name: {name}
+- Departing from: {source}
+- Destination: {destination}
+- Trip duration: {days} days
+- Total budget: ${budget} USD
+- Travel dates: {dates}
+""")
+
+
+# Intake answers that only some sections depend on; they are asked last
+LATE_FIELDS = ('budget', 'dates')
+
+
+class Section(NamedTuple):
+    key: str
+    title: str
+    body: str
+    # The ``LATE_FIELDS`` the section is written from
+    needs: Tuple[str, ...] = ()
+    # Destination facts given to the model rather than recalled by it
+    facts: Tuple[str, ...] = ()
+
+
+SECTIONS = (
+    Section('overview', "TRIP OVERVIEW & HIGHLIGHTS", """   - Brief destination overview and what makes it special
+   - Top 3-5 must-do experiences for this trip"""),
+    Section('season', "SEASON, WEATHER & PACKING", """   - Best aspects of traveling during the travel dates
+   - Weather expectations
+   - Packing suggestions""", ('dates',), ('plugs',)),
+    Section('flights', "FLIGHT RECOMMENDATIONS", """   - Suggested flight routes and airlines
+   - Estimated flight costs
+   - Best booking timing and tips""", ('budget', 'dates')),
+    Section('accommodation', "ACCOMMODATION STRATEGY", """   - 2-3 accommodation options within budget
+   - Recommended neighborhoods/areas to stay
+   - Estimated nightly rates""", ('budget',)),
+    Section('days', "DETAILED DAY-BY-DAY ITINERARY", """   - Specific activities with timing (morning, afternoon, evening)
+   - Transportation between locations
+   - Estimated costs for each activity
+   - Restaurant recommendations for each day
+   - Cultural tips and local etiquette""", ('budget',)),
+    Section('budget', "COMPREHENSIVE BUDGET BREAKDOWN", """   - Flights: $X
+   - Accommodation: $X (per night × number of nights)
+   - Food: $X (breakdown by meal type)
+   - Activities/Attractions: $X
+   - Local transportation: $X
+   - Shopping/Miscellaneous: $X
+   - TOTAL: Should not exceed the total budget""", ('budget',)),
+    Section('tips', "PRACTICAL TRAVEL TIPS", """   - Getting around: local transport options and passes
+   - Currency and payment methods
+   - Important local customs
+   - Safety considerations
+   - Essential phrases in local language
+   - Emergency contacts and embassy information""", (), ('currency', 'languages', 'emergency', 'driving')),
+    Section('money_saving', "MONEY-SAVING TIPS", """   - How to stretch the budget further
+   - Free activities and experiences
+   - Local alternatives to tourist traps""", ('budget',)),
+)
+
+
+ITINERARY = PromptTemplate('itinerary', """
+Create a comprehensive, personalized travel itinerary for the traveler profiled at the end of this message.
+
+REQUIREMENTS:
+Please create a detailed itinerary that includes:
+
+""" + "\n\n".join(f"{number}. {section.title}\n{section.body}"
+                   for number, section in enumerate(SECTIONS, 1)) + """
+
+Make this itinerary exciting, practical, and perfectly tailored to the traveler's trip!
+
+{profile}""")
+
+SECTION_PART = PromptTemplate('section', """
+Write one part of a personalized travel itinerary for the traveler profiled at the end of this message.
+Write ONLY the part below. Start directly with its content, without an introduction or any other section.
+
+{title}
+{body}
+{scope}
+{profile}""")
+
+DAYS_SCOPE = PromptTemplate('days_scope', """
+Cover only days {first} to {last} of the {days}-day trip; the other days are planned separately.
+""")
+
+
+def partial_profile(needs: Tuple[str, ...]) -> PromptTemplate:
+    """``PROFILE`` without the lines of the late fields not in ``needs``."""
+    dropped = [f"{{{field}}}" for field in LATE_FIELDS if field not in needs]
+    lines = [line for line in PROFILE.text.splitlines(keepends=True)
+             if not any(field in line for field in dropped)]
+    return PromptTemplate(f"profile ({', '.join(needs) or 'no late fields'})", "".join(lines))
+
+
+SECTION_PROFILES = {section.needs: partial_profile(section.needs) for section in SECTIONS}
+
+TEMPLATES = (PROFILE, ITINERARY, SECTION_PART, DAYS_SCOPE) + tuple(SECTION_PROFILES.values())
+
+# Section prompts up to the profile are the same for every traveler
+SECTION_PREFIXES = {
+    section.key: SECTION_PART.render({'title': f"{number}. {section.title}", 'body': section.body,
+                                      'scope': "", 'profile': ""})
+    for number, section in enumerate(SECTIONS, 1)
+}
+
+
+def itinerary_prompt(user_info: Dict[str, Any], facts: Optional[Facts] = None) -> str:
+    """Single prompt asking for the complete itinerary."""
+    return ITINERARY.render({'profile': PROFILE.render(user_info)}) + facts_block(facts, FACT_FIELDS)
+
+
+def day_ranges(days: int, days_per_chunk: int = DAYS_PER_CHUNK) -> List[Tuple[int, int]]:
+    return [(first, min(first + days_per_chunk - 1, days))
+            for first in range(1, days + 1, days_per_chunk)]
+
+
+class SectionPrompt(NamedTuple):
+    heading: str
+    prompt: str
+    max_tokens: int = SECTION_MAX_TOKENS
+
+
+def section_prompts(user_info: Dict[str, Any], days_per_chunk: int = DAYS_PER_CHUNK,
+                    facts: Optional[Facts] = None) -> List[SectionPrompt]:
+    """Heading, prompt and output cap of every part of the itinerary, in display order.
+
+    Parts whose section needs a late field that is still unknown are left
+    out; nothing is returned before the other profile fields are known.
+    """
+    if any(user_info.get(field) is None for field in PROFILE.fields if field not in LATE_FIELDS):
+        return []
+    parts = []
+    for number, section in enumerate(SECTIONS, 1):
+        if any(user_info.get(field) is None for field in section.needs):
+            continue
+        profile = SECTION_PROFILES[section.needs].render(user_info)
+        if section.facts:
+            profile += facts_block(facts, section.facts)
+        if section.key != 'days':
+            parts.append(SectionPrompt(f"{number}. {section.title}", SECTION_PREFIXES[section.key] + profile))
+            continue
+        for first, last in day_ranges(int(user_info['days']), days_per_chunk):
+            title = f"{number}. {section.title} (DAYS {first}-{last})"
+            scope = DAYS_SCOPE.render({'first': first, 'last': last, 'days': user_info['days']})
+            parts.append(SectionPrompt(title, SECTION_PART.render({'title': title, 'body': section.body,
+                                                                   'scope': scope, 'profile': profile}),
+                                       DAY_MAX_TOKENS * (last - first + 1)))
+    return parts
+
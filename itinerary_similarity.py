@@ -0,0 +1,248 @@
+"""Reuse itineraries generated for profiles close to the current one.
+
+The exact-match ``ItineraryCache`` only helps when a profile normalizes to
+the same key. "Paris, 5 days, $2000, May 2025" and "paris france, 5 days,
+$2100, may 2025" deserve the same plan too, so ``SimilarityIndex`` keeps the
+normalized profile of every stored itinerary, bucketed by day count and
+season, and scores candidates in the bucket:
+
+* the destination and departure city by character-trigram overlap (a place
+  that only adds words, "paris" vs "paris france", counts as close);
+* the budget by the ratio of the two amounts, which must be within
+  ``BUDGET_BAND`` of each other;
+* the travel dates by trigram overlap.
+
+Only itineraries generated in the same output mode (see ``profile_key``)
+are candidates for each other.
+
+A match scoring at least ``reuse_threshold`` is served as it is, provided
+its destination is the same place once folded: "Paris Texas" scores high
+against "Paris" but is not Paris. One scoring at least ``adapt_threshold``
+is adapted: only the parts of it that depend on what changed (flights for
+another departure city, the budget breakdown for another amount) are
+rewritten, with the follow-up revision prompt, and spliced back in. A match
+for another destination, or anything lower, is generated from scratch.
+"""
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from itinerary_document import ItineraryDocument
+
+REUSE_THRESHOLD = 0.9
+ADAPT_THRESHOLD = 0.7
+# Destinations scoring lower are different places, whatever else matches
+DESTINATION_MATCH = 0.8
+# The smaller budget must be at least this fraction of the larger
+BUDGET_BAND = 0.8
+# Similarity of a place that only adds words to the other ("paris france")
+EXTENDED_PLACE = 0.9
+
+WEIGHTS = {'destination': 0.4, 'source': 0.2, 'budget': 0.2, 'dates': 0.2}
+
+MONTH = re.compile(r"\b(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\b")
+SEASON_NAME = re.compile(r"\b(winter|spring|summer|autumn|fall)\b")
+MONTH_SEASONS = ('winter', 'winter', 'spring', 'spring', 'spring', 'summer',
+                 'summer', 'summer', 'autumn', 'autumn', 'autumn', 'winter')
+MONTHS = ('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec')
+
+# Parts of the itinerary to rewrite when a profile field differs
+FIELD_PARTS = {
+    'source': ('flights',),
+    'budget': ('budget',),
+    'dates': ('overview', 'flights'),
+}
+FIELD_LABELS = {'source': "the departure city", 'budget': "the total budget", 'dates': "the travel dates"}
+
+
+def place_words(value: Any) -> Tuple[str, ...]:
+    return tuple(re.findall(r"[^\W_]+", str(value).casefold()))
+
+
+def trigrams(words: Tuple[str, ...]) -> FrozenSet[str]:
+    text = f" {' '.join(words)} "
+    return frozenset(text[index:index + 3] for index in range(len(text) - 2))
+
+
+def dice(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    return 2 * len(a & b) / (len(a) + len(b)) if a or b else 1.0
+
+
+def place_similarity(a: 'Features', b: 'Features', field: str) -> float:
+    words_a, words_b = getattr(a, field + '_words'), getattr(b, field + '_words')
+    score = dice(getattr(a, field), getattr(b, field))
+    shorter, longer = sorted((words_a, words_b), key=len)
+    if shorter and longer[:len(shorter)] == shorter:
+        score = max(score, EXTENDED_PLACE if shorter != longer else 1.0)
+    return score
+
+
+def season(dates: str) -> str:
+    """The season the dates fall in, or the dates themselves when no month is named."""
+    named = SEASON_NAME.search(dates)
+    if named:
+        return 'autumn' if named.group(1) == 'fall' else named.group(1)
+    month = MONTH.search(dates)
+    return MONTH_SEASONS[MONTHS.index(month.group(1))] if month else dates
+
+
+class Features(NamedTuple):
+    destination: FrozenSet[str]
+    destination_words: Tuple[str, ...]
+    source: FrozenSet[str]
+    source_words: Tuple[str, ...]
+    days: int
+    budget: Optional[float]
+    dates: FrozenSet[str]
+    season: str
+    mode: str
+
+
+def features(profile: Dict[str, Any]) -> Features:
+    """Comparable form of a ``profile_key`` dict."""
+    destination, source = place_words(profile['destination']), place_words(profile['source'])
+    budget = profile['budget']
+    return Features(trigrams(destination), destination, trigrams(source), source,
+                    int(profile['days']), budget if isinstance(budget, float) else None,
+                    trigrams(place_words(profile['dates'])), season(str(profile['dates'])),
+                    profile.get('mode', 'prose'))
+
+
+def budget_similarity(a: Optional[float], b: Optional[float]) -> float:
+    if a is None or b is None:
+        return 1.0 if a == b else 0.0
+    return min(a, b) / max(a, b) if max(a, b) else 1.0
+
+
+def similarity(a: Features, b: Features) -> Optional[float]:
+    """Weighted score in [0, 1], or None when ``b`` is not a candidate for ``a`` at all."""
+    if a.days != b.days or a.season != b.season or a.mode != b.mode:
+        return None
+    scores = {
+        'destination': place_similarity(a, b, 'destination'),
+        'source': place_similarity(a, b, 'source'),
+        'budget': budget_similarity(a.budget, b.budget),
+        'dates': dice(a.dates, b.dates),
+    }
+    if scores['destination'] < DESTINATION_MATCH or scores['budget'] < BUDGET_BAND:
+        return None
+    return sum(WEIGHTS[field] * score for field, score in scores.items())
+
+
+class SimilarItinerary(NamedTuple):
+    score: float
+    # The entry as the index holds it; ``ItineraryCache.similar`` returns the
+    # itinerary text, re-addressed to the current traveler
+    text: str
+    # The ``profile_key`` dict it was generated for
+    profile: Dict[str, Any]
+    # Fields whose normalized value differs from the lookup's: 'destination'
+    # (never adapted), then ``FIELD_PARTS`` fields
+    changed: Tuple[str, ...]
+    reusable: bool
+    # The structured plan stored with it, filled in by ``ItineraryCache.similar``
+    plan: Optional[Dict[str, Any]] = None
+
+
+class SimilarityIndex:
+    """Normalized profiles of stored itineraries, searched for the closest one.
+
+    Entries are bucketed by (days, season), so a lookup only scores profiles
+    that could qualify; the oldest entries beyond ``max_entries`` or older
+    than ``ttl`` are dropped, like the memory cache's.
+    """
+
+    def __init__(self, reuse_threshold: float = REUSE_THRESHOLD,
+                 adapt_threshold: float = ADAPT_THRESHOLD,
+                 max_entries: int = 1024, ttl: float = 24 * 3600):
+        self.reuse_threshold = reuse_threshold
+        self.adapt_threshold = adapt_threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Features, Dict[str, Any], str]]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, str], Dict[str, None]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, key: str, raw: str, stored_at: Optional[float] = None):
+        """Index the itinerary stored under ``key`` (a ``profile_key``)."""
+        profile = json.loads(key)
+        entry = features(profile)
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (time.monotonic() if stored_at is None else stored_at, entry, profile, raw)
+            self._buckets.setdefault((entry.days, entry.season), {})[key] = None
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+
+    def _discard(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            bucket = self._buckets[(entry[1].days, entry[1].season)]
+            del bucket[key]
+            if not bucket:
+                del self._buckets[(entry[1].days, entry[1].season)]
+
+    def find(self, key: str) -> Optional[SimilarItinerary]:
+        """The best-scoring entry for the profile ``key`` that clears ``adapt_threshold``."""
+        profile = json.loads(key)
+        wanted = features(profile)
+        best = None
+        now = time.monotonic()
+        with self._lock:
+            for candidate in list(self._buckets.get((wanted.days, wanted.season), ())):
+                stored_at, entry, stored, raw = self._entries[candidate]
+                if now - stored_at > self.ttl:
+                    self._discard(candidate)
+                    continue
+                score = similarity(wanted, entry)
+                if score is not None and score >= self.adapt_threshold and (best is None or score > best[0]):
+                    best = (score, raw, stored, entry)
+        if best is None:
+            return None
+        score, raw, stored, entry = best
+        changed = tuple(field for field in FIELD_PARTS if stored[field] != profile[field])
+        if entry.destination_words != wanted.destination_words:
+            changed = ('destination',) + changed
+        return SimilarItinerary(score, raw, stored, changed,
+                                score >= self.reuse_threshold and 'destination' not in changed)
+
+
+def adaptation_targets(document: ItineraryDocument, changed: Tuple[str, ...]) -> Tuple[str, ...]:
+    """Keys of the parts to rewrite, in itinerary order; empty when none can be found
+    or the destination changed, which leaves nothing worth keeping."""
+    if 'destination' in changed:
+        return ()
+    wanted = {key for field in changed for key in FIELD_PARTS[field]}
+    return tuple(key for key in document.keys() if key in wanted)
+
+
+def adaptation_request(stored: Dict[str, Any], user_info: Dict[str, Any], changed: Tuple[str, ...]) -> str:
+    """The change request given to the revision prompt of every rewritten part."""
+    differences = []
+    for field in changed:
+        before = stored[field]
+        if isinstance(before, float):
+            before = f"${before:,.0f}"
+        differences.append(f"{FIELD_LABELS[field]} is now {user_info[field]} (was {before})")
+    return "The itinerary was written for a slightly different trip: " + "; ".join(differences)
+
+
+class Adaptation(NamedTuple):
+    # The similar itinerary, parsed
+    document: ItineraryDocument
+    targets: Tuple[str, ...]
+    # One revision prompt per target
+    prompts: List[str]
+
+
+def adapt(adaptation: Adaptation, texts: List[str]) -> str:
+    """Splice the rewritten parts into the similar itinerary and return the result."""
+    for key, text in zip(adaptation.targets, texts):
+        adaptation.document.replace(key, text)
+    return adaptation.document.render()
@@ -0,0 +1,218 @@
+"""Chat backends the planner can run against.
+
+A backend is anything shaped like the Groq SDK client: ``ChatBackend`` and
+``AsyncChatBackend`` below spell out the contract (the same one the
+OpenAI-compatible SDKs follow), so ``groq.Groq``/``groq.AsyncGroq`` are
+backends as they are, and every layer above them (rate limiting, pooling)
+wraps a backend without caring which one it is.
+
+``FakeBackend``/``AsyncFakeBackend`` answer locally and deterministically,
+with configurable latency, time to first token, generation speed and error
+rate, so the bot, CLI, GUI and server can be load-tested offline. Select
+them with ``--backend fake`` or ``TRAVEL_PLANNER_BACKEND=fake`` and pick a
+timing profile from ``PROFILES`` with ``TRAVEL_PLANNER_FAKE_PROFILE``.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, Iterator, List, NamedTuple, Optional, Protocol
+
+import groq
+import httpx
+
+from conversation_history import count_message_tokens
+
+
+class ChatCompletions(Protocol):
+    def create(self, *, messages: List[Dict[str, str]], model: str, temperature: float,
+               max_tokens: int, stream: bool = False, timeout: Optional[float] = None) -> Any:
+        """Return a completion (``choices[0].message.content``, ``usage``),
+        or with ``stream=True`` an iterator of chunks (``choices[0].delta.content``);
+        ``timeout`` (seconds) bounds the request."""
+
+
+class AsyncChatCompletions(Protocol):
+    async def create(self, *, messages: List[Dict[str, str]], model: str, temperature: float,
+                     max_tokens: int, stream: bool = False, timeout: Optional[float] = None) -> Any:
+        """Awaitable ``ChatCompletions.create``; streams are async iterators."""
+
+
+class Chat(Protocol):
+    completions: ChatCompletions
+
+
+class AsyncChat(Protocol):
+    completions: AsyncChatCompletions
+
+
+class ChatBackend(Protocol):
+    chat: Chat
+
+
+class AsyncChatBackend(Protocol):
+    chat: AsyncChat
+
+
+class FakeProfile(NamedTuple):
+    # Seconds before the provider starts working on the request
+    latency: float = 0.05
+    # Seconds from then until the first token
+    time_to_first_token: float = 0.25
+    tokens_per_second: float = 750.0
+    # Fraction of requests failing with a 500; another fraction with a 429
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    # Upper bound on the length of long answers, in tokens
+    max_answer_tokens: int = 1500
+
+
+PROFILES = {
+    'instant': FakeProfile(latency=0.0, time_to_first_token=0.0, tokens_per_second=1e9),
+    'groq': FakeProfile(),
+    'slow': FakeProfile(latency=0.3, time_to_first_token=1.5, tokens_per_second=120.0),
+    'flaky': FakeProfile(error_rate=0.05, rate_limit_rate=0.1),
+}
+
+WORDS = (
+    "explore", "old", "town", "market", "museum", "walk", "harbor", "sunset", "local",
+    "lunch", "dinner", "tapas", "tram", "viewpoint", "gallery", "park", "coffee", "beach",
+    "castle", "cathedral", "food", "tour", "neighborhood", "river", "cruise", "budget",
+    "tickets", "morning", "afternoon", "evening", "hotel", "street", "art", "music"
+)
+
+CHUNK_TOKENS = 8
+# Prompts showing a JSON itinerary schema (see ``structured_itinerary``) get a JSON plan
+JSON_PLAN_REQUEST = re.compile(r'"days":\[\{')
+TRIP_DAYS = re.compile(r"Trip duration: (\d+) days")
+# Words with their leading space, runs of punctuation: roughly how a tokenizer splits JSON
+JSON_TOKEN = re.compile(r"\s*\w+|\s*[^\w\s]+")
+
+
+def fake_phrase(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def fake_plan(prompt: str, rng: random.Random) -> Dict[str, Any]:
+    """A plan in the ``structured_itinerary`` schema for the trip length the prompt states."""
+    days = TRIP_DAYS.search(prompt)
+    return {
+        'overview': fake_phrase(rng, 12), 'highlights': [fake_phrase(rng, 4) for _ in range(3)],
+        'weather': fake_phrase(rng, 8), 'packing': [fake_phrase(rng, 2) for _ in range(4)],
+        'flights': {'route': fake_phrase(rng, 3), 'airlines': [fake_phrase(rng, 1)], 'cost': rng.randrange(300, 900),
+                    'tip': fake_phrase(rng, 6)},
+        'stays': [{'name': fake_phrase(rng, 2), 'area': fake_phrase(rng, 1), 'nightly': rng.randrange(60, 200)}
+                  for _ in range(2)],
+        'days': [{'day': number, 'title': fake_phrase(rng, 3),
+                  'plan': [{'time': time_of_day, 'do': fake_phrase(rng, 5), 'cost': rng.randrange(0, 60)}
+                           for time_of_day in ('morning', 'afternoon', 'evening')],
+                  'food': [fake_phrase(rng, 2) for _ in range(2)]}
+                 for number in range(1, int(days.group(1)) + 1 if days else 4)],
+        'budget': {category: rng.randrange(100, 800)
+                   for category in ('flights', 'accommodation', 'food', 'activities', 'transport', 'other')},
+        'tips': [fake_phrase(rng, 6) for _ in range(4)], 'saving': [fake_phrase(rng, 6) for _ in range(3)],
+    }
+
+
+def fake_answer(messages: List[Dict[str, str]], max_tokens: int, limit: int) -> List[str]:
+    """Deterministic answer for ``messages`` as a list of token-sized words."""
+    prompt = messages[-1]["content"] if messages else ""
+    seed = int.from_bytes(hashlib.sha256(prompt.encode("utf-8")).digest()[:8], "big")
+    rng = random.Random(seed)
+    if JSON_PLAN_REQUEST.search(prompt):
+        # Cut off at ``max_tokens`` like a real completion, even mid-JSON
+        return JSON_TOKEN.findall(json.dumps(fake_plan(prompt, rng), separators=(',', ':')))[:max_tokens]
+    # Long, structured prompts get long answers; short ones a sentence or two
+    length = min(max_tokens, limit if len(prompt) > 400 else 40 + seed % 40)
+    tokens = []
+    line = 0
+    while len(tokens) < length:
+        line += 1
+        tokens.append(f"\nDay {line // 12 + 1}:" if line % 12 == 1 else "\n-")
+        tokens.extend(f" {rng.choice(WORDS)}" for _ in range(min(11, length - len(tokens))))
+    return tokens[:length]
+
+
+class FakeBackend:
+    """Offline stand-in for ``groq.Groq``."""
+
+    def __init__(self, profile: FakeProfile = PROFILES['groq'], seed: Optional[int] = None):
+        self.profile = profile
+        self._rng = random.Random(seed)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _maybe_fail(self):
+        roll = self._rng.random()
+        if roll < self.profile.rate_limit_rate:
+            raise groq.RateLimitError("Rate limit reached (fake backend)",
+                                      response=fake_response(429, {"retry-after": "1"}), body=None)
+        if roll < self.profile.rate_limit_rate + self.profile.error_rate:
+            raise groq.InternalServerError("Internal server error (fake backend)",
+                                           response=fake_response(500), body=None)
+
+    def create(self, *, messages, model, temperature=0.7, max_tokens=1024, stream=False, **kwargs):
+        time.sleep(self.profile.latency)
+        self._maybe_fail()
+        tokens = fake_answer(messages, max_tokens, self.profile.max_answer_tokens)
+        if stream:
+            return self._stream(tokens, model)
+        time.sleep(self.profile.time_to_first_token + len(tokens) / self.profile.tokens_per_second)
+        return fake_completion("".join(tokens), model, messages, len(tokens))
+
+    def _stream(self, tokens: List[str], model: str) -> Iterator[Any]:
+        time.sleep(self.profile.time_to_first_token)
+        for start in range(0, len(tokens), CHUNK_TOKENS):
+            piece = tokens[start:start + CHUNK_TOKENS]
+            if start:
+                time.sleep(len(piece) / self.profile.tokens_per_second)
+            yield fake_chunk("".join(piece), model)
+
+    def close(self):
+        pass
+
+
+class AsyncFakeBackend(FakeBackend):
+    """Offline stand-in for ``groq.AsyncGroq``."""
+
+    async def create(self, *, messages, model, temperature=0.7, max_tokens=1024, stream=False, **kwargs):
+        await asyncio.sleep(self.profile.latency)
+        self._maybe_fail()
+        tokens = fake_answer(messages, max_tokens, self.profile.max_answer_tokens)
+        if stream:
+            return self._astream(tokens, model)
+        await asyncio.sleep(self.profile.time_to_first_token + len(tokens) / self.profile.tokens_per_second)
+        return fake_completion("".join(tokens), model, messages, len(tokens))
+
+    async def _astream(self, tokens: List[str], model: str) -> AsyncIterator[Any]:
+        await asyncio.sleep(self.profile.time_to_first_token)
+        for start in range(0, len(tokens), CHUNK_TOKENS):
+            piece = tokens[start:start + CHUNK_TOKENS]
+            if start:
+                await asyncio.sleep(len(piece) / self.profile.tokens_per_second)
+            yield fake_chunk("".join(piece), model)
+
+    async def close(self):
+        pass
+
+
+def fake_response(status: int, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+    request = httpx.Request("POST", "https://fake.invalid/openai/v1/chat/completions")
+    return httpx.Response(status, request=request, headers=headers)
+
+
+def fake_completion(text: str, model: str, messages: List[Dict[str, str]], completion_tokens: int) -> Any:
+    prompt_tokens = count_message_tokens(messages)
+    return SimpleNamespace(
+        model=model,
+        choices=[SimpleNamespace(message=SimpleNamespace(role="assistant", content=text),
+                                 finish_reason="stop")],
+        usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                              total_tokens=prompt_tokens + completion_tokens)
+    )
+
+
+def fake_chunk(text: str, model: str) -> Any:
+    return SimpleNamespace(model=model, choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
@@ -0,0 +1,239 @@
+"""Simulate many travelers planning trips at once and report how the planner scales.
+
+    python load_test.py --users 1,4,16,64 --duration 30
+    python load_test.py --url http://127.0.0.1:8000 --users 10,50,100
+
+Each virtual user repeatedly plays a whole conversation: greeting, the seven
+intake answers, the itinerary, then ``--follow-ups`` further messages,
+pausing for a random think time (exponential, mean ``--think-time``) before
+every message. Concurrency is ramped through the ``--users`` levels, each
+held for ``--duration`` seconds, and every level reports throughput, latency
+percentiles (overall and for itinerary turns) and the error rate.
+
+Without ``--url`` the users talk to in-process ``TravelPlannerBot``s sharing
+one client on the offline fake backend (``--profile``); with it, they talk
+to a running ``travel_planner_server.py`` over keep-alive connections. The
+first level whose throughput grows by less than 10% over the previous one is
+flagged as the knee of the curve.
+"""
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+from benchmark import TRAVELERS, conversation, summarize
+from itinerary_cache import ItineraryCache
+from llm_backends import PROFILES, FakeBackend
+from resilient_client import LLMError, ResiliencePolicy, ResilientClient
+from travel_planner_bot import TravelPlannerBot
+
+FOLLOW_UPS = (
+    "Can you suggest a cheaper hotel?",
+    "What should I pack?",
+    "Any vegetarian restaurants you'd recommend?",
+    "Is public transport easy to use there?",
+)
+# Throughput gains below this fraction mark the knee of the curve
+KNEE_GAIN = 0.10
+
+
+class Sample(NamedTuple):
+    kind: str
+    latency: float
+    ok: bool
+
+
+class InProcessTarget:
+    def __init__(self, client: ResilientClient, cache: Optional[ItineraryCache] = None,
+                 sectioned: bool = False):
+        self.client = client
+        self.cache = cache
+        self.sectioned = sectioned
+
+    def connect(self) -> 'InProcessTarget':
+        return self
+
+    def start(self) -> TravelPlannerBot:
+        bot = TravelPlannerBot(client=self.client, cache=self.cache, sectioned=self.sectioned)
+        bot.get_next_question()
+        return bot
+
+    def send(self, bot: TravelPlannerBot, message: str) -> bool:
+        try:
+            bot.process_input(message)
+        except LLMError:
+            return False
+        return True
+
+    def close(self):
+        pass
+
+
+class HttpTarget:
+    """One keep-alive connection to the planner server per virtual user."""
+
+    def __init__(self, url: str, timeout: float = 120.0):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.connection: Optional[http.client.HTTPConnection] = None
+
+    def connect(self) -> 'HttpTarget':
+        return HttpTarget(f"http://{self.host}:{self.port}", self.timeout)
+
+    def request(self, method: str, path: str, body: Optional[Dict[str, Any]] = None):
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        data = json.dumps(body or {}).encode('utf-8')
+        try:
+            self.connection.request(method, path, body=data,
+                                    headers={'Content-Type': 'application/json'})
+            response = self.connection.getresponse()
+            payload = json.loads(response.read() or b'{}')
+        except (OSError, http.client.HTTPException, ValueError):
+            self.close()
+            return 0, {}
+        return response.status, payload
+
+    def start(self) -> Optional[str]:
+        status, payload = self.request('POST', '/sessions')
+        return payload.get('session_id') if status == 201 else None
+
+    def send(self, session_id: Optional[str], message: str) -> bool:
+        if session_id is None:
+            return False
+        status, _ = self.request('POST', f'/sessions/{session_id}/messages', {'message': message})
+        return status == 200
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def virtual_user(target: Any, number: int, deadline: float, think_time: float,
+                 follow_ups: int, samples: List[Sample], lock: threading.Lock):
+    rng = random.Random(number)
+    target = target.connect()
+    recorded = []
+    try:
+        while time.monotonic() < deadline:
+            # The session greets the user itself; the last answer completes the profile
+            messages = conversation(TRAVELERS[number % len(TRAVELERS)])[1:]
+            kinds = ['intake'] * (len(messages) - 1) + ['itinerary']
+            for _ in range(follow_ups):
+                messages.append(rng.choice(FOLLOW_UPS))
+                kinds.append('follow_up')
+
+            started = time.perf_counter()
+            session = target.start()
+            recorded.append(Sample('start', time.perf_counter() - started, session is not None))
+            for kind, message in zip(kinds, messages):
+                if think_time:
+                    time.sleep(rng.expovariate(1 / think_time))
+                if time.monotonic() >= deadline:
+                    break
+                started = time.perf_counter()
+                ok = target.send(session, message)
+                recorded.append(Sample(kind, time.perf_counter() - started, ok))
+                if not ok:
+                    break
+    finally:
+        target.close()
+        with lock:
+            samples.extend(recorded)
+
+
+def run_level(target: Any, users: int, duration: float, think_time: float,
+              follow_ups: int) -> Dict[str, Any]:
+    samples: List[Sample] = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=virtual_user,
+                         args=(target, number, deadline, think_time, follow_ups, samples, lock),
+                         daemon=True)
+        for number in range(users)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    errors = sum(1 for sample in samples if not sample.ok)
+    return {
+        'users': users,
+        'requests': len(samples),
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        'itineraries': sum(1 for sample in samples if sample.kind == 'itinerary' and sample.ok),
+        'error_rate': round(errors / len(samples), 4) if samples else 0.0,
+        'latency_ms': summarize([sample.latency for sample in samples if sample.ok]),
+        'itinerary_latency_ms': summarize([sample.latency for sample in samples
+                                           if sample.kind == 'itinerary' and sample.ok]),
+        'elapsed_seconds': round(elapsed, 2),
+    }
+
+
+def find_knee(levels: List[Dict[str, Any]]) -> Optional[int]:
+    """User count of the first level that barely raised throughput."""
+    for previous, level in zip(levels, levels[1:]):
+        if level['throughput_rps'] < previous['throughput_rps'] * (1 + KNEE_GAIN):
+            return level['users']
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ramp simulated travelers against the planner")
+    parser.add_argument('--users', default='1,2,4,8,16,32',
+                        help="comma-separated concurrency levels")
+    parser.add_argument('--duration', type=float, default=30.0, help="seconds per level")
+    parser.add_argument('--think-time', type=float, default=1.0,
+                        help="mean seconds a user pauses before each message")
+    parser.add_argument('--follow-ups', type=int, default=2)
+    parser.add_argument('--url', help="planner server to load (default: in-process bots)")
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='groq',
+                        help="fake backend timing profile for in-process runs")
+    parser.add_argument('--sectioned', action='store_true')
+    parser.add_argument('--cached', action='store_true', help="share an itinerary cache (in-process)")
+    parser.add_argument('--requests-per-minute', type=float, default=1e9,
+                        help="client-side rate limit for in-process runs (default: unlimited)")
+    parser.add_argument('--tokens-per-minute', type=float, default=1e12)
+    parser.add_argument('--output', help="write the results as JSON")
+    args = parser.parse_args()
+
+    if args.url:
+        target = HttpTarget(args.url)
+    else:
+        client = ResilientClient(FakeBackend(PROFILES[args.profile]),
+                                 ResiliencePolicy(requests_per_minute=args.requests_per_minute,
+                                                  tokens_per_minute=args.tokens_per_minute))
+        target = InProcessTarget(client, ItineraryCache() if args.cached else None, args.sectioned)
+
+    levels = []
+    print(f"{'users':>6} {'req/s':>9} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} "
+          f"{'itin p95':>10} {'errors':>7}")
+    for users in (int(value) for value in args.users.split(',')):
+        level = run_level(target, users, args.duration, args.think_time, args.follow_ups)
+        levels.append(level)
+        latency, itinerary = level['latency_ms'], level['itinerary_latency_ms']
+        print(f"{users:>6} {level['throughput_rps']:>9.2f} {latency.get('p50', 0):>10.1f} "
+              f"{latency.get('p95', 0):>10.1f} {latency.get('p99', 0):>10.1f} "
+              f"{itinerary.get('p95', 0):>10.1f} {level['error_rate']:>7.2%}")
+
+    knee = find_knee(levels)
+    if knee is not None:
+        print(f"Throughput stops scaling at about {knee} concurrent users")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'config': vars(args), 'levels': levels, 'knee_users': knee}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
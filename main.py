@@ -1,28 +1,90 @@
+import argparse
 import os
 from dotenv import load_dotenv
+from client_registry import BACKENDS, get_client, requires_api_key
+from itinerary_cache import ItineraryCache
+from itinerary_similarity import ADAPT_THRESHOLD, REUSE_THRESHOLD, SimilarityIndex
+from metrics import enable_event_log, write_metrics
+from resilient_client import LLMError, REQUESTS_PER_MINUTE, ResiliencePolicy, TOKENS_PER_MINUTE, describe_error
+from structured_itinerary import export_itinerary
 from travel_planner_bot import TravelPlannerBot
 
 def main():
+    parser = argparse.ArgumentParser(description="TravelGenie command-line travel planner")
+    parser.add_argument('--sectioned', action='store_true',
+                        help="generate itinerary sections concurrently (faster for long trips)")
+    parser.add_argument('--backend', choices=BACKENDS,
+                        help="model backend; 'fake' runs offline (default: $TRAVEL_PLANNER_BACKEND or groq)")
+    parser.add_argument('--llm-extraction', action='store_true',
+                        help="let the model pick trip details out of long messages the rules can't parse")
+    parser.add_argument('--speculative', action='store_true',
+                        help="start itinerary sections while you answer the last questions")
+    parser.add_argument('--structured', action='store_true',
+                        help="have the model return the itinerary as JSON and format it locally (fewer tokens)")
+    parser.add_argument('--export', metavar='PATH',
+                        help="save the itinerary here on exit (.md, .html, .json or text)")
+    parser.add_argument('--similar', action='store_true',
+                        help="reuse or adapt itineraries stored for similar profiles")
+    parser.add_argument('--reuse-threshold', type=float, default=REUSE_THRESHOLD,
+                        help="similarity at which a stored itinerary is served as is")
+    parser.add_argument('--adapt-threshold', type=float, default=ADAPT_THRESHOLD,
+                        help="similarity at which a stored itinerary is adapted instead of regenerated")
+    parser.add_argument('--requests-per-minute', type=float, default=REQUESTS_PER_MINUTE,
+                        help="client-side request rate limit; raise it to match your Groq plan")
+    parser.add_argument('--tokens-per-minute', type=float, default=TOKENS_PER_MINUTE,
+                        help="client-side token rate limit; raise it to match your Groq plan")
+    parser.add_argument('--metrics-file', help="write Prometheus metrics here on exit")
+    parser.add_argument('--log-events', action='store_true',
+                        help="log every model call and turn as a JSON line on stderr")
+    args = parser.parse_args()
+    if args.log_events:
+        enable_event_log()
+
     # Load environment variables
     load_dotenv()
     
     # Get API key from environment variable
     api_key = os.getenv("GROQ_API_KEY")
-    if not api_key:
+    if not api_key and requires_api_key(args.backend):
         print("Error: GROQ_API_KEY not found in environment variables")
         return
 
-    bot = TravelPlannerBot(api_key)
+    cache = ItineraryCache(path=os.getenv("ITINERARY_CACHE_PATH"),
+                           similarity=SimilarityIndex(args.reuse_threshold, args.adapt_threshold)
+                           if args.similar else None)
+    policy = ResiliencePolicy(requests_per_minute=args.requests_per_minute,
+                              tokens_per_minute=args.tokens_per_minute)
+    bot = TravelPlannerBot(client=get_client(api_key, policy=policy, backend=args.backend),
+                           cache=cache, sectioned=args.sectioned, llm_extraction=args.llm_extraction,
+                           speculative=args.speculative, structured=args.structured)
     print(bot.get_next_question())
 
-    while True:
-        user_input = input("> ")
-        if user_input.lower() in ['quit', 'exit', 'bye']:
-            print("Thank you for using the Travel Planner Bot. Goodbye!")
-            break
+    try:
+        while True:
+            user_input = input("> ")
+            if user_input.lower() in ['quit', 'exit', 'bye']:
+                print("Thank you for using the Travel Planner Bot. Goodbye!")
+                break
 
-        response = bot.process_input(user_input)
-        print(response)
+            try:
+                for chunk in bot.process_input_stream(user_input):
+                    print(chunk, end="", flush=True)
+            except LLMError as e:
+                print(f"\n{describe_error(e)}", end="")
+            print()
+            if bot.last_time_to_first_token is not None:
+                print(f"(first token after {bot.last_time_to_first_token:.2f}s)")
+    finally:
+        bot.cancel_speculation()
+        if args.export and bot.itinerary is not None:
+            try:
+                export_itinerary(args.export, bot.itinerary.render(), bot.plan, bot.user_info['budget'],
+                                 title=f"{bot.user_info['destination']} itinerary")
+                print(f"Itinerary saved to {args.export}")
+            except (OSError, ValueError) as e:
+                print(f"Could not save the itinerary: {e}")
+        if args.metrics_file:
+            write_metrics(args.metrics_file)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
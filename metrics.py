@@ -0,0 +1,268 @@
+"""Counters, histograms and structured events for model calls and conversation turns.
+
+Every model call made through ``ResilientClient``/``AsyncResilientClient``
+records its model, outcome, queueing delay (client-side rate limiting),
+latency, time to first token when streamed, retries and prompt/completion
+tokens. Bots add one observation per conversation turn, per itinerary
+cache lookup, per itinerary reused from a similar profile (with the tokens
+that saved) and per speculatively generated itinerary part (used or
+wasted); ``model_router`` adds one per call sent to a fallback model, and
+the clients one per request answered by an identical one in flight.
+Everything lands in the process-wide ``REGISTRY``:
+
+* ``REGISTRY.render()`` returns the Prometheus text exposition format (the
+  HTTP server serves it at ``GET /metrics``; ``write_metrics`` writes it to
+  a file for the CLI and batch tool);
+* each observation is also an event: logged as one JSON line on the
+  ``travel_planner.events`` logger (see ``enable_event_log``) and passed to
+  every callback registered with ``add_hook``.
+
+Recording an observation costs a few microseconds (a dict lookup and a
+bisect under a lock), and JSON encoding only happens when the event logger
+is enabled, so instrumentation stays on in production.
+"""
+import bisect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+event_log = logging.getLogger('travel_planner.events')
+
+_hooks: List[Callable[[str, Dict[str, Any]], None]] = []
+
+
+def escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self.values.get(labels, 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self.values.items())
+        return [f"{self.name}{format_labels(self.labels, key)} {value:g}" for key, value in items]
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # Per label set: [count per bucket (last one is +Inf), sum]
+        self.values: Dict[Tuple[str, ...], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self.values.get(labels)
+            if state is None:
+                state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def count(self, *labels: str) -> int:
+        state = self.values.get(labels)
+        return sum(state[0]) if state else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self.values.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                labels = format_labels(self.labels, key, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {total:g}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: List[Any] = []
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help_text, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+MODEL_CALLS = REGISTRY.counter(
+    'travel_planner_model_calls_total', "Model calls by model and outcome", ('model', 'outcome'))
+MODEL_CALL_SECONDS = REGISTRY.histogram(
+    'travel_planner_model_call_seconds', "Model call latency, retries included", ('model',))
+MODEL_QUEUE_SECONDS = REGISTRY.histogram(
+    'travel_planner_model_queue_seconds', "Time waiting on client-side rate limits", ('model',))
+TIME_TO_FIRST_TOKEN = REGISTRY.histogram(
+    'travel_planner_time_to_first_token_seconds', "Time to the first streamed token", ('model',))
+MODEL_RETRIES = REGISTRY.counter(
+    'travel_planner_model_retries_total', "Model call attempts that were retried", ('model',))
+PROMPT_TOKENS = REGISTRY.counter(
+    'travel_planner_prompt_tokens_total', "Prompt tokens sent", ('model',))
+COMPLETION_TOKENS = REGISTRY.counter(
+    'travel_planner_completion_tokens_total', "Completion tokens received", ('model',))
+TURN_SECONDS = REGISTRY.histogram(
+    'travel_planner_turn_seconds', "Time to answer one user message", ('kind', 'outcome'))
+CACHE_LOOKUPS = REGISTRY.counter(
+    'travel_planner_itinerary_cache_lookups_total', "Itinerary cache lookups", ('result',))
+ITINERARY_REUSE = REGISTRY.counter(
+    'travel_planner_itinerary_reuse_total',
+    "Itineraries served from one stored for a similar profile, reused as is or adapted", ('outcome',))
+REUSE_TOKENS_SAVED = REGISTRY.counter(
+    'travel_planner_reuse_tokens_saved_total', "Estimated model tokens saved by reusing similar itineraries")
+SPECULATIVE_PARTS = REGISTRY.counter(
+    'travel_planner_speculative_parts_total',
+    "Itinerary parts generated before the last intake answer, by outcome", ('outcome',))
+COALESCED_CALLS = REGISTRY.counter(
+    'travel_planner_coalesced_calls_total',
+    "Model calls answered by an identical call already in flight", ('model', 'stream'))
+MODEL_FAILOVERS = REGISTRY.counter(
+    'travel_planner_model_failovers_total',
+    "Calls sent to a fallback model, by call type, model and reason", ('call_type', 'model', 'reason'))
+
+
+def add_hook(hook: Callable[[str, Dict[str, Any]], None]):
+    """Call ``hook(event, fields)`` for every recorded observation."""
+    _hooks.append(hook)
+
+
+def remove_hook(hook: Callable[[str, Dict[str, Any]], None]):
+    _hooks.remove(hook)
+
+
+def emit(event: str, fields: Dict[str, Any]):
+    if event_log.isEnabledFor(logging.INFO):
+        event_log.info(json.dumps({'event': event, 'ts': round(time.time(), 3), **fields}))
+    for hook in _hooks:
+        hook(event, fields)
+
+
+def record_model_call(model: str, outcome: str, seconds: float, queued: float, retries: int,
+                      prompt_tokens: Optional[int] = None, completion_tokens: Optional[int] = None,
+                      time_to_first_token: Optional[float] = None, stream: bool = False):
+    MODEL_CALLS.inc(model, outcome)
+    MODEL_CALL_SECONDS.observe(seconds, model)
+    MODEL_QUEUE_SECONDS.observe(queued, model)
+    if retries:
+        MODEL_RETRIES.inc(model, amount=retries)
+    if prompt_tokens:
+        PROMPT_TOKENS.inc(model, amount=prompt_tokens)
+    if completion_tokens:
+        COMPLETION_TOKENS.inc(model, amount=completion_tokens)
+    if time_to_first_token is not None:
+        TIME_TO_FIRST_TOKEN.observe(time_to_first_token, model)
+    if event_log.isEnabledFor(logging.INFO) or _hooks:
+        emit('model_call', {
+            'model': model, 'outcome': outcome, 'stream': stream,
+            'seconds': round(seconds, 4), 'queued_seconds': round(queued, 4), 'retries': retries,
+            'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+            'time_to_first_token': round(time_to_first_token, 4) if time_to_first_token is not None else None,
+        })
+
+
+def record_turn(kind: str, outcome: str, seconds: float):
+    TURN_SECONDS.observe(seconds, kind, outcome)
+    if event_log.isEnabledFor(logging.INFO) or _hooks:
+        emit('turn', {'kind': kind, 'outcome': outcome, 'seconds': round(seconds, 4)})
+
+
+def record_cache_lookup(hit: bool):
+    result = 'hit' if hit else 'miss'
+    CACHE_LOOKUPS.inc(result)
+    if event_log.isEnabledFor(logging.INFO) or _hooks:
+        emit('itinerary_cache', {'result': result})
+
+
+def record_reuse(outcome: str, tokens_saved: int):
+    ITINERARY_REUSE.inc(outcome)
+    REUSE_TOKENS_SAVED.inc(amount=tokens_saved)
+    if event_log.isEnabledFor(logging.INFO) or _hooks:
+        emit('itinerary_reuse', {'outcome': outcome, 'tokens_saved': tokens_saved})
+
+
+def record_speculation(outcome: str, parts: int = 1):
+    SPECULATIVE_PARTS.inc(outcome, amount=parts)
+    if event_log.isEnabledFor(logging.INFO) or _hooks:
+        emit('speculation', {'outcome': outcome, 'parts': parts})
+
+
+def record_coalesced(model: str, stream: bool):
+    COALESCED_CALLS.inc(model, str(stream).lower())
+    if event_log.isEnabledFor(logging.INFO) or _hooks:
+        emit('model_call_coalesced', {'model': model, 'stream': stream})
+
+
+def record_failover(call_type: str, model: str, reason: str):
+    MODEL_FAILOVERS.inc(call_type, model, reason)
+    if event_log.isEnabledFor(logging.INFO) or _hooks:
+        emit('model_failover', {'call_type': call_type, 'model': model, 'reason': reason})
+
+
+def enable_event_log(stream=sys.stderr):
+    """Log every event as a JSON line on ``stream``."""
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    event_log.addHandler(handler)
+    event_log.setLevel(logging.INFO)
+    event_log.propagate = False
+
+
+def write_metrics(path: str):
+    """Atomically replace ``path`` with the current metrics (for textfile collectors)."""
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'w', encoding='utf-8') as f:
+        f.write(REGISTRY.render())
+    os.replace(temporary, path)
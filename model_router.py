@@ -0,0 +1,203 @@
+"""Pick the model, output cap and timeout for every model call by its call type.
+
+Every call type of ``prompt_templates.CALL_TYPES`` has a ``Route``: the
+models to use, best first, then faster fallbacks; the temperature; an
+output-token cap, which for itineraries grows with the trip length (a
+30-day itinerary needs far more than 2,048 tokens, a slot question far
+fewer); a request timeout; and latency objectives.
+
+``ModelRouter`` keeps rolling statistics per call type, model and mode
+(streamed or not): latency of the last ``WINDOW`` calls within ``HORIZON``
+seconds (time to the first token for streamed calls, the whole answer
+otherwise) and whether they failed. ``route`` sends a call to the first
+model of its route whose recent 90th-percentile latency is within the
+objective and whose error rate is below ``MAX_ERROR_RATE``; when every
+model is at risk the last, fastest one is used. Samples expire, so a model
+that was avoided is tried again once its bad samples are older than
+``HORIZON``. A call that fails outright is retried once on each remaining
+model of its route (``fail``); streamed calls only before their first
+token. Calls routed away from the preferred model are counted in
+``metrics``.
+
+One router per process (``default_router``) lets every bot learn from the
+calls of the others.
+"""
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Any, Deque, Dict, NamedTuple, Optional, Tuple
+
+from metrics import record_failover
+from resilient_client import CircuitOpenError, LLMError
+
+FAST_MODEL = "llama-3.1-8b-instant"
+LARGE_MODEL = "llama-3.3-70b-versatile"
+
+# Calls remembered per call type, model and mode, and for how long
+WINDOW = 50
+HORIZON = 300.0
+# Fewer samples than this say nothing about a model
+MIN_SAMPLES = 5
+MAX_ERROR_RATE = 0.25
+LATENCY_PERCENTILE = 0.9
+
+
+class Route(NamedTuple):
+    # Preferred model first, then fallbacks from slower to faster
+    models: Tuple[str, ...]
+    max_tokens: int
+    # Extra output tokens per trip day, up to ``max_tokens_cap``
+    tokens_per_day: int = 0
+    max_tokens_cap: int = 0
+    temperature: float = 0.7
+    # Seconds before the provider request is abandoned
+    timeout: float = 30.0
+    # Seconds for the whole answer, and to the first token when streamed
+    latency_slo: float = 10.0
+    first_token_slo: float = 2.0
+
+    def output_cap(self, days: Optional[int]) -> int:
+        if not self.tokens_per_day or not days:
+            return self.max_tokens
+        return min(self.max_tokens + self.tokens_per_day * int(days), self.max_tokens_cap)
+
+
+ROUTES: Dict[str, Route] = {
+    'slot': Route((FAST_MODEL,), 150, timeout=10.0, latency_slo=1.5, first_token_slo=0.5),
+    'extract': Route((FAST_MODEL,), 200, temperature=0.0, timeout=10.0, latency_slo=1.5),
+    'follow_up': Route((FAST_MODEL,), 512, timeout=20.0, latency_slo=4.0, first_token_slo=1.0),
+    'section': Route((FAST_MODEL,), 2048, timeout=45.0, latency_slo=8.0, first_token_slo=1.5),
+    # About 250 tokens of prose per day, or 120 as JSON, on top of the fixed sections
+    'itinerary': Route((LARGE_MODEL, FAST_MODEL), 1024, tokens_per_day=250, max_tokens_cap=8000,
+                       timeout=120.0, latency_slo=40.0, first_token_slo=2.0),
+    'structured': Route((LARGE_MODEL, FAST_MODEL), 600, tokens_per_day=120, max_tokens_cap=4096,
+                        timeout=90.0, latency_slo=25.0, first_token_slo=2.0),
+    'chat': Route((FAST_MODEL,), 1024, timeout=30.0, latency_slo=6.0, first_token_slo=1.0),
+}
+
+
+class RoutedCall(NamedTuple):
+    call_type: str
+    model: str
+    temperature: float
+    max_tokens: int
+    timeout: float
+    stream: bool
+
+    def options(self) -> Dict[str, Any]:
+        """Keyword arguments for ``chat.completions.create``, besides the messages."""
+        options = {'model': self.model, 'temperature': self.temperature, 'max_tokens': self.max_tokens,
+                   'timeout': self.timeout}
+        if self.stream:
+            options['stream'] = True
+        return options
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class RollingStats:
+    """Latency and outcome of a model's recent calls."""
+
+    def __init__(self, window: int = WINDOW, horizon: float = HORIZON):
+        self.horizon = horizon
+        # (monotonic time, seconds, succeeded)
+        self.samples: Deque[Tuple[float, float, bool]] = deque(maxlen=window)
+
+    def add(self, seconds: float, ok: bool):
+        self.samples.append((time.monotonic(), seconds, ok))
+
+    def summary(self) -> Tuple[int, float, Optional[float]]:
+        """(calls, error rate, latency percentile of the successful ones) within the horizon."""
+        cutoff = time.monotonic() - self.horizon
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+        if not self.samples:
+            return 0, 0.0, None
+        latencies = [seconds for _, seconds, ok in self.samples if ok]
+        errors = 1 - len(latencies) / len(self.samples)
+        return len(self.samples), errors, percentile(latencies, LATENCY_PERCENTILE) if latencies else None
+
+
+class ModelRouter:
+    def __init__(self, routes: Optional[Dict[str, Route]] = None, window: int = WINDOW, horizon: float = HORIZON):
+        self.routes = dict(ROUTES if routes is None else routes)
+        self.window = window
+        self.horizon = horizon
+        self._stats: Dict[Tuple[str, str, bool], RollingStats] = {}
+        self._lock = threading.Lock()
+
+    def _at_risk(self, call_type: str, model: str, stream: bool) -> Optional[str]:
+        """Why ``model`` should be avoided for these calls ('errors' or 'latency'), or None."""
+        stats = self._stats.get((call_type, model, stream))
+        if stats is None:
+            return None
+        calls, errors, latency = stats.summary()
+        if calls < MIN_SAMPLES:
+            return None
+        if errors > MAX_ERROR_RATE:
+            return 'errors'
+        route = self.routes[call_type]
+        if latency is not None and latency > (route.first_token_slo if stream else route.latency_slo):
+            return 'latency'
+        return None
+
+    def route(self, call_type: str, days: Optional[int] = None, stream: bool = False,
+              max_tokens: Optional[int] = None) -> RoutedCall:
+        """The model and options for one call; ``max_tokens`` overrides the route's cap."""
+        route = self.routes[call_type]
+        model = route.models[0]
+        with self._lock:
+            # Why the preferred model is avoided, if it is
+            reason = self._at_risk(call_type, model, stream)
+            if reason is not None:
+                model = next((candidate for candidate in route.models[1:]
+                              if self._at_risk(call_type, candidate, stream) is None), route.models[-1])
+        if model != route.models[0]:
+            record_failover(call_type, model, reason)
+        return RoutedCall(call_type, model, route.temperature,
+                          max_tokens if max_tokens is not None else route.output_cap(days),
+                          route.timeout, stream)
+
+    def record(self, call: RoutedCall, seconds: float, ok: bool = True):
+        """Report how a routed call went: its latency as described above, or a failure."""
+        key = (call.call_type, call.model, call.stream)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = RollingStats(self.window, self.horizon)
+            stats.add(seconds, ok)
+
+    def fail(self, call: RoutedCall, error: LLMError, seconds: float) -> Optional[RoutedCall]:
+        """Record a failed call; the same call on the route's next model, or None if there is none."""
+        # An open circuit turned the call away before any model saw it
+        if not isinstance(error, CircuitOpenError):
+            self.record(call, seconds, ok=False)
+        models = self.routes[call.call_type].models
+        index = models.index(call.model) if call.model in models else len(models) - 1
+        if index + 1 >= len(models):
+            return None
+        record_failover(call.call_type, models[index + 1], 'failed')
+        return call._replace(model=models[index + 1])
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Recent calls, error rate and latency per call type, model and mode."""
+        report = {}
+        with self._lock:
+            for (call_type, model, stream), stats in self._stats.items():
+                calls, errors, latency = stats.summary()
+                report[f"{call_type}/{model}/{'stream' if stream else 'blocking'}"] = {
+                    'calls': calls, 'error_rate': round(errors, 3),
+                    'p90_seconds': round(latency, 3) if latency is not None else None,
+                    'at_risk': self._at_risk(call_type, model, stream),
+                }
+        return report
+
+
+@lru_cache(maxsize=None)
+def default_router() -> ModelRouter:
+    """The process-wide router, shared by every bot that is not given one."""
+    return ModelRouter()
@@ -0,0 +1,153 @@
+"""Prompt templates, compiled once at import, and the system prompt for each call type.
+
+``PromptTemplate`` splits its text into literal runs and fields when it is
+created, so rendering is a single join, and knows how many tokens its fixed
+text costs. ``CALL_TYPES`` decides what every kind of model call sends:
+
+* ``slot``: a compact system prompt plus recent history, for phrasing
+  intake questions;
+* ``itinerary``: the full TravelGenie system prompt and the itinerary
+  request, without history (the traveler profile already holds every answer);
+* ``section``: the compact system prompt and one itinerary section;
+* ``structured``: the compact system prompt told to answer in JSON, and the
+  itinerary as a JSON plan (see ``structured_itinerary``);
+* ``extract``: a one-line system prompt for pulling intake answers out of a
+  message as JSON (see ``slot_extractor``);
+* ``follow_up``: the compact system prompt plus history, for questions
+  about a delivered itinerary (see ``follow_ups``);
+* ``chat``: the full system prompt plus history, for free-form messages.
+
+Prompts without history are laid out static-first: system prompt, then the
+fixed instructions, then the traveler profile. The first part is
+byte-identical across sessions, which lets providers with prefix caching
+reuse it. Run ``python prompt_templates.py`` for the token cost of each
+template and call type.
+"""
+from string import Formatter
+from typing import Any, Dict, Mapping, NamedTuple, Tuple
+
+from conversation_history import count_tokens
+
+
+class PromptTemplate:
+    """A ``str.format``-style template with plain ``{field}`` placeholders."""
+
+    def __init__(self, name: str, text: str):
+        self.name = name
+        self.text = text
+        parts = []
+        for literal, field, spec, conversion in Formatter().parse(text):
+            if spec or conversion:
+                raise ValueError(f"template {name!r}: format specs are not supported")
+            parts.append((literal, field))
+        self._parts: Tuple[Tuple[str, Any], ...] = tuple(parts)
+        self.fields = tuple(field for _, field in parts if field is not None)
+        self.static_tokens = count_tokens("".join(literal for literal, _ in parts))
+
+    def render(self, values: Mapping[str, Any]) -> str:
+        return "".join(literal if field is None else literal + str(values[field])
+                       for literal, field in self._parts)
+
+
+SYSTEM_PROMPT = """You are TravelGenie, an expert travel planning assistant with extensive knowledge of global destinations, travel logistics, and budget optimization. Your role is to create personalized, practical, and memorable travel experiences.
+
+CORE RESPONSIBILITIES:
+- Provide comprehensive travel planning assistance
+- Create detailed, day-by-day itineraries 
+- Offer budget-conscious recommendations
+- Share insider tips and local insights
+- Ensure all suggestions are practical and actionable
+
+PERSONALITY & TONE:
+- Enthusiastic and knowledgeable about travel
+- Professional yet friendly and approachable
+- Patient when gathering user information
+- Encouraging and inspiring about travel experiences
+- Clear and organized in communication
+
+EXPERTISE AREAS:
+- Flight booking strategies and timing
+- Accommodation recommendations (hotels, hostels, Airbnb, boutique stays)
+- Local transportation options and costs
+- Must-see attractions and hidden gems
+- Cultural experiences and local customs
+- Food recommendations and dining budgets
+- Safety tips and travel advisories
+- Visa requirements and travel documentation
+- Weather considerations and packing suggestions
+- Budget optimization and money-saving tips
+
+RESPONSE GUIDELINES:
+1. Always stay focused on travel-related topics
+2. If asked about non-travel topics, politely redirect: "I specialize in travel planning! Let's get back to creating your amazing trip. What would you like to know about your travel plans?"
+3. Provide specific, actionable recommendations with estimated costs when possible
+4. Include both popular attractions and off-the-beaten-path experiences
+5. Consider different travel styles (luxury, mid-range, budget, backpacking)
+6. Mention seasonal considerations and best times to visit
+7. Include practical logistics like transportation between locations
+8. Suggest realistic daily schedules that aren't overpacked
+
+ITINERARY STRUCTURE:
+When creating full itineraries, include:
+- Executive summary of the trip
+- Pre-trip checklist (documents, vaccinations, etc.)
+- Day-by-day detailed schedule with timings
+- Transportation details and costs
+- Accommodation recommendations with price ranges
+- Restaurant and food recommendations
+- Cultural etiquette and local customs
+- Emergency contacts and important phrases
+- Budget breakdown by category
+- Packing suggestions based on weather/activities
+
+BUDGET CONSIDERATIONS:
+- Always work within the specified budget
+- Provide options at different price points when possible
+- Include hidden costs (tips, taxes, entrance fees)
+- Suggest money-saving strategies
+- Recommend budget tracking methods
+
+Remember: You are creating experiences, not just trips. Focus on what makes each destination special and how the traveler can best experience the local culture and attractions within their constraints."""
+
+COMPACT_SYSTEM_PROMPT = """You are TravelGenie, an enthusiastic, knowledgeable and friendly travel planning assistant. Stay focused on travel. Give specific, practical recommendations with estimated costs, respect the traveler's budget, and keep schedules realistic."""
+
+
+STRUCTURED_SYSTEM_PROMPT = COMPACT_SYSTEM_PROMPT + " Reply with minified JSON only, in exactly the shape you are given."
+
+EXTRACTION_SYSTEM_PROMPT = "You extract structured trip details from a traveler's message and reply with JSON only."
+
+
+class CallType(NamedTuple):
+    system: str
+    include_history: bool
+
+
+CALL_TYPES: Dict[str, CallType] = {
+    'slot': CallType(COMPACT_SYSTEM_PROMPT, include_history=True),
+    'itinerary': CallType(SYSTEM_PROMPT, include_history=False),
+    'section': CallType(COMPACT_SYSTEM_PROMPT, include_history=False),
+    'structured': CallType(STRUCTURED_SYSTEM_PROMPT, include_history=False),
+    'extract': CallType(EXTRACTION_SYSTEM_PROMPT, include_history=False),
+    'follow_up': CallType(COMPACT_SYSTEM_PROMPT, include_history=True),
+    'chat': CallType(SYSTEM_PROMPT, include_history=True),
+}
+
+
+def token_report() -> str:
+    """Fixed prompt cost of every call type and itinerary template, in tokens."""
+    # Imported here: these modules build their templates with this one
+    from follow_ups import TEMPLATES as FOLLOW_UP_TEMPLATES
+    from itinerary_sections import TEMPLATES
+    from structured_itinerary import TEMPLATES as STRUCTURED_TEMPLATES
+
+    lines = ["Call type     system  history", "------------  ------  -------"]
+    for name, call in CALL_TYPES.items():
+        lines.append(f"{name:12}  {count_tokens(call.system):6}  {'yes' if call.include_history else 'no':>7}")
+    lines += ["", "Template                  fixed tokens", "------------------------  ------------"]
+    for template in TEMPLATES + STRUCTURED_TEMPLATES + FOLLOW_UP_TEMPLATES:
+        lines.append(f"{template.name:24}  {template.static_tokens:12}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    print(token_report())
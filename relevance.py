@@ -0,0 +1,224 @@
+"""Decide whether a message is about travel before it reaches the model.
+
+``RelevanceFilter`` is built once from a keyword file (``travel_keywords.txt``,
+or the file named by ``TRAVEL_PLANNER_KEYWORDS``). Keywords are reduced to
+stems with a light suffix stripper ("flights", "exploring", "cities" and
+"travellers" become "flight", "explor", "city" and "travel"), and all stems are
+compiled into one regex that finds, in a single scan of the message, the words
+starting with one of them. Only those candidates are stemmed and looked up in
+a set, so matching respects word boundaries ("electricity" does not contain
+"city") and chatter with no candidate never leaves the regex engine, however
+many keywords there are. Multi-word keywords ("road trip") match consecutive
+words.
+
+Bots answer off-topic messages after the itinerary with ``OFF_TOPIC_REPLY``
+instead of calling the model. Only questions and remarks that name no part
+of the itinerary are filtered: change requests ("make it more relaxed")
+carry no travel keyword of their own, and intake answers (names, numbers,
+dates) never reach the filter.
+
+    python relevance.py --messages 200000    # benchmark against substring matching
+"""
+import argparse
+import os
+import random
+import re
+import time
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_KEYWORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'travel_keywords.txt')
+
+OFF_TOPIC_REPLY = ("I specialize in travel planning! Let's get back to creating your amazing trip. "
+                   "What would you like to know about your travel plans?")
+
+WORD = re.compile(r"[a-z]+")
+# Stripped in this order, at most one per word, keeping a stem of 3+ letters
+SUFFIXES = ('ing', 'ed', 'ers', 'er', 'es', 's')
+
+
+def stem(word: str) -> str:
+    """Light, consistent stemming: the same stem for a word and its common inflections."""
+    if len(word) <= 3:
+        return word
+    if word.endswith('ies') and len(word) > 4:
+        return word[:-3] + 'y'
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            if suffix == 's' and word.endswith(('ss', 'us')):
+                break
+            word = word[:-len(suffix)]
+            # "travelling" -> "travel", "shopping" -> "shop"
+            if suffix in ('ing', 'ed', 'ers', 'er') and word[-1] == word[-2] and word[-1] not in 'aeios':
+                word = word[:-1]
+            return word
+    return word[:-1] if word.endswith('e') else word
+
+
+def stems(text: str) -> List[str]:
+    return [stem(word) for word in WORD.findall(text.lower())]
+
+
+def word_starts(stem: str) -> Tuple[str, ...]:
+    """How every word with this stem begins ("city" also covers "cities")."""
+    return (stem, stem[:-1] + 'ies') if stem.endswith('y') else (stem,)
+
+
+def trie_pattern(words: Iterable[str]) -> str:
+    """An alternation of ``words`` nested by shared prefix, so the regex engine
+    tries each letter once instead of every word in turn."""
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for letter in word:
+            node = node.setdefault(letter, {})
+        node[''] = {}
+
+    def pattern(node: Dict[str, dict]) -> str:
+        branches = [re.escape(letter) + pattern(child) for letter, child in sorted(node.items()) if letter]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # Longer words are tried first; a word ending here makes the rest optional
+        return ("(?:" + body + ")?") if '' in node else body
+
+    return pattern(trie)
+
+
+class RelevanceFilter:
+    def __init__(self, keywords: Iterable[str]):
+        self.words = set()
+        # First stem -> remaining stems of every multi-word keyword
+        self.phrases: Dict[str, List[Tuple[str, ...]]] = {}
+        for keyword in keywords:
+            parts = stems(keyword)
+            if len(parts) == 1:
+                self.words.add(parts[0])
+            elif parts:
+                self.phrases.setdefault(parts[0], []).append(tuple(parts[1:]))
+        starts = {start for word in self.words | set(self.phrases) for start in word_starts(word)}
+        self.candidates = re.compile(r"(?<![a-z])" + trie_pattern(starts) + r"[a-z]*" if starts else r"(?!)")
+
+    @classmethod
+    def from_file(cls, path: str) -> 'RelevanceFilter':
+        with open(path, encoding='utf-8') as f:
+            return cls(line.strip() for line in f if line.strip() and not line.lstrip().startswith('#'))
+
+    def match(self, text: str) -> Optional[str]:
+        """The first travel word of ``text`` (as a stem), or None."""
+        text = text.lower()
+        for candidate in self.candidates.finditer(text):
+            word = stem(candidate.group())
+            if word in self.words:
+                return word
+            for rest in self.phrases.get(word, ()):
+                if tuple(stems(text[candidate.end():])[:len(rest)]) == rest:
+                    return " ".join((word,) + rest)
+        return None
+
+    def is_relevant(self, text: str) -> bool:
+        return self.match(text) is not None
+
+
+@lru_cache(maxsize=None)
+def default_filter() -> RelevanceFilter:
+    """The process-wide filter, loaded once from ``TRAVEL_PLANNER_KEYWORDS`` or the bundled list."""
+    return RelevanceFilter.from_file(os.getenv('TRAVEL_PLANNER_KEYWORDS') or DEFAULT_KEYWORDS_PATH)
+
+
+# Benchmark corpus: everyday chatter with travel words mixed into some messages
+CHATTER = (
+    "can you help me with my homework about electricity and physics", "what is the meaning of life",
+    "tell me a joke about programmers", "how do I fix a memory leak in my code",
+    "who won the football game last night", "write a poem about my cat",
+    "my computer keeps crashing when I open the spreadsheet", "explain quantum entanglement simply",
+    "what's a good recipe for banana bread", "I need advice on my relationship",
+    "the authority of the committee is unclear", "translate this paragraph into French please",
+    "is it better to rent or buy a house", "recommend a good laptop for gaming",
+)
+TRAVEL = (
+    "can you swap day 3 for a beach day", "what should I pack for the weather there",
+    "suggest a cheaper hotel near the old town", "how do I get from the airport to the city",
+    "any good restaurants for dinner on the second evening", "do I need a visa for this trip",
+    "are there museums worth visiting", "is the metro easy to use", "which day is best for the market",
+    "what's the best neighbourhood to stay in", "can we add a day trip to the mountains",
+)
+
+
+FILLER = ("so", "well", "honestly", "I was wondering", "quickly", "by the way", "also", "and then",
+          "maybe", "if possible", "for my sister", "again", "one more thing", "right now")
+# The list the GUI used to match as substrings, kept as the benchmark baseline
+SUBSTRING_KEYWORDS = (
+    'travel', 'trip', 'vacation', 'holiday', 'flight', 'hotel', 'destination',
+    'booking', 'stay', 'tour', 'visit', 'journey', 'itinerary', 'budget',
+    'accommodation', 'restaurant', 'attractions', 'activities', 'sightseeing',
+    'tourism', 'explore', 'adventure', 'backpack', 'cruise', 'resort',
+    'airport', 'visa', 'passport', 'currency', 'weather', 'climate',
+    'culture', 'museum', 'beach', 'mountain', 'city', 'country',
+)
+
+
+def substring_match(keywords: Iterable[str], message: str) -> bool:
+    """The previous GUI check: any keyword anywhere in the lower-cased message."""
+    message = message.lower()
+    return any(keyword in message for keyword in keywords)
+
+
+def make_corpus(count: int, seed: int = 0) -> List[Tuple[str, bool]]:
+    """(message, is_travel) pairs: 30% travel questions, the rest chatter, padded to varied lengths."""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        travel = rng.random() < 0.3
+        words = [rng.choice(TRAVEL if travel else CHATTER)]
+        for _ in range(rng.randrange(6)):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(FILLER))
+        corpus.append((" ".join(words), travel))
+    return corpus
+
+
+def benchmark(count: int, seed: int = 0) -> Dict[str, float]:
+    corpus = make_corpus(count, seed)
+    relevance = default_filter()
+
+    started = time.perf_counter()
+    new = [relevance.is_relevant(message) for message, _ in corpus]
+    filter_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    old = [substring_match(SUBSTRING_KEYWORDS, message) for message, _ in corpus]
+    substring_seconds = time.perf_counter() - started
+    # Substring matching slows down with every keyword added; the filter does not
+    with open(os.getenv('TRAVEL_PLANNER_KEYWORDS') or DEFAULT_KEYWORDS_PATH, encoding='utf-8') as f:
+        keywords = [line.strip().lower() for line in f if line.strip() and not line.lstrip().startswith('#')]
+    started = time.perf_counter()
+    for message, _ in corpus:
+        substring_match(keywords, message)
+    all_keywords_seconds = time.perf_counter() - started
+
+    chatter = [index for index, (_, travel) in enumerate(corpus) if not travel]
+    travel = [index for index, (_, travel) in enumerate(corpus) if travel]
+    return {
+        'messages': count,
+        'keywords': len(keywords),
+        'filter_us_per_message': filter_seconds / count * 1e6,
+        'substring_us_per_message': substring_seconds / count * 1e6,
+        'substring_all_keywords_us_per_message': all_keywords_seconds / count * 1e6,
+        'filter_chatter_accepted': sum(new[i] for i in chatter) / max(len(chatter), 1),
+        'substring_chatter_accepted': sum(old[i] for i in chatter) / max(len(chatter), 1),
+        'filter_travel_accepted': sum(new[i] for i in travel) / max(len(travel), 1),
+        'substring_travel_accepted': sum(old[i] for i in travel) / max(len(travel), 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the travel relevance filter")
+    parser.add_argument('--messages', type=int, default=100000)
+    args = parser.parse_args()
+    results = benchmark(args.messages)
+    print(f"{results['messages']} messages; filter: {results['keywords']} keywords, "
+          f"substring baseline: {len(SUBSTRING_KEYWORDS)}")
+    print(f"{'':24} {'us/message':>10} {'chatter accepted':>17} {'travel accepted':>16}")
+    for name in ('filter', 'substring'):
+        print(f"{name:24} {results[name + '_us_per_message']:>10.2f} "
+              f"{results[name + '_chatter_accepted']:>17.1%} {results[name + '_travel_accepted']:>16.1%}")
+    print(f"{'substring, all keywords':24} {results['substring_all_keywords_us_per_message']:>10.2f}")
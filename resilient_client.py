@@ -0,0 +1,502 @@
+"""Rate-limit-aware wrapper around the Groq chat completions client.
+
+``ResilientClient`` (and ``AsyncResilientClient`` for ``AsyncGroq``) exposes
+the same ``chat.completions.create`` call as the client it wraps and adds:
+
+* client-side token buckets for requests per minute and tokens per minute,
+  so bursts queue locally instead of turning into 429 storms (a call
+  reserves its prompt and a typical completion, corrected once its real
+  usage is known);
+* retries with full-jitter exponential backoff that honor ``retry-after``;
+* a circuit breaker per model that fails fast while that model keeps
+  failing, so calls can still fall back to another model;
+* typed errors (``LLMError`` and subclasses) instead of error strings;
+* one ``metrics`` observation per call (queueing, latency, time to first
+  token, retries and token usage);
+* coalescing (see ``single_flight``): a request identical to one still in
+  flight shares its call, and its chunks when streamed, instead of making
+  another one.
+
+Buckets, breakers and in-flight requests live on the wrapper, so share one
+wrapper between all bots of a process to enforce process-wide limits and
+coalesce across sessions. The defaults match Groq's
+free tier for ``llama-3.1-8b-instant`` (30 requests, 6,000 tokens a minute).
+"""
+import asyncio
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional
+
+import groq
+
+from conversation_history import count_message_tokens, count_tokens
+from metrics import record_coalesced, record_model_call
+from single_flight import AsyncSingleFlight, SingleFlight, request_key
+
+REQUESTS_PER_MINUTE = 30
+TOKENS_PER_MINUTE = 6000
+# Requests may burst up to this many seconds' worth of the per-minute rate
+BURST_SECONDS = 10
+# Share of ``max_tokens`` a completion is assumed to use until its usage is known
+EXPECTED_OUTPUT_SHARE = 0.5
+
+
+class LLMError(Exception):
+    """A model call failed; ``retry_after`` hints when trying again may help."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RateLimitError(LLMError):
+    """The provider kept rejecting requests for exceeding its rate limits."""
+
+
+class LLMTimeoutError(LLMError):
+    """The provider did not answer in time."""
+
+
+class CircuitOpenError(LLMError):
+    """Calls are short-circuited after repeated provider failures."""
+
+
+def translate_error(error: Exception) -> LLMError:
+    """Map a provider exception onto the ``LLMError`` hierarchy."""
+    if isinstance(error, LLMError):
+        return error
+    if isinstance(error, groq.RateLimitError):
+        return RateLimitError(str(error), retry_after=retry_after_seconds(error))
+    if isinstance(error, groq.APITimeoutError):
+        return LLMTimeoutError(str(error))
+    return LLMError(str(error))
+
+
+def describe_error(error: LLMError) -> str:
+    """User-facing explanation of a failed model call."""
+    wait = f" Please try again in about {error.retry_after:.0f} seconds." if error.retry_after else " Please try again shortly."
+    if isinstance(error, (RateLimitError, CircuitOpenError)):
+        return "TravelGenie is handling a lot of requests right now." + wait
+    if isinstance(error, LLMTimeoutError):
+        return "TravelGenie took too long to answer." + wait
+    return "Sorry, I couldn't reach the travel planning service." + wait
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    value = response.headers.get('retry-after')
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def expected_output_tokens(kwargs: Dict[str, Any]) -> int:
+    return round(kwargs.get('max_tokens', 0) * EXPECTED_OUTPUT_SHARE)
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (groq.RateLimitError, groq.APITimeoutError,
+                          groq.APIConnectionError, groq.InternalServerError)):
+        return True
+    return isinstance(error, groq.APIStatusError) and error.status_code in (408, 409)
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at ``per_minute`` tokens a minute.
+
+    ``reserve`` always succeeds and returns how long the caller must wait
+    before using what it reserved; the balance may go negative, which queues
+    later callers behind earlier ones in arrival order.
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= min(amount, self.capacity)
+            return max(0.0, -self.tokens / self.rate)
+
+    def refund(self, amount: float):
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures.
+
+    While open, calls fail immediately; after ``reset_timeout`` seconds one
+    trial call is let through and its outcome closes or re-opens the circuit.
+    A trial that ends without an outcome (rate limited, cancelled) lets the
+    next call try instead.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def _reject_while_open(self):
+        if self.opened_at is None:
+            return
+        remaining = self.opened_at + self.reset_timeout - time.monotonic()
+        if remaining > 0 or self.trial_in_flight:
+            raise CircuitOpenError("model provider is failing; not sending requests for now",
+                                   retry_after=max(remaining, 1.0))
+
+    def check(self):
+        """Raise ``CircuitOpenError`` if a call now would be turned away, without claiming the trial."""
+        with self._lock:
+            self._reject_while_open()
+
+    def before_call(self) -> bool:
+        """Raise ``CircuitOpenError`` or let the call through; True if it is the trial call."""
+        with self._lock:
+            self._reject_while_open()
+            if self.opened_at is None:
+                return False
+            self.trial_in_flight = True
+            return True
+
+    def release_trial(self):
+        """End a trial call that neither closed nor re-opened the circuit."""
+        with self._lock:
+            self.trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class ResiliencePolicy:
+    """Limits, retry schedule and breakers shared by the sync and async wrappers."""
+
+    def __init__(self, requests_per_minute: float = REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = TOKENS_PER_MINUTE,
+                 max_retries: int = 4, base_delay: float = 0.5, max_delay: float = 20.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.requests = TokenBucket(requests_per_minute,
+                                    capacity=max(1.0, requests_per_minute * BURST_SECONDS / 60))
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._breakers_lock = threading.Lock()
+        self.retries = 0
+        self.throttled_seconds = 0.0
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        """The circuit breaker of ``model``: one model failing says nothing about the others."""
+        with self._breakers_lock:
+            breaker = self._breakers.get(model)
+            if breaker is None:
+                breaker = self._breakers[model] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return breaker
+
+    def estimate_tokens(self, kwargs: Dict[str, Any]) -> int:
+        # Reserving the worst case would serialize concurrent calls behind output
+        # they never generate; ``settle`` corrects the estimate afterwards
+        return count_message_tokens(kwargs.get('messages', [])) + expected_output_tokens(kwargs)
+
+    def admission_delay(self, estimate: int) -> float:
+        delay = max(self.requests.reserve(1), self.tokens.reserve(estimate))
+        self.throttled_seconds += delay
+        return delay
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            return min(retry_after + random.uniform(0, self.base_delay), self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def settle(self, estimate: int, used: Optional[int]):
+        """Refund what a call reserved and did not use, or charge what it used beyond that."""
+        if used is None:
+            return
+        if used < estimate:
+            self.tokens.refund(estimate - used)
+        elif used > estimate:
+            # Already spent: later calls queue behind the overrun
+            self.tokens.reserve(used - estimate)
+
+    def on_error(self, error: Exception, attempt: int, breaker: CircuitBreaker) -> Optional[float]:
+        """Record a failed attempt; return the backoff delay, or None to give up."""
+        if not isinstance(error, groq.APIError):
+            # A bug rather than a failed call: let it surface as it is
+            raise error
+        if not is_retryable(error):
+            # The provider answered, it just rejected this request
+            breaker.record_success()
+            raise translate_error(error) from error
+        # Being rate limited says nothing about the provider's health
+        if not isinstance(error, groq.RateLimitError):
+            breaker.record_failure()
+        if attempt >= self.max_retries:
+            return None
+        self.retries += 1
+        return self.backoff(attempt, error)
+
+
+def usage_tokens(completion: Any) -> Optional[int]:
+    usage = getattr(completion, 'usage', None)
+    if usage is None:
+        return None
+    return (usage.prompt_tokens or 0) + (usage.completion_tokens or 0)
+
+
+class CallObservation:
+    """Timings of one ``create`` call, reported to ``metrics`` when it ends."""
+
+    def __init__(self, kwargs: Dict[str, Any], estimate: int):
+        self.model = kwargs.get('model', 'unknown')
+        self.stream = bool(kwargs.get('stream'))
+        self.prompt_tokens = estimate - expected_output_tokens(kwargs)
+        self.queued = 0.0
+        self.started = time.perf_counter()
+        self.retries = 0
+        self.time_to_first_token: Optional[float] = None
+
+    def waited(self, seconds: float):
+        """Count ``seconds`` of rate limiting as queueing rather than latency."""
+        self.queued += seconds
+        self.started += seconds
+
+    def first_token(self):
+        if self.time_to_first_token is None:
+            self.time_to_first_token = time.perf_counter() - self.started
+
+    def finish(self, outcome: str, completion: Any = None, completion_tokens: Optional[int] = None):
+        prompt_tokens = self.prompt_tokens
+        usage = getattr(completion, 'usage', None)
+        if usage is not None:
+            prompt_tokens, completion_tokens = usage.prompt_tokens, usage.completion_tokens
+        record_model_call(self.model, outcome, time.perf_counter() - self.started, self.queued,
+                          self.retries, prompt_tokens, completion_tokens,
+                          self.time_to_first_token, self.stream)
+
+
+def close_stream(stream: Any):
+    """Stop reading a stream; for groq's ``Stream`` this closes its HTTP response."""
+    close = getattr(stream, 'close', None)
+    if close is not None:
+        close()
+
+
+async def aclose_stream(stream: Any):
+    """``close_stream`` for groq's ``AsyncStream`` (``close``) or an async generator (``aclose``)."""
+    close = getattr(stream, 'aclose', None) or getattr(stream, 'close', None)
+    if close is not None:
+        await close()
+
+
+def without_client_retries(client: Any) -> Any:
+    # The wrapper owns the retry schedule; don't let the SDK retry underneath it
+    if hasattr(client, 'with_options'):
+        return client.with_options(max_retries=0)
+    return client
+
+
+class ResilientClient:
+    def __init__(self, client: Any, policy: Optional[ResiliencePolicy] = None, coalesce: bool = True):
+        self.client = without_client_retries(client)
+        self.policy = policy if policy is not None else ResiliencePolicy()
+        self.flights = SingleFlight() if coalesce else None
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs) -> Any:
+        if self.flights is None:
+            return self._create(kwargs)
+        joined = lambda: record_coalesced(kwargs.get('model', 'unknown'), bool(kwargs.get('stream')))
+        if kwargs.get('stream'):
+            return self.flights.stream(request_key(kwargs), lambda: self._create(kwargs), joined)
+        return self.flights.call(request_key(kwargs), lambda: self._create(kwargs), joined)
+
+    def _create(self, kwargs: Dict[str, Any]) -> Any:
+        policy = self.policy
+        estimate = policy.estimate_tokens(kwargs)
+        call = CallObservation(kwargs, estimate)
+        try:
+            result = self._create_with_retries(kwargs, estimate, call)
+        except LLMError as e:
+            call.finish(type(e).__name__)
+            raise
+        if kwargs.get('stream'):
+            return self._settle_stream(result, estimate, kwargs['messages'], call)
+        policy.settle(estimate, usage_tokens(result))
+        call.finish('ok', result)
+        return result
+
+    def _create_with_retries(self, kwargs: Dict[str, Any], estimate: int,
+                                  call: CallObservation) -> Any:
+        policy = self.policy
+        breaker = policy.breaker(kwargs.get('model', 'unknown'))
+        attempt = 0
+        while True:
+            # Every attempt, retries included, waits for its own budget; an open
+            # circuit turns it away before it reserves any
+            breaker.check()
+            queued = policy.admission_delay(estimate)
+            call.waited(queued)
+            time.sleep(queued)
+            try:
+                trial = breaker.before_call()
+            except CircuitOpenError:
+                policy.settle(estimate, 0)
+                raise
+            try:
+                result = self.client.chat.completions.create(**kwargs)
+            except Exception as e:
+                # A failed attempt generated nothing
+                policy.settle(estimate, 0)
+                delay = policy.on_error(e, attempt, breaker)
+                if delay is None:
+                    raise translate_error(e) from e
+            else:
+                breaker.record_success()
+                return result
+            finally:
+                # Only the call that claimed the half-open trial may give it up
+                if trial:
+                    breaker.release_trial()
+            attempt += 1
+            call.retries = attempt
+            time.sleep(delay)
+
+    def _settle_stream(self, stream: Any, estimate: int, messages: List[Dict[str, str]],
+                       call: CallObservation) -> Iterator[Any]:
+        generated = []
+        # Stays 'cancelled' if the consumer stops iterating early
+        outcome = 'cancelled'
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    call.first_token()
+                    generated.append(chunk.choices[0].delta.content)
+                yield chunk
+            outcome = 'ok'
+        except Exception as e:
+            error = translate_error(e)
+            outcome = type(error).__name__
+            raise error from e
+        finally:
+            # Nothing closes the provider's response for us: left open, it keeps
+            # the pooled connection and the tokens still being generated
+            close_stream(stream)
+            completion_tokens = count_tokens("".join(generated))
+            self.policy.settle(estimate, count_message_tokens(messages) + completion_tokens)
+            call.finish(outcome, completion_tokens=completion_tokens)
+
+
+class AsyncResilientClient:
+    def __init__(self, client: Any, policy: Optional[ResiliencePolicy] = None, coalesce: bool = True):
+        self.client = without_client_retries(client)
+        self.policy = policy if policy is not None else ResiliencePolicy()
+        self.flights = AsyncSingleFlight() if coalesce else None
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs) -> Any:
+        if self.flights is None:
+            return await self._create(kwargs)
+        joined = lambda: record_coalesced(kwargs.get('model', 'unknown'), bool(kwargs.get('stream')))
+        if kwargs.get('stream'):
+            return await self.flights.stream(request_key(kwargs), lambda: self._create(kwargs), joined)
+        return await self.flights.call(request_key(kwargs), lambda: self._create(kwargs), joined)
+
+    async def _create(self, kwargs: Dict[str, Any]) -> Any:
+        policy = self.policy
+        estimate = policy.estimate_tokens(kwargs)
+        call = CallObservation(kwargs, estimate)
+        try:
+            result = await self._create_with_retries(kwargs, estimate, call)
+        except LLMError as e:
+            call.finish(type(e).__name__)
+            raise
+        if kwargs.get('stream'):
+            return self._settle_stream(result, estimate, kwargs['messages'], call)
+        policy.settle(estimate, usage_tokens(result))
+        call.finish('ok', result)
+        return result
+
+    async def _create_with_retries(self, kwargs: Dict[str, Any], estimate: int,
+                                        call: CallObservation) -> Any:
+        policy = self.policy
+        breaker = policy.breaker(kwargs.get('model', 'unknown'))
+        attempt = 0
+        while True:
+            # Every attempt, retries included, waits for its own budget; an open
+            # circuit turns it away before it reserves any
+            breaker.check()
+            queued = policy.admission_delay(estimate)
+            call.waited(queued)
+            await asyncio.sleep(queued)
+            try:
+                trial = breaker.before_call()
+            except CircuitOpenError:
+                policy.settle(estimate, 0)
+                raise
+            try:
+                result = await self.client.chat.completions.create(**kwargs)
+            except Exception as e:
+                # A failed attempt generated nothing
+                policy.settle(estimate, 0)
+                delay = policy.on_error(e, attempt, breaker)
+                if delay is None:
+                    raise translate_error(e) from e
+            else:
+                breaker.record_success()
+                return result
+            finally:
+                # Only the call that claimed the half-open trial may give it up
+                if trial:
+                    breaker.release_trial()
+            attempt += 1
+            call.retries = attempt
+            await asyncio.sleep(delay)
+
+    async def _settle_stream(self, stream: Any, estimate: int, messages: List[Dict[str, str]],
+                             call: CallObservation):
+        generated = []
+        outcome = 'cancelled'
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    call.first_token()
+                    generated.append(chunk.choices[0].delta.content)
+                yield chunk
+            outcome = 'ok'
+        except Exception as e:
+            error = translate_error(e)
+            outcome = type(error).__name__
+            raise error from e
+        finally:
+            await aclose_stream(stream)
+            completion_tokens = count_tokens("".join(generated))
+            self.policy.settle(estimate, count_message_tokens(messages) + completion_tokens)
+            call.finish(outcome, completion_tokens=completion_tokens)
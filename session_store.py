@@ -0,0 +1,163 @@
+"""Compact, evicting store of planning sessions for the HTTP server.
+
+A ``Session`` keeps one slotted attribute per ``user_info`` field instead of
+a per-instance dict, so a new session costs a few hundred bytes. Its
+conversation history is created on the first message and is bounded by
+``ConversationHistory``. The
+server binds a session to a short-lived ``TravelPlannerBot`` for the
+duration of a request (``load_into`` / ``save_from``).
+
+Sessions are evicted when idle for longer than ``idle_timeout`` seconds, and
+the least recently used session is dropped when ``max_sessions`` is reached.
+Requests to one session are serialized by its own ``lock``, which ``get``
+creates under the store lock on the session's first request and which goes
+away with the session, so a long model call only ever holds up that
+session.
+
+Run ``python session_store.py`` to measure the memory cost per idle session.
+"""
+import secrets
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from itinerary_document import ItineraryDocument
+from slots import SLOTS
+
+SLOT_FIELDS = tuple(slot.field for slot in SLOTS)
+
+
+class Session:
+    __slots__ = ('session_id', 'conversation_state', 'itinerary', 'history', 'speculation',
+                 'last_seen', 'lock') + SLOT_FIELDS
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.conversation_state = 'init'
+        self.itinerary = None
+        self.history = None
+        self.speculation = None
+        self.last_seen = time.monotonic()
+        # Serializes requests to this session; created by ``SessionStore.get``
+        self.lock: Optional[threading.Lock] = None
+        for field in SLOT_FIELDS:
+            setattr(self, field, None)
+
+    def load_into(self, bot):
+        """Copy this session's state into a freshly created bot."""
+        bot.conversation_state = self.conversation_state
+        if self.history is not None:
+            bot.conversation_history = self.history
+        if self.itinerary is not None:
+            bot.itinerary = ItineraryDocument.parse(self.itinerary)
+        bot.speculation = self.speculation
+        for field in SLOT_FIELDS:
+            bot.user_info[field] = getattr(self, field)
+
+    def save_from(self, bot):
+        """Copy the bot's state back after a request."""
+        self.conversation_state = bot.conversation_state
+        if len(bot.conversation_history):
+            self.history = bot.conversation_history
+        if bot.itinerary is not None:
+            self.itinerary = bot.itinerary.render()
+        # Sections generated ahead of time outlive the request that started them
+        self.speculation = bot.speculation or None
+        for field in SLOT_FIELDS:
+            setattr(self, field, bot.user_info[field])
+
+    def user_info(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in SLOT_FIELDS}
+
+    def close(self):
+        """Cancel background work of an evicted session."""
+        if self.speculation is not None:
+            self.speculation.cancel()
+            self.speculation = None
+
+
+class SessionStore:
+    def __init__(self, max_sessions: int = 10000, idle_timeout: float = 30 * 60):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.evicted_idle = 0
+        self.evicted_lru = 0
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self) -> Session:
+        session = Session(secrets.token_urlsafe(12))
+        with self._lock:
+            self._evict_idle_locked()
+            while len(self._sessions) >= self.max_sessions:
+                self._drop_locked(next(iter(self._sessions)))
+                self.evicted_lru += 1
+            self._sessions[session.session_id] = session
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """Return a live session, with its ``lock``, and mark it as recently used."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            now = time.monotonic()
+            if now - session.last_seen > self.idle_timeout:
+                self._drop_locked(session_id)
+                self.evicted_idle += 1
+                return None
+            session.last_seen = now
+            self._sessions.move_to_end(session_id)
+            if session.lock is None:
+                session.lock = threading.Lock()
+            return session
+
+    def _drop_locked(self, session_id: str):
+        self._sessions.pop(session_id).close()
+
+    def evict_idle(self) -> int:
+        with self._lock:
+            return self._evict_idle_locked()
+
+    def _evict_idle_locked(self) -> int:
+        # Sessions are kept in last-used order, so idle ones are at the front
+        cutoff = time.monotonic() - self.idle_timeout
+        evicted = 0
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.last_seen > cutoff:
+                break
+            self._drop_locked(session.session_id)
+            evicted += 1
+        self.evicted_idle += evicted
+        return evicted
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'sessions': len(self._sessions),
+            'max_sessions': self.max_sessions,
+            'evicted_idle': self.evicted_idle,
+            'evicted_lru': self.evicted_lru
+        }
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+def measure_session_memory(count: int = 10000) -> float:
+    """Return the traced bytes per idle session, store overhead included."""
+    store = SessionStore(max_sessions=count)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(count):
+        store.create()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return allocated / count
+
+
+if __name__ == "__main__":
+    print(f"{measure_session_memory():.0f} bytes per idle session")
@@ -0,0 +1,300 @@
+"""Share one upstream call between identical requests that are in flight together.
+
+Under load the same request is often made several times at once: the canned
+slot fallback prompt, or one popular trip profile submitted by many users in
+the same minute. ``SingleFlight`` (threads) and ``AsyncSingleFlight`` (one
+event loop) key every request on its full parameters (``request_key``: the
+model, messages, temperature, output cap, ...). The first request for a key
+makes the call; requests for the same key that arrive before it finishes
+wait for it and get the same result or the same error.
+
+Streams fan out: every waiter gets every chunk, from the first one, however
+late it joined. There is no background reader; whichever waiter runs out of
+buffered chunks pulls the next one from upstream while the others wait for
+it, so a waiter that stops reading never stalls the rest. The upstream
+stream is closed when every waiter has left before its end. A key is
+forgotten as soon as its call ends, so a request made afterwards is a new
+call: nothing is cached.
+
+``ResilientClient`` and ``AsyncResilientClient`` put one in front of their
+rate limiter, so a coalesced request costs no rate-limit budget either.
+"""
+import asyncio
+import json
+import threading
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional
+
+# Marks the end of a stream among its chunks
+END = object()
+
+
+def request_key(kwargs: Dict[str, Any]) -> str:
+    """Identity of a ``chat.completions.create`` request: all of its parameters."""
+    return json.dumps(kwargs, sort_keys=True, separators=(',', ':'), default=repr)
+
+
+class Flight:
+    """One call and what it returned or raised."""
+
+    def __init__(self):
+        self.landed = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class StreamFlight:
+    """One stream, the chunks read from it so far and the waiters reading them."""
+
+    def __init__(self):
+        self.changed = threading.Condition()
+        self.upstream: Optional[Iterator[Any]] = None
+        self.chunks: List[Any] = []
+        self.opened = False
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        # A waiter is reading the next chunk from upstream
+        self.pulling = False
+        self.subscribers = 1
+
+    def open(self, upstream: Optional[Iterator[Any]], error: Optional[BaseException] = None):
+        with self.changed:
+            self.upstream, self.error, self.opened = upstream, error, True
+            self.finished = error is not None
+            self.changed.notify_all()
+
+    def chunk(self, index: int) -> Any:
+        """Chunk number ``index``, waiting for it or pulling it; ``END`` after the last one."""
+        while True:
+            with self.changed:
+                while True:
+                    if index < len(self.chunks):
+                        return self.chunks[index]
+                    if self.error is not None:
+                        raise self.error
+                    if self.finished:
+                        return END
+                    if self.opened and not self.pulling:
+                        break
+                    self.changed.wait()
+                self.pulling = True
+            chunk, error = END, None
+            try:
+                chunk = next(self.upstream, END)
+            except BaseException as e:
+                error = e
+            with self.changed:
+                self.pulling = False
+                if error is not None:
+                    self.error, self.finished = error, True
+                elif chunk is END:
+                    self.finished = True
+                else:
+                    self.chunks.append(chunk)
+                self.changed.notify_all()
+
+    def cancel(self):
+        with self.changed:
+            self.finished = True
+        close = getattr(self.upstream, 'close', None)
+        if close is not None:
+            close()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key: str, flight_type: type) -> Any:
+        """(flight, True) for a new call under ``key``, or the one in flight and False."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = flight_type()
+                return flight, True
+            if isinstance(flight, StreamFlight):
+                flight.subscribers += 1
+            return flight, False
+
+    def _forget(self, key: str, flight: Any):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def call(self, key: str, create: Callable[[], Any], joined: Optional[Callable[[], None]] = None) -> Any:
+        """``create()``, or the result of the identical call already in flight (then ``joined()``)."""
+        flight, leader = self._join(key, Flight)
+        if not leader:
+            if joined is not None:
+                joined()
+            flight.landed.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = create()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            self._forget(key, flight)
+            flight.landed.set()
+        return flight.result
+
+    def stream(self, key: str, create: Callable[[], Iterator[Any]],
+               joined: Optional[Callable[[], None]] = None) -> Iterator[Any]:
+        """The chunks of ``create()``, or of the identical stream already in flight."""
+        flight, leader = self._join(key, StreamFlight)
+        if not leader:
+            if joined is not None:
+                joined()
+        else:
+            try:
+                upstream = create()
+            except BaseException as e:
+                self._forget(key, flight)
+                flight.open(None, e)
+                raise
+            flight.open(upstream)
+        return self._subscribe(key, flight)
+
+    def _subscribe(self, key: str, flight: StreamFlight) -> Iterator[Any]:
+        index = 0
+        try:
+            while True:
+                chunk = flight.chunk(index)
+                if chunk is END:
+                    return
+                index += 1
+                yield chunk
+        finally:
+            with self._lock:
+                flight.subscribers -= 1
+                abandoned = not flight.subscribers and not flight.finished
+                if (abandoned or flight.finished) and self._flights.get(key) is flight:
+                    del self._flights[key]
+            if abandoned:
+                flight.cancel()
+
+
+async def next_chunk(upstream: AsyncIterator[Any]) -> Any:
+    try:
+        return await upstream.__anext__()
+    except StopAsyncIteration:
+        return END
+
+
+class AsyncFlight:
+    def __init__(self, task: 'asyncio.Future[Any]'):
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncStreamFlight:
+    def __init__(self, opening: 'asyncio.Future[AsyncIterator[Any]]'):
+        self.opening = opening
+        self.chunks: List[Any] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        # Task reading the next chunk from upstream, while one is
+        self.pulling: Optional['asyncio.Future[Any]'] = None
+        self.subscribers = 0
+
+    def landed(self, task: 'asyncio.Future[Any]'):
+        self.pulling = None
+        if task.cancelled():
+            self.error, self.finished = asyncio.CancelledError(), True
+        elif task.exception() is not None:
+            self.error, self.finished = task.exception(), True
+        elif task.result() is END:
+            self.finished = True
+        else:
+            self.chunks.append(task.result())
+
+    async def cancel(self):
+        self.finished = True
+        if self.pulling is not None:
+            self.pulling.cancel()
+        elif self.opening.done() and not self.opening.cancelled() and self.opening.exception() is None:
+            close = getattr(self.opening.result(), 'aclose', None)
+            if close is not None:
+                await close()
+
+
+class AsyncSingleFlight:
+    """``SingleFlight`` for coroutines; use it from a single event loop.
+
+    Calls run as tasks of their own, so a waiter that is cancelled leaves
+    the others waiting; the call itself is cancelled with its last waiter.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, Any] = {}
+
+    def _forget(self, key: str, flight: Any):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def _opened(self, key: str, flight: AsyncStreamFlight, task: 'asyncio.Future[Any]'):
+        # A stream that failed to open is over; one that opened ends with its last chunk
+        if task.cancelled() or task.exception() is not None:
+            self._forget(key, flight)
+
+    async def call(self, key: str, create: Callable[[], Awaitable[Any]],
+                   joined: Optional[Callable[[], None]] = None) -> Any:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = AsyncFlight(asyncio.ensure_future(create()))
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        elif joined is not None:
+            joined()
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                flight.task.cancel()
+
+    async def stream(self, key: str, create: Callable[[], Awaitable[AsyncIterator[Any]]],
+                     joined: Optional[Callable[[], None]] = None) -> AsyncIterator[Any]:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = AsyncStreamFlight(asyncio.ensure_future(create()))
+            flight.opening.add_done_callback(lambda task: self._opened(key, flight, task))
+        elif joined is not None:
+            joined()
+        flight.subscribers += 1
+        try:
+            await asyncio.shield(flight.opening)
+        except BaseException:
+            flight.subscribers -= 1
+            if not flight.subscribers:
+                self._forget(key, flight)
+                flight.opening.cancel()
+            raise
+        return self._subscribe(key, flight)
+
+    async def _subscribe(self, key: str, flight: AsyncStreamFlight) -> AsyncIterator[Any]:
+        index = 0
+        try:
+            while True:
+                if index < len(flight.chunks):
+                    index += 1
+                    yield flight.chunks[index - 1]
+                    continue
+                if flight.error is not None:
+                    raise flight.error
+                if flight.finished:
+                    return
+                if flight.pulling is None:
+                    flight.pulling = asyncio.ensure_future(next_chunk(flight.opening.result()))
+                    flight.pulling.add_done_callback(flight.landed)
+                await asyncio.wait({flight.pulling})
+        finally:
+            flight.subscribers -= 1
+            if flight.finished:
+                self._forget(key, flight)
+            elif not flight.subscribers:
+                self._forget(key, flight)
+                await flight.cancel()
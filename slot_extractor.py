@@ -0,0 +1,240 @@
+"""Pull several intake answers out of a single free-form message.
+
+"I'm Ana, ana@x.com, flying Boston to Lisbon for 7 days in May 2025 with
+$3000" answers all seven slots at once. ``extract_slots`` finds them with
+regular expressions compiled at import: email addresses, day, night and week
+counts, dollar amounts, month/season/ISO dates, "from X to Y" style routes
+and "I'm <Name>" introductions. Every candidate goes through its slot's
+parser, so extracted values obey the same rules as answers to the questions.
+
+When the rules find little in a long message, bots created with
+``llm_extraction=True`` make one extra model call (``extraction_prompt`` /
+``parse_extraction``) asking for the remaining fields as JSON.
+"""
+import json
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+from itinerary_cache import parse_budget
+from prompt_templates import PromptTemplate
+from slots import SLOTS, SLOTS_BY_FIELD
+
+MONTHS = (r"jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?"
+          r"|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?")
+ORDINAL = r"\d{1,2}(?:st|nd|rd|th)?"
+# "a"/"an" are left out: "a night in Kyoto" is a side trip, not the trip length
+NUMBER_WORDS = {
+    'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7,
+    'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12, 'thirteen': 13, 'fourteen': 14,
+    'fifteen': 15, 'twenty': 20, 'thirty': 30,
+}
+COUNT = r"\d{1,2}|" + "|".join(NUMBER_WORDS)
+
+EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)*\.\w+")
+DAYS = re.compile(rf"\b({COUNT})[\s-]*(days?|nights?|weeks?)\b", re.IGNORECASE)
+BUDGET = (
+    re.compile(r"\$\s?(\d[\d,.]*\s*[kK]?)\b"),
+    re.compile(r"\b(\d[\d,.]*\s*[kK]?)\s*(?:usd|dollars|bucks)\b", re.IGNORECASE),
+    re.compile(r"\bbudget\s+(?:of|is|around|about|=|:)?\s*(?:usd\s*)?(\d[\d,.]*\s*[kK]?)\b", re.IGNORECASE),
+)
+DATES = (
+    re.compile(rf"\b\d{{4}}-\d{{2}}-\d{{2}}(?:\s*(?:-|–|to)\s*\d{{4}}-\d{{2}}-\d{{2}})?\b"),
+    re.compile(rf"\b(?:(?:early|mid|late)[\s-]+)?(?:{MONTHS})\.?"
+               rf"(?:\s+{ORDINAL}(?:\s*(?:-|–|to)\s*{ORDINAL})?)?(?:,?\s+\d{{4}})?\b", re.IGNORECASE),
+    re.compile(rf"\b{ORDINAL}(?:\s*(?:-|–|to)\s*{ORDINAL})?\s+(?:of\s+)?(?:{MONTHS})(?:,?\s+\d{{4}})?\b",
+               re.IGNORECASE),
+    re.compile(r"\b(?:(?:early|late)\s+)?(?:spring|summer|fall|autumn|winter)(?:\s+\d{4})?\b", re.IGNORECASE),
+)
+
+# A place is a run of capitalized words ("St." style abbreviations included),
+# allowing a few lower-case joiners
+PLACE_WORD = r"(?:[A-Z][a-z]{0,2}\.|[A-Z][\w'’-]*)"
+PLACE = rf"{PLACE_WORD}(?:\s+(?:de|da|do|del|la|le|of|upon|{PLACE_WORD}))*"
+TRAVEL_VERBS = "fly|flying|travel|traveling|travelling|going|heading|driving|trip"
+TRAVEL_VERB = rf"(?i:{TRAVEL_VERBS})"
+# "to X" in "a day trip to X" names an excursion, not the destination
+NOT_DAY_TRIP = r"(?<![Dd]ay [Tt]rip )(?<![Dd]ay-[Tt]rip )"
+ROUTES = (
+    # (pattern, group holding the source, group holding the destination)
+    (re.compile(rf"\b(?i:from)\s+({PLACE})\s+(?i:to)\s+({PLACE})"), 1, 2),
+    (re.compile(rf"\b{TRAVEL_VERB}\s+({PLACE})\s+(?i:to)\s+({PLACE})"), 1, 2),
+    # "London to Marrakech" opening the message or a clause
+    (re.compile(rf"(?:^|[-–,;:.!]\s*)({PLACE})\s+(?i:to)\s+({PLACE})"), 1, 2),
+    (re.compile(rf"{NOT_DAY_TRIP}\b(?i:to)\s+({PLACE})\s+(?i:from)\s+({PLACE})"), 2, 1),
+    (re.compile(rf"\b(?i:from|leaving|departing)\s+({PLACE})"), 1, None),
+    (re.compile(rf"{NOT_DAY_TRIP}\b(?i:to|visit|visiting|explore|exploring)\s+({PLACE})"), None, 1),
+)
+NAME = (
+    re.compile(r"(?:^|\b)(?i:i'm|i’m|i am|my name is|my name's|this is|call me|it's|name:)\s+"
+               r"([A-Z][a-zA-Z'’-]+(?:\s+[A-Z][a-zA-Z'’-]+)?)"),
+    re.compile(r"^(?:(?i:hi|hello|hey),?\s+)?([A-Z][a-zA-Z'’-]+) here\b"),
+)
+# Values no other answer could be mistaken for; always taken from a message
+# that otherwise just answers the question asked
+SELF_EVIDENT = ('email',)
+# Trip details often stated along with the answer ("Tokyo for 10 days"); cut
+# out of it and kept when something is left to answer the question
+STATED_ALONGSIDE = ('days', 'dates')
+# Words joining such a detail to the rest of the answer
+JOINERS = r"(?:[\s,;–-]|\b(?i:for|in|during|on|over|around|about|and|with)\b)+"
+LEADING_JOINERS = re.compile(rf"^{JOINERS}")
+TRAILING_JOINERS = re.compile(rf"{JOINERS}$")
+NOT_PLACES = re.compile(rf"^(?:{MONTHS}|{TRAVEL_VERBS}|spring|summer|fall|autumn|winter|i|me|my|we|our"
+                        rf"|monday|tuesday|wednesday|thursday|friday|saturday|sunday)$", re.IGNORECASE)
+
+EXTRACTION = PromptTemplate('extraction', """Extract trip details from the traveler's message below.
+Reply with ONLY a JSON object. Use these keys, and only for details the message actually states: {fields}.
+"days" is a whole number of days and "budget" a number of US dollars.
+
+Message: {message}""")
+
+LABELS = {
+    'name': "name", 'email': "email", 'destination': "going to", 'source': "from",
+    'days': "days", 'budget': "budget", 'dates': "dates",
+}
+
+
+def clean_place(candidate: str) -> Optional[str]:
+    """Drop trailing words that are not part of a place ("Lisbon May 2025")."""
+    words = []
+    for word in candidate.split():
+        if NOT_PLACES.match(word.strip(".,'’")):
+            break
+        words.append(word)
+    place = " ".join(words).rstrip(".,'’-")
+    return place or None
+
+
+def find_days(text: str) -> Optional[str]:
+    match = days_match(text)
+    if not match:
+        return None
+    count = match.group(1).lower()
+    number = int(count) if count.isdigit() else NUMBER_WORDS[count]
+    unit = match.group(2).lower()
+    if unit.startswith('night'):
+        number += 1
+    elif unit.startswith('week'):
+        number *= 7
+    return str(number)
+
+
+def find_budget(text: str) -> Optional[str]:
+    for pattern in BUDGET:
+        match = pattern.search(text)
+        amount = parse_budget(match.group(1)) if match else None
+        if amount:
+            return f"{amount:.0f}" if amount == int(amount) else f"{amount:.2f}"
+    return None
+
+
+def find_dates(text: str) -> Optional[str]:
+    match = dates_match(text)
+    return match.group(0).strip() if match else None
+
+
+def days_match(text: str) -> Optional[re.Match]:
+    return DAYS.search(text)
+
+
+def dates_match(text: str) -> Optional[re.Match]:
+    for pattern in DATES:
+        for match in pattern.finditer(text):
+            # "may" is usually the verb; only the capitalized month counts
+            if match.group(0).lower().startswith('may') and not match.group(0).startswith('May'):
+                continue
+            return match
+    return None
+
+
+DETAIL_MATCHES = {'days': days_match, 'dates': dates_match}
+
+
+def strip_details(text: str, fields: Iterable[str]) -> str:
+    """``text`` without the ``STATED_ALONGSIDE`` fields it states and the words joining them."""
+    spans = sorted(match.span() for match in (DETAIL_MATCHES[field](text) for field in fields) if match)
+    pieces: List[str] = []
+    start = 0
+    for begin, end in spans:
+        pieces.append(text[start:max(begin, start)])
+        start = max(end, start)
+    pieces.append(text[start:])
+    pieces = [TRAILING_JOINERS.sub("", LEADING_JOINERS.sub("", piece)) for piece in pieces]
+    return " ".join(piece for piece in pieces if piece)
+
+
+def find_route(text: str) -> Dict[str, str]:
+    found: Dict[str, str] = {}
+    for pattern, source_group, destination_group in ROUTES:
+        match = pattern.search(text)
+        if not match:
+            continue
+        for field, group in (('source', source_group), ('destination', destination_group)):
+            if group is not None and field not in found:
+                place = clean_place(match.group(group))
+                if place:
+                    found[field] = place
+        if len(found) == 2:
+            break
+    return found
+
+
+def extract_slots(text: str) -> Dict[str, Any]:
+    """Every slot value ``text`` states, parsed by its slot; invalid candidates are dropped."""
+    candidates: Dict[str, Optional[str]] = {}
+    email = EMAIL.search(text)
+    if email:
+        candidates['email'] = email.group(0)
+        text = text.replace(email.group(0), " ")
+    candidates.update(find_route(text))
+    for pattern in NAME:
+        name = pattern.search(text)
+        if name and name.group(1) not in candidates.values():
+            candidates['name'] = name.group(1)
+            break
+    candidates['days'] = find_days(text)
+    candidates['budget'] = find_budget(text)
+    candidates['dates'] = find_dates(text)
+    return parse_candidates(candidates)
+
+
+def parse_candidates(candidates: Dict[str, Any]) -> Dict[str, Any]:
+    found = {}
+    for field, value in candidates.items():
+        slot = SLOTS_BY_FIELD.get(field)
+        if slot is None or value is None or not str(value).strip():
+            continue
+        try:
+            found[field] = slot.parse(str(value))
+        except ValueError:
+            continue
+    return found
+
+
+def extraction_prompt(message: str, fields: Iterable[str]) -> str:
+    return EXTRACTION.render({'fields': ", ".join(f'"{field}"' for field in fields), 'message': message})
+
+
+def parse_extraction(reply: str) -> Dict[str, Any]:
+    """Slot values from the model's JSON answer; anything unusable is ignored."""
+    match = re.search(r"\{.*\}", reply, re.DOTALL)
+    if not match:
+        return {}
+    try:
+        data = json.loads(match.group(0))
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return parse_candidates({field: data.get(field) for field in SLOTS_BY_FIELD})
+
+
+def describe_extracted(found: Dict[str, Any]) -> str:
+    """Short confirmation of what a message filled in, in slot order."""
+    details = []
+    for slot in SLOTS:
+        if slot.field in found:
+            value = found[slot.field]
+            value = f"${value}" if slot.field == 'budget' else value
+            details.append(f"{LABELS[slot.field]}: {value}")
+    return "Got it! " + ", ".join(details) + "."
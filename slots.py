@@ -0,0 +1,71 @@
+"""Declarative description of the trip-planning intake.
+
+Each ``Slot`` names a ``user_info`` field, the canned question that asks for
+it and a parser that turns the raw answer into the stored value. Parsers
+raise ``ValueError`` carrying the re-prompt shown to the user. Slots are asked
+in table order: the next question is always the first slot without a value.
+A slot without a canned question is phrased by the model, and only at the
+moment it is actually asked.
+"""
+import re
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+GREETING = "Hello! I'm TravelGenie, your personal travel planning assistant! 🌍✈️ I'm here to help you create an amazing, personalized travel experience. To get started, what's your name?"
+
+EMAIL_PATTERN = re.compile(r'^[\w\.-]+@[\w\.-]+\.\w+$')
+INTRODUCTION = re.compile(r"^(?:i'm|i’m|i am|my name is|my name's|this is|call me|it's)\s+", re.IGNORECASE)
+
+
+class Slot(NamedTuple):
+    field: str
+    question: Optional[str]
+    parse: Callable[[str], Any]
+
+
+def is_valid_email(email: str) -> bool:
+    return bool(EMAIL_PATTERN.match(email))
+
+
+def parse_text(answer: str) -> str:
+    return answer.strip()
+
+
+def parse_name(answer: str) -> str:
+    """The name, without an "I'm" or "my name is" in front of it."""
+    name = INTRODUCTION.sub("", answer.strip()).rstrip(".!")
+    return name or answer.strip()
+
+
+def parse_email(answer: str) -> str:
+    email = answer.strip()
+    if not is_valid_email(email):
+        raise ValueError("I need a valid email address to send your itinerary. Please provide an email in the format: example@email.com")
+    return email
+
+
+def parse_days(answer: str) -> int:
+    try:
+        days = int(answer.strip())
+    except ValueError:
+        raise ValueError("Please enter a valid number (like 5 or 10) for the number of days you'd like to travel.")
+    if not 1 <= days <= 30:
+        raise ValueError("Please enter a number of days between 1 and 30. This helps me create the perfect itinerary length for you!")
+    return days
+
+
+def fallback_prompt(field: str) -> str:
+    """Prompt used to have the model phrase a question for a slot without a canned one."""
+    return f"Ask for {field} in a friendly, travel-focused way"
+
+
+SLOTS = (
+    Slot('name', "Before we plan anything, what's your name?", parse_name),
+    Slot('email', "Perfect! To send you your complete travel itinerary and any updates, I'll need your email address. What's your email?", parse_email),
+    Slot('destination', "Exciting! Where would you like to go? You can tell me a specific city, country, or even describe the type of experience you're looking for (like 'tropical beach destination' or 'European cultural cities').", parse_text),
+    Slot('source', "Great choice! From which city or airport will you be departing for this adventure?", parse_text),
+    Slot('days', "How many days do you have for this trip? Please enter a number between 1-30 days. (This helps me pace your itinerary perfectly!)", parse_days),
+    Slot('budget', "What's your total budget for this trip in USD? Include everything - flights, accommodation, food, activities, and shopping. Don't worry, I'll help you make every dollar count!", parse_text),
+    Slot('dates', "When are you planning to travel? Please let me know the month and year (like 'March 2024' or 'Summer 2024'). This helps me suggest the best activities and prepare you for the weather!", parse_text),
+)
+
+SLOTS_BY_FIELD: Dict[str, Slot] = {slot.field: slot for slot in SLOTS}
@@ -0,0 +1,83 @@
+"""Itinerary parts generated while the traveler is still answering.
+
+Bots created with ``speculative=True`` start every itinerary section whose
+prompt is already final (see ``section_prompts``) as soon as an intake turn
+makes it possible: the overview and practical tips once the trip length is
+known, then the budget-dependent sections while the traveler types the
+dates. When the last answer arrives, ``generate_sections`` takes the
+finished or running calls and only requests the rest, so most of the
+itinerary latency is hidden behind typing time.
+
+A ``Speculation`` holds the calls by prompt, so a result is only ever used
+for exactly the prompt it was made from. Calls are ``asyncio.Task``s or,
+for the sync bot, ``StoppableCall``s: cancelling a task interrupts its
+request, while a thread already running a section can only be asked to stop,
+so the sync bot streams speculative sections and gives up between chunks.
+Work that is never used is counted in ``metrics`` as stale (the prompt
+changed), cache_hit (the itinerary came from the cache), failed or cancelled.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from metrics import record_speculation
+
+# Background model calls in flight across all sessions of a process
+MAX_SPECULATIVE_WORKERS = 16
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def executor() -> ThreadPoolExecutor:
+    """The process-wide pool running speculative calls for the sync bot."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_SPECULATIVE_WORKERS,
+                                           thread_name_prefix='speculation')
+        return _executor
+
+
+class StoppableCall:
+    """``run(*args, stopped)`` on ``executor()``; ``cancel()`` also sets ``stopped``.
+
+    ``Future.cancel()`` only helps before the call starts, so ``run`` is
+    expected to check ``stopped`` while it works and return early.
+    """
+
+    def __init__(self, run: Callable[..., Any], *args: Any):
+        self.stopped = threading.Event()
+        self.future = executor().submit(run, *args, self.stopped)
+
+    def result(self) -> Any:
+        return self.future.result()
+
+    def cancel(self) -> bool:
+        self.stopped.set()
+        return self.future.cancel()
+
+
+class Speculation:
+    def __init__(self):
+        self.calls: Dict[str, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self.calls)
+
+    def start(self, prompt: str, submit: Callable[[str], Any]):
+        """Run ``submit(prompt)`` unless a call for this prompt is already running."""
+        if prompt not in self.calls:
+            self.calls[prompt] = submit(prompt)
+
+    def take(self, prompt: str) -> Optional[Any]:
+        """The call made for ``prompt``, if any; it no longer counts as speculative."""
+        return self.calls.pop(prompt, None)
+
+    def cancel(self, outcome: str = 'cancelled'):
+        """Stop every call nobody took and count it as wasted under ``outcome``."""
+        calls, self.calls = self.calls, {}
+        for call in calls.values():
+            call.cancel()
+        if calls:
+            record_speculation(outcome, len(calls))
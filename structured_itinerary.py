@@ -0,0 +1,451 @@
+"""Itineraries generated as compact JSON and rendered locally.
+
+In structured mode the model is asked for the plan in ``SCHEMA`` (minified
+JSON, whole-dollar costs, short strings) instead of prose with markdown
+headings, so no output tokens go to formatting and the result can be
+validated and diffed. ``StructuredParser`` reads the JSON as it streams:
+every top-level member is returned as soon as it closes, and every day of
+``days`` as soon as that day closes, so the traveler sees the plan part by
+part. The parts are rendered locally, in the numbered sections of
+``itinerary_sections``:
+
+* ``render_text`` for the CLI and the GUI chat (and for the cache and
+  follow-ups, which read the same headings as a prose itinerary);
+* ``render_markdown`` and ``render_html`` for export (see ``export_itinerary``).
+
+``check_budget`` adds up the budget breakdown (the model is not asked for a
+total) and compares it with the traveler's budget, and the day-by-day costs
+with the activities line, without another call.
+"""
+import html
+import json
+import os
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from destination_facts import FIELDS as FACT_FIELDS, Facts, facts_block
+from itinerary_cache import parse_budget
+from itinerary_sections import PROFILE, SECTIONS
+from prompt_templates import PromptTemplate
+
+SCHEMA = ('{"overview":"","highlights":[""],"weather":"","packing":[""],'
+          '"flights":{"route":"","airlines":[""],"cost":0,"tip":""},'
+          '"stays":[{"name":"","area":"","nightly":0}],'
+          '"days":[{"day":1,"title":"","plan":[{"time":"morning","do":"","cost":0}],"food":[""]}],'
+          '"budget":{"flights":0,"accommodation":0,"food":0,"activities":0,"transport":0,"other":0},'
+          '"tips":[""],"saving":[""]}')
+
+# The template's own braces are doubled so ``PromptTemplate`` reads them as text
+STRUCTURED = PromptTemplate('structured', """
+Plan the trip of the traveler profiled at the end of this message.
+Reply with ONLY minified JSON in exactly this shape, with no markdown and no other text:
+""" + SCHEMA.replace('{', '{{').replace('}', '}}') + """
+"days" has one entry per trip day with 3-4 "plan" items; "time" is morning, afternoon or evening.
+Costs are whole US dollars. "budget" holds trip totals per category that together stay within the total budget.
+Keep every string under 15 words.
+
+{profile}""")
+
+TEMPLATES = (STRUCTURED,)
+
+# Top-level member -> key of the ``SECTIONS`` entry it is rendered in
+MEMBER_SECTIONS = {
+    'overview': 'overview', 'highlights': 'overview',
+    'weather': 'season', 'packing': 'season',
+    'flights': 'flights',
+    'stays': 'accommodation',
+    'days': 'days',
+    'budget': 'budget',
+    'tips': 'tips',
+    'saving': 'money_saving',
+}
+SECTION_HEADINGS = {section.key: (number, section.title) for number, section in enumerate(SECTIONS, 1)}
+BUDGET_LABELS = {
+    'flights': "Flights", 'accommodation': "Accommodation", 'food': "Food",
+    'activities': "Activities/Attractions", 'transport': "Local transportation", 'other': "Shopping/Miscellaneous",
+}
+
+# Characters that can change the parser's state
+TOKENS = re.compile(r'[{}\[\]",\\]')
+DAYS_MEMBER = re.compile(r'\s*"days"\s*:\s*')
+
+
+def structured_prompt(user_info: Dict[str, Any], facts: Optional[Facts] = None) -> str:
+    return STRUCTURED.render({'profile': PROFILE.render(user_info)}) + facts_block(facts, FACT_FIELDS)
+
+
+class StructuredParser:
+    """Incremental parser for a plan streamed as JSON.
+
+    ``feed`` returns the (key, value) pairs completed by the new text: the
+    top-level members, except ``days``, whose days arrive one at a time as
+    ('day', {...}). Text around the JSON object (a code fence, a preamble) is
+    ignored; a member that is not valid JSON is left out of ``plan``.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.plan: Dict[str, Any] = {}
+        self._scanned = 0
+        self._depth = 0
+        self._in_string = False
+        # Offset of the character after a backslash inside a string
+        self._escaped = -1
+        # Where the current top-level member and the current day start
+        self._member = 0
+        self._day = 0
+        self._in_days = False
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        self.text += chunk
+        events: List[Tuple[str, Any]] = []
+        for match in TOKENS.finditer(self.text, self._scanned):
+            if self.done:
+                break
+            index, char = match.start(), match.group()
+            if index == self._escaped:
+                continue
+            if self._depth == 0 and char != '{':
+                continue
+            if self._in_string:
+                if char == '\\':
+                    self._escaped = index + 1
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+                if self._depth == 1:
+                    self._member = index + 1
+                elif self._depth == 2 and char == '[':
+                    self._in_days = DAYS_MEMBER.fullmatch(self.text, self._member, index) is not None
+                elif self._depth == 3 and self._in_days and char == '{':
+                    self._day = index
+            elif char in '}]':
+                if self._depth == 3 and self._in_days and char == '}':
+                    day = self._load(self.text[self._day:index + 1])
+                    if isinstance(day, dict):
+                        self.plan.setdefault('days', []).append(day)
+                        events.append(('day', day))
+                elif self._depth == 2 and char == ']':
+                    self._in_days = False
+                self._depth -= 1
+                if self._depth == 0:
+                    self._close_member(index, events)
+                    self.done = True
+            elif char == ',' and self._depth == 1:
+                self._close_member(index, events)
+                self._member = index + 1
+        self._scanned = len(self.text)
+        return events
+
+    def _close_member(self, end: int, events: List[Tuple[str, Any]]):
+        text = self.text[self._member:end]
+        if not text.strip():
+            return
+        member = self._load("{" + text + "}")
+        if not isinstance(member, dict):
+            return
+        for key, value in member.items():
+            if key == 'days':
+                # Already returned day by day; keep the list as the model closed it
+                if isinstance(value, list):
+                    self.plan['days'] = [day for day in value if isinstance(day, dict)]
+                continue
+            self.plan[key] = value
+            events.append((key, value))
+
+    @staticmethod
+    def _load(text: str) -> Any:
+        try:
+            return json.loads(text)
+        except ValueError:
+            return None
+
+
+def parse_plan(text: str) -> Optional[Dict[str, Any]]:
+    """The plan in a complete model answer, or None when it holds no JSON object."""
+    parser = StructuredParser()
+    parser.feed(text)
+    return parser.plan or None
+
+
+class BudgetCheck(NamedTuple):
+    # Sum of the budget breakdown
+    total: float
+    # The traveler's budget, when it could be read
+    budget: Optional[float]
+    # Sum of the costs listed day by day, and the activities line it should fit in
+    itemized: float
+    activities: float
+
+    @property
+    def within_budget(self) -> bool:
+        return self.budget is None or self.total <= self.budget
+
+    def describe(self) -> str:
+        if self.budget is None:
+            summary = f"TOTAL: {dollars(self.total)}"
+        elif self.within_budget:
+            summary = (f"TOTAL: {dollars(self.total)} of your {dollars(self.budget)} budget "
+                       f"({dollars(self.budget - self.total)} to spare)")
+        else:
+            summary = (f"TOTAL: {dollars(self.total)}, {dollars(self.total - self.budget)} over your "
+                       f"{dollars(self.budget)} budget")
+        if self.itemized > self.activities:
+            summary += (f"\nNote: the day-by-day costs add up to {dollars(self.itemized)}, "
+                        f"more than the {dollars(self.activities)} set aside for activities")
+        return summary
+
+
+def amount(value: Any) -> float:
+    """A cost as the model wrote it (50, "50", "$50") in dollars; 0 when unreadable."""
+    parsed = parse_budget(value) if value is not None and not isinstance(value, bool) else None
+    return parsed or 0.0
+
+
+def dollars(value: float) -> str:
+    return f"${value:,.0f}"
+
+
+def check_budget(plan: Dict[str, Any], budget: Any) -> Optional[BudgetCheck]:
+    """Compare the plan's budget breakdown with the traveler's ``budget``; None without a breakdown."""
+    breakdown = plan.get('budget')
+    if not isinstance(breakdown, dict):
+        return None
+    itemized = sum(amount(item.get('cost')) for day in days_of(plan) for item in items(day.get('plan')))
+    return BudgetCheck(sum(amount(value) for value in breakdown.values()), parse_budget(budget) if budget else None,
+                       itemized, amount(breakdown.get('activities')))
+
+
+def days_of(plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [day for day in plan.get('days') or () if isinstance(day, dict)]
+
+
+def items(value: Any) -> List[Any]:
+    return [item for item in value if item] if isinstance(value, list) else []
+
+
+def strings(value: Any) -> List[str]:
+    return [str(item) for item in items(value) if not isinstance(item, (dict, list))]
+
+
+# Rendering goes through blocks, so every format lays out the same content:
+# ('heading', title), ('day', title), ('text', paragraph), ('list', label, entries),
+# ('amounts', [(label, amount)]) and ('total', summary)
+Block = Tuple[Any, ...]
+
+
+def member_blocks(key: str, value: Any, plan: Dict[str, Any], budget: Any) -> List[Block]:
+    """Blocks for one top-level member (or one ``day``) of the plan, without its section heading."""
+    if key == 'overview' and value:
+        return [('text', str(value))]
+    if key == 'highlights':
+        return [('list', "Highlights", strings(value))]
+    if key == 'weather' and value:
+        return [('text', f"Weather: {value}")]
+    if key == 'packing':
+        return [('list', "Packing", strings(value))]
+    if key == 'flights' and isinstance(value, dict):
+        details = []
+        if value.get('route'):
+            details.append(f"Route: {value['route']}")
+        if strings(value.get('airlines')):
+            details.append("Airlines: " + ", ".join(strings(value.get('airlines'))))
+        if value.get('cost') is not None:
+            details.append(f"Estimated cost: {dollars(amount(value.get('cost')))}")
+        if value.get('tip'):
+            details.append(f"Booking tip: {value['tip']}")
+        return [('list', "", details)]
+    if key == 'stays':
+        stays = []
+        for stay in items(value):
+            if isinstance(stay, dict):
+                area = f" ({stay['area']})" if stay.get('area') else ""
+                stays.append(f"{stay.get('name', 'Stay')}{area}: about {dollars(amount(stay.get('nightly')))} per night")
+        return [('list', "", stays)]
+    if key == 'day' and isinstance(value, dict):
+        title = f"Day {value.get('day', '?')}" + (f": {value['title']}" if value.get('title') else "")
+        entries = []
+        for item in items(value.get('plan')):
+            if isinstance(item, dict):
+                cost = f" ({dollars(amount(item.get('cost')))})" if amount(item.get('cost')) else ""
+                entries.append(f"{str(item.get('time', '')).capitalize() or 'Anytime'}: {item.get('do', '')}{cost}")
+        if strings(value.get('food')):
+            entries.append("Food: " + "; ".join(strings(value.get('food'))))
+        return [('day', title), ('list', "", entries)]
+    if key == 'budget' and isinstance(value, dict):
+        lines = [(BUDGET_LABELS.get(name, str(name).capitalize()), amount(cost)) for name, cost in value.items()]
+        check = check_budget(plan, budget)
+        return [('amounts', lines)] + ([('total', check.describe())] if check else [])
+    if key in ('tips', 'saving'):
+        return [('list', "", strings(value))]
+    return []
+
+
+class PlanRenderer:
+    """Turns a streamed plan into text part by part, headings included.
+
+    ``feed`` returns the text for whatever the new chunk completed (often
+    nothing); ``close`` returns what is left: nothing for a plan, or the
+    whole answer when the model did not reply with JSON at all.
+    """
+
+    def __init__(self, budget: Any = None):
+        self.parser = StructuredParser()
+        self.budget = budget
+        self._sections: List[str] = []
+
+    @property
+    def plan(self) -> Optional[Dict[str, Any]]:
+        return self.parser.plan or None
+
+    def feed(self, chunk: str) -> str:
+        return "".join(self._part(key, value) for key, value in self.parser.feed(chunk))
+
+    def _part(self, key: str, value: Any) -> str:
+        section = MEMBER_SECTIONS.get('days' if key == 'day' else key)
+        if section is None:
+            return ""
+        blocks = member_blocks(key, value, self.parser.plan, self.budget)
+        if blocks and section not in self._sections:
+            number, title = SECTION_HEADINGS[section]
+            blocks.insert(0, ('heading', f"{number}. {title}"))
+            self._sections.append(section)
+        return render_blocks_text(blocks, first=len(self._sections) == 1 and blocks[0][0] == 'heading')
+
+    def close(self) -> str:
+        if self.parser.plan:
+            return ""
+        return self.parser.text.strip()
+
+
+def plan_blocks(plan: Dict[str, Any], budget: Any = None) -> List[Block]:
+    """Blocks for a whole plan, in ``SECTIONS`` order whatever order its members came in."""
+    blocks: List[Block] = []
+    for number, section in enumerate(SECTIONS, 1):
+        section_blocks: List[Block] = []
+        for key, target in MEMBER_SECTIONS.items():
+            if target != section.key or key not in plan:
+                continue
+            if key == 'days':
+                for day in days_of(plan):
+                    section_blocks += member_blocks('day', day, plan, budget)
+            else:
+                section_blocks += member_blocks(key, plan[key], plan, budget)
+        if section_blocks:
+            blocks += [('heading', f"{number}. {section.title}")] + section_blocks
+    return blocks
+
+
+def render_blocks_text(blocks: List[Block], first: bool = False) -> str:
+    out = []
+    for index, block in enumerate(blocks):
+        kind = block[0]
+        if kind == 'heading':
+            out.append(("" if first and index == 0 else "\n") + block[1] + "\n")
+        elif kind == 'day':
+            out.append(f"\n{block[1]}\n")
+        elif kind == 'text':
+            out.append(block[1] + "\n")
+        elif kind == 'list':
+            if block[1]:
+                out.append(f"{block[1]}:\n")
+            out.extend(f"- {entry}\n" for entry in block[2])
+        elif kind == 'amounts':
+            out.extend(f"- {label}: {dollars(value)}\n" for label, value in block[1])
+        elif kind == 'total':
+            out.append(block[1] + "\n")
+    return "".join(out)
+
+
+def render_blocks_markdown(blocks: List[Block]) -> str:
+    out = []
+    for block in blocks:
+        kind = block[0]
+        if kind == 'heading':
+            out.append(f"## {block[1]}\n\n")
+        elif kind == 'day':
+            out.append(f"### {block[1]}\n\n")
+        elif kind == 'text':
+            out.append(block[1] + "\n\n")
+        elif kind == 'list':
+            if block[1]:
+                out.append(f"**{block[1]}:**\n\n")
+            out.extend(f"- {entry}\n" for entry in block[2])
+            out.append("\n")
+        elif kind == 'amounts':
+            out.append("| Category | Amount |\n| --- | ---: |\n")
+            out.extend(f"| {label} | {dollars(value)} |\n" for label, value in block[1])
+            out.append("\n")
+        elif kind == 'total':
+            out.extend(f"**{line}**\n\n" for line in block[1].split("\n"))
+    return "".join(out).strip() + "\n"
+
+
+def render_blocks_html(blocks: List[Block]) -> str:
+    out = ['<article class="itinerary">']
+    for block in blocks:
+        kind = block[0]
+        if kind == 'heading':
+            out.append(f"<h2>{html.escape(block[1])}</h2>")
+        elif kind == 'day':
+            out.append(f"<h3>{html.escape(block[1])}</h3>")
+        elif kind == 'text':
+            out.append(f"<p>{html.escape(block[1])}</p>")
+        elif kind == 'list':
+            if block[1]:
+                out.append(f"<p><strong>{html.escape(block[1])}:</strong></p>")
+            out.append("<ul>" + "".join(f"<li>{html.escape(entry)}</li>" for entry in block[2]) + "</ul>")
+        elif kind == 'amounts':
+            out.append("<table>" + "".join(f"<tr><td>{html.escape(label)}</td><td>{dollars(value)}</td></tr>"
+                                          for label, value in block[1]) + "</table>")
+        elif kind == 'total':
+            out.append("<p><strong>" + "<br>".join(html.escape(line) for line in block[1].split("\n"))
+                       + "</strong></p>")
+    out.append("</article>")
+    return "\n".join(out) + "\n"
+
+
+def render_text(plan: Dict[str, Any], budget: Any = None) -> str:
+    return render_blocks_text(plan_blocks(plan, budget), first=True)
+
+
+def render_markdown(plan: Dict[str, Any], budget: Any = None) -> str:
+    return render_blocks_markdown(plan_blocks(plan, budget))
+
+
+def render_html(plan: Dict[str, Any], budget: Any = None) -> str:
+    return render_blocks_html(plan_blocks(plan, budget))
+
+
+HTML_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title></head>
+<body>
+{body}</body></html>
+"""
+
+
+def export_itinerary(path: str, text: str, plan: Optional[Dict[str, Any]] = None, budget: Any = None,
+                     title: str = "Travel itinerary"):
+    """Write the itinerary in the format named by ``path``'s extension (.md, .html, .json or text).
+
+    A prose itinerary (``plan`` is None) is written as it is, or inside a
+    ``<pre>`` block for .html; .json needs a plan.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.json':
+        if plan is None:
+            raise ValueError("only itineraries generated in structured mode can be exported as JSON")
+        content = json.dumps(plan, ensure_ascii=False, indent=2) + "\n"
+    elif extension in ('.html', '.htm'):
+        body = render_html(plan, budget) if plan is not None else f"<pre>{html.escape(text)}</pre>\n"
+        content = HTML_PAGE.format(title=html.escape(title), body=body)
+    elif extension in ('.md', '.markdown') and plan is not None:
+        content = render_markdown(plan, budget)
+    else:
+        content = text if text.endswith("\n") else text + "\n"
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
@@ -0,0 +1,47 @@
+from itinerary_cache import ItineraryCache, profile_key
+from itinerary_similarity import SimilarityIndex
+from llm_backends import PROFILES, FakeBackend
+from resilient_client import ResiliencePolicy, ResilientClient
+from travel_planner_bot import TravelPlannerBot
+
+PROFILE = {'name': "Ana", 'email': "ana@example.com", 'destination': "Lisbon", 'source': "New York",
+           'days': 3, 'budget': "$3,000", 'dates': "June 2025"}
+
+
+def client():
+    return ResilientClient(FakeBackend(PROFILES['instant']),
+                           ResiliencePolicy(requests_per_minute=1e9, tokens_per_minute=1e12))
+
+
+def planned(cache, **options):
+    bot = TravelPlannerBot(client=client(), cache=cache, **options)
+    bot.user_info.update(PROFILE)
+    bot.generate_itinerary()
+    return bot
+
+
+def test_key_normalizes_the_profile_and_ignores_the_traveler():
+    other = dict(PROFILE, name="Bo", email="bo@example.com", destination="  lisbon ", budget="3000 usd")
+    assert profile_key(other) == profile_key(PROFILE)
+    assert profile_key(dict(PROFILE, days=4)) != profile_key(PROFILE)
+
+
+def test_key_includes_the_output_mode():
+    assert profile_key(PROFILE, 'structured') != profile_key(PROFILE, 'prose')
+    cache = ItineraryCache()
+    cache.put(PROFILE, "Day 1: Alfama.")
+    assert cache.get(PROFILE, 'structured') is None
+    assert cache.get(PROFILE).text == "Day 1: Alfama."
+
+
+def test_structured_lookup_is_not_served_a_prose_itinerary():
+    cache = ItineraryCache(similarity=SimilarityIndex())
+    planned(cache)
+    bot = planned(cache, structured=True)
+    assert bot.plan is not None
+    assert cache.hits == 0
+
+    again = planned(cache, structured=True)
+    assert cache.hits == 1
+    assert again.plan == bot.plan
+    assert again.budget_check() is not None
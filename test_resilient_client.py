@@ -0,0 +1,223 @@
+import asyncio
+import json
+import threading
+
+import groq
+import httpx
+import pytest
+
+from llm_backends import PROFILES, FakeBackend, fake_response
+from model_router import FAST_MODEL, LARGE_MODEL, ModelRouter
+from resilient_client import (
+    AsyncResilientClient, CircuitOpenError, RateLimitError, ResiliencePolicy, ResilientClient, TokenBucket,
+    usage_tokens
+)
+from travel_planner_bot import TravelPlannerBot
+
+UNLIMITED = dict(requests_per_minute=1e9, tokens_per_minute=1e12)
+REQUEST = dict(model='llama-3.1-8b-instant', messages=[{'role': 'user', 'content': "Plan Lisbon"}],
+               max_tokens=500, stream=True)
+
+
+def sse_events():
+    chunk = {'id': 'c', 'object': 'chat.completion.chunk', 'created': 0, 'model': 'llama-3.1-8b-instant',
+             'choices': [{'index': 0, 'delta': {'content': "Day 1: Alfama. "}, 'finish_reason': None}]}
+    for _ in range(100):
+        yield f"data: {json.dumps(chunk)}\n\n".encode()
+    yield b"data: [DONE]\n\n"
+
+
+class SSEBody(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """A long server-sent event stream that remembers whether it was closed."""
+
+    def __init__(self):
+        self.closed = False
+
+    def __iter__(self):
+        yield from sse_events()
+
+    async def __aiter__(self):
+        for event in sse_events():
+            yield event
+
+    def close(self):
+        self.closed = True
+
+    async def aclose(self):
+        self.closed = True
+
+
+def mock_transport():
+    bodies = []
+
+    def respond(request):
+        bodies.append(SSEBody())
+        return httpx.Response(200, headers={'content-type': 'text/event-stream'}, stream=bodies[-1])
+
+    return httpx.MockTransport(respond), bodies
+
+
+def test_closing_a_stream_closes_the_http_response():
+    transport, bodies = mock_transport()
+    backend = groq.Groq(api_key='test', base_url='http://groq.test', http_client=httpx.Client(transport=transport))
+    stream = ResilientClient(backend, ResiliencePolicy(**UNLIMITED)).chat.completions.create(**REQUEST)
+    next(stream)
+    stream.close()
+    assert bodies[0].closed
+
+
+def test_closing_an_async_stream_closes_the_http_response():
+    transport, bodies = mock_transport()
+    backend = groq.AsyncGroq(api_key='test', base_url='http://groq.test',
+                             http_client=httpx.AsyncClient(transport=transport))
+
+    async def read_one_chunk():
+        stream = await AsyncResilientClient(backend, ResiliencePolicy(**UNLIMITED)).chat.completions.create(**REQUEST)
+        await stream.__anext__()
+        await stream.aclose()
+
+    asyncio.run(read_one_chunk())
+    assert bodies[0].closed
+
+
+def test_stopped_speculative_section_closes_the_http_response():
+    transport, bodies = mock_transport()
+    backend = groq.Groq(api_key='test', base_url='http://groq.test', http_client=httpx.Client(transport=transport))
+    bot = TravelPlannerBot(client=ResilientClient(backend, ResiliencePolicy(**UNLIMITED)))
+    stopped = threading.Event()
+    stopped.set()
+    assert bot.get_stoppable_response("Plan Lisbon", 'section', None, stopped) is None
+    assert bodies[0].closed
+
+
+class FailingModelBackend(FakeBackend):
+    """Answers instantly, except that every call to ``failing`` raises ``error``."""
+
+    def __init__(self, failing, error):
+        super().__init__(PROFILES['instant'])
+        self.failing = failing
+        self.error = error
+
+    def create(self, *, model, **kwargs):
+        if model == self.failing:
+            raise self.error
+        return super().create(model=model, **kwargs)
+
+
+def test_open_circuit_on_one_model_leaves_its_fallback_usable():
+    error = groq.InternalServerError("down", response=fake_response(500), body=None)
+    policy = ResiliencePolicy(max_retries=0, failure_threshold=1, **UNLIMITED)
+    bot = TravelPlannerBot(client=ResilientClient(FailingModelBackend(LARGE_MODEL, error), policy),
+                           router=ModelRouter())
+    for _ in range(3):
+        assert bot.get_model_response("Plan Lisbon", 'itinerary')
+    assert policy.breaker(LARGE_MODEL).opened_at is not None
+    assert policy.breaker(FAST_MODEL).opened_at is None
+
+
+def test_programming_errors_are_not_failed_over():
+    router = ModelRouter()
+    bot = TravelPlannerBot(client=ResilientClient(FailingModelBackend(LARGE_MODEL, TypeError("bug")),
+                                                  ResiliencePolicy(**UNLIMITED)),
+                           router=router)
+    with pytest.raises(TypeError):
+        bot.get_model_response("Plan Lisbon", 'itinerary')
+    assert router.snapshot() == {}
+
+
+class ScriptedBackend(FakeBackend):
+    """Answers instantly, or as scripted for the message sent: an error to
+    raise, or a pair of events to announce the call and wait on before answering."""
+
+    def __init__(self, script):
+        super().__init__(PROFILES['instant'])
+        self.script = script
+
+    def create(self, *, messages, **kwargs):
+        step = self.script.get(messages[-1]['content'])
+        if isinstance(step, list):
+            step = step.pop(0) if step else None
+        if isinstance(step, tuple):
+            started, proceed, step = step
+            started.set()
+            proceed.wait(5)
+        if isinstance(step, Exception):
+            raise step
+        return super().create(messages=messages, **kwargs)
+
+
+def ask(client, content):
+    return client.chat.completions.create(model=FAST_MODEL, messages=[{'role': 'user', 'content': content}],
+                                          max_tokens=100)
+
+
+def server_error():
+    return groq.InternalServerError("down", response=fake_response(500), body=None)
+
+
+def test_every_retry_waits_for_rate_limit_budget():
+    policy = ResiliencePolicy(requests_per_minute=60, tokens_per_minute=1e12, base_delay=0.0)
+    client = ResilientClient(ScriptedBackend({"Plan Lisbon": [server_error(), server_error()]}), policy)
+    ask(client, "Plan Lisbon")
+    assert policy.retries == 2
+    assert 2.9 < policy.requests.capacity - policy.requests.tokens <= 3
+
+
+def test_a_call_only_releases_the_half_open_trial_it_claimed():
+    policy = ResiliencePolicy(max_retries=0, failure_threshold=1, reset_timeout=0.0, **UNLIMITED)
+    a_started, a_proceed, b_started, b_proceed = (threading.Event() for _ in range(4))
+    rate_limited = groq.RateLimitError("slow down", response=fake_response(429), body=None)
+    client = ResilientClient(ScriptedBackend({"A": (a_started, a_proceed, rate_limited),
+                                              "B": (b_started, b_proceed, None)}), policy, coalesce=False)
+    errors = []
+
+    def call(content):
+        try:
+            ask(client, content)
+        except Exception as e:
+            errors.append(e)
+
+    a = threading.Thread(target=call, args=("A",))
+    a.start()
+    a_started.wait(5)
+    # Another call fails meanwhile and opens the circuit; B becomes its trial call
+    policy.breaker(FAST_MODEL).record_failure()
+    b = threading.Thread(target=call, args=("B",))
+    b.start()
+    b_started.wait(5)
+    a_proceed.set()
+    a.join(5)
+    assert isinstance(errors.pop(), RateLimitError)
+
+    with pytest.raises(CircuitOpenError):
+        ask(client, "C")
+    b_proceed.set()
+    b.join(5)
+    assert not errors
+    assert ask(client, "C")
+
+
+def test_token_bucket_queues_callers_beyond_its_capacity():
+    bucket = TokenBucket(per_minute=60)
+    assert bucket.reserve(60) == 0.0
+    assert 29.9 < bucket.reserve(30) <= 30
+    bucket.refund(30)
+    assert 0.9 < bucket.reserve(1) <= 1
+
+
+def test_settle_refunds_unused_tokens_and_charges_overruns():
+    # Refills 100 tokens a second, next to nothing over the test
+    policy = ResiliencePolicy(requests_per_minute=1e9, tokens_per_minute=6000)
+    policy.admission_delay(1000)
+    policy.settle(1000, 400)
+    assert 5600 <= policy.tokens.tokens < 5610
+    policy.admission_delay(1000)
+    policy.settle(1000, 1500)
+    assert 4100 <= policy.tokens.tokens < 4120
+
+
+def test_a_call_ends_up_charged_its_actual_usage():
+    policy = ResiliencePolicy(requests_per_minute=1e9, tokens_per_minute=6000)
+    used = usage_tokens(ask(ResilientClient(FakeBackend(PROFILES['instant']), policy), "Plan Lisbon"))
+    assert used
+    assert used - 10 < policy.tokens.capacity - policy.tokens.tokens <= used
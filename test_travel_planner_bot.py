@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+
+import pytest
+
+from relevance import OFF_TOPIC_REPLY
+from travel_planner_bot import TravelPlannerBot
+
+REPLY = "Day 1: Explore Alfama."
+ANSWERS = ["Hi!", "Ana", "ana@example.com", "Lisbon", "New York", "5", "3000", "June 2025"]
+
+
+class RecordingClient:
+    """Stands in for the Groq client and remembers every request it was sent."""
+
+    def __init__(self):
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        if kwargs.get('stream'):
+            return iter([SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=REPLY))])])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=REPLY))], usage=None)
+
+
+def test_canned_intake_makes_no_model_calls():
+    client = RecordingClient()
+    bot = TravelPlannerBot(client=client)
+    for answer in ANSWERS[:-1]:
+        bot.process_input(answer)
+        assert not bot.is_complete()
+    assert client.requests == []
+
+    bot.process_input(ANSWERS[-1])
+    assert bot.is_complete()
+    assert len(client.requests) == 1
+
+
+def planned_bot(client):
+    bot = TravelPlannerBot(client=client)
+    for answer in ANSWERS:
+        bot.process_input(answer)
+    return bot
+
+
+@pytest.mark.parametrize('message', ["make it more relaxed", "less walking please",
+                                     "I want to spend more time in Kyoto"])
+def test_change_requests_without_travel_words_are_on_topic(message):
+    assert planned_bot(RecordingClient()).process_input(message) != OFF_TOPIC_REPLY
+
+
+@pytest.mark.parametrize('message', ["thanks!", "tell me a joke about programmers"])
+def test_chit_chat_after_the_itinerary_is_off_topic(message):
+    client = RecordingClient()
+    bot = planned_bot(client)
+    assert bot.process_input(message) == OFF_TOPIC_REPLY
+    assert len(client.requests) == 1
+
+
+@pytest.mark.parametrize('message, destination, details', [
+    ("Tokyo for 10 days", "Tokyo", {'days': 10}),
+    ("Tokyo for 10 days in May 2025", "Tokyo", {'days': 10, 'dates': "May 2025"}),
+    ("Rio de Janeiro for two weeks", "Rio de Janeiro", {'days': 14}),
+])
+def test_destination_answer_keeps_the_duration_stated_with_it(message, destination, details):
+    bot = TravelPlannerBot(client=RecordingClient())
+    for answer in ANSWERS[:3]:
+        bot.process_input(answer)
+    bot.process_input(message)
+    assert bot.user_info['destination'] == destination
+    assert {field: bot.user_info[field] for field in details} == details
+    assert bot.conversation_state == 'source'
@@ -0,0 +1,79 @@
+import http.client
+import json
+import threading
+
+from llm_backends import PROFILES, FakeBackend
+from resilient_client import ResiliencePolicy, ResilientClient
+from session_store import SessionStore
+from travel_planner_server import TravelPlannerServer
+
+
+def start_server(store):
+    client = ResilientClient(FakeBackend(PROFILES['instant']),
+                             ResiliencePolicy(requests_per_minute=1e9, tokens_per_minute=1e12))
+    server = TravelPlannerServer(('127.0.0.1', 0), client, store)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_unread_post_body_does_not_corrupt_the_next_request():
+    server = start_server(SessionStore())
+    try:
+        connection = http.client.HTTPConnection(*server.server_address)
+        connection.request('POST', '/nowhere', body=json.dumps({'message': "hello"}),
+                           headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        response.read()
+        assert response.status == 404
+
+        connection.request('GET', '/health')
+        response = connection.getresponse()
+        assert response.status == 200
+        assert 'sessions' in json.loads(response.read())
+        connection.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_session_lock_is_created_by_get_and_goes_with_the_session():
+    store = SessionStore(max_sessions=1)
+    session = store.create()
+    assert session.lock is None
+    assert store.get(session.session_id).lock is not None
+    store.create()
+    assert store.get(session.session_id) is None
+
+
+def post_message(server, session_id, message, replies):
+    connection = http.client.HTTPConnection(*server.server_address, timeout=5)
+    connection.request('POST', f'/sessions/{session_id}/messages', body=json.dumps({'message': message}),
+                       headers={'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    replies.append((session_id, response.status, json.loads(response.read())))
+    connection.close()
+
+
+def test_requests_to_a_busy_session_wait_and_other_sessions_do_not():
+    store = SessionStore()
+    server = start_server(store)
+    try:
+        busy, other = store.create(), store.create()
+        replies = []
+        # Stands in for a long model call of an earlier request to ``busy``
+        held = store.get(busy.session_id).lock
+        held.acquire()
+        waiting = threading.Thread(target=post_message, args=(server, busy.session_id, "Hi!", replies))
+        waiting.start()
+        post_message(server, other.session_id, "Hi!", replies)
+        waiting.join(0.2)
+        assert [session_id for session_id, _, _ in replies] == [other.session_id]
+
+        held.release()
+        waiting.join(5)
+        assert [(session_id, status) for session_id, status, _ in replies] == [
+            (other.session_id, 200), (busy.session_id, 200)]
+        assert busy.conversation_state == other.conversation_state != 'init'
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -1,216 +1,654 @@
-import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from groq import Groq
+from client_registry import get_client
+from conversation_history import ConversationHistory, count_message_tokens, count_tokens
+from destination_facts import FactStore, Facts, asked_facts, default_store, fact_answer
+from follow_ups import (FollowUp, answer_prompt, classify_follow_up, replan_prompt, revision_prompt,
+                        revision_reply)
+from itinerary_cache import CachedItinerary, ItineraryCache
+from itinerary_document import ItineraryDocument
+from itinerary_sections import PROFILE, SectionPrompt, itinerary_prompt, section_prompts
+from itinerary_similarity import (Adaptation, SimilarItinerary, adapt, adaptation_request,
+                                  adaptation_targets)
+from metrics import record_cache_lookup, record_reuse, record_speculation, record_turn
+from model_router import ModelRouter, RoutedCall, default_router
+from prompt_templates import CALL_TYPES
+from relevance import OFF_TOPIC_REPLY, RelevanceFilter, default_filter
+from resilient_client import LLMError, ResilientClient, close_stream
+from slot_extractor import (SELF_EVIDENT, STATED_ALONGSIDE, describe_extracted, extract_slots, extraction_prompt,
+                            parse_extraction, strip_details)
+from slots import GREETING, SLOTS, SLOTS_BY_FIELD, Slot, fallback_prompt, is_valid_email
+from speculation import Speculation, StoppableCall
+from structured_itinerary import BudgetCheck, PlanRenderer, check_budget, structured_prompt
 
-class TravelPlannerBot:
-    def __init__(self, api_key: str):
-        self.client = Groq(api_key=api_key)
-        self.user_info = {
-            'name': None,
-            'email': None,
-            'destination': None,
-            'source': None,
-            'days': None,
-            'budget': None,
-            'dates': None
-        }
+# Output cap of rewritten itinerary parts; the router's 'section' cap is for whole sections
+REVISION_MAX_TOKENS = 800
+# Upper bound on prompt tokens per request: system prompt + history + prompt
+MAX_INPUT_TOKENS = 4096
+# Concurrent requests per itinerary in sectioned mode
+MAX_SECTION_WORKERS = 8
+
+
+class BaseTravelPlanner:
+    """Conversation state and slot-filling logic shared by the sync and async bots.
+
+    Subclasses only add the model I/O: ``get_model_response``,
+    ``get_next_question``, ``process_input`` and ``generate_itinerary``.
+    """
+
+    def __init__(self, cache: Optional[ItineraryCache] = None,
+                 history: Optional[ConversationHistory] = None,
+                 max_input_tokens: int = MAX_INPUT_TOKENS, sectioned: bool = False,
+                 llm_extraction: bool = False, speculative: bool = False,
+                 relevance: Optional[RelevanceFilter] = None, fact_store: Optional[FactStore] = None,
+                 structured: bool = False, router: Optional[ModelRouter] = None):
+        self.cache = cache
+        # Model, output cap and timeout of every call by its call type (see ``model_router``)
+        self.router = router or default_router()
+        # Generate the itinerary as concurrent per-section requests
+        self.sectioned = sectioned or speculative
+        # Ask for the itinerary as a JSON plan and render it locally (see ``structured_itinerary``);
+        # takes precedence over ``sectioned``
+        self.structured = structured
+        # Start sections during intake as soon as their prompt is final (see ``speculation``)
+        self.speculative = speculative
+        self.speculation: Optional[Speculation] = None
+        # Ask the model for slot values the rules in ``slot_extractor`` missed
+        self.llm_extraction = llm_extraction
+        # Follow-ups it rejects get ``OFF_TOPIC_REPLY`` without a model call
+        self.relevance = relevance or default_filter()
+        # Destination facts for the itinerary prompt and for factual follow-ups
+        self.fact_store = fact_store if fact_store is not None else default_store()
+        self.max_input_tokens = max_input_tokens
+        self.user_info = {slot.field: None for slot in SLOTS}
         self.conversation_state = 'init'
-        self.conversation_history = []
+        self.conversation_history = history if history is not None else ConversationHistory()
+        self.last_time_to_first_token: Optional[float] = None
+        # Fields the latest message filled in besides the one being asked for
+        self.last_extracted: Dict[str, object] = {}
+        # The delivered itinerary; later messages revise it part by part
+        self.itinerary: Optional[ItineraryDocument] = None
+        # The JSON plan it was rendered from, while it is unchanged
+        self.plan: Optional[Dict[str, Any]] = None
 
     def validate_email(self, email: str) -> bool:
-        pattern = r'^[\w\.-]+@[\w\.-]+\.\w+$'
-        return bool(re.match(pattern, email))
+        return is_valid_email(email)
+
+    def is_complete(self) -> bool:
+        return None not in self.user_info.values()
+
+    def _build_messages(self, prompt: str, call_type: str = 'chat') -> List[Dict[str, str]]:
+        """System prompt for ``call_type`` (see ``prompt_templates``), history, prompt."""
+        call = CALL_TYPES[call_type]
+        system = {
+            "role": "system",
+            "content": call.system
+        }
+        user = {
+            "role": "user",
+            "content": prompt
+        }
+        if not call.include_history:
+            return [system, user]
+        # Recent conversation fills whatever the input budget leaves over
+        history_budget = self.max_input_tokens - count_message_tokens([system, user])
+        return [system] + self.conversation_history.messages(history_budget) + [user]
+
+    def _route(self, call_type: str, stream: bool = False, max_tokens: Optional[int] = None) -> RoutedCall:
+        days = self.user_info['days']
+        return self.router.route(call_type, days if isinstance(days, int) else None, stream, max_tokens)
 
-    def get_model_response(self, prompt: str) -> str:
+    def _failover(self, call: RoutedCall, error: LLMError, seconds: float) -> RoutedCall:
+        """Report a failed call; the same call on the next model of its route, or raise ``error``."""
+        retry = self.router.fail(call, error, seconds)
+        if retry is None:
+            raise error
+        return retry
+
+    @contextmanager
+    def _observed_turn(self):
+        """Report the duration and outcome of one turn to ``metrics``."""
+        started = time.perf_counter()
+        follow_up = self.conversation_state == 'follow_up'
+        outcome = 'ok'
+        try:
+            yield
+        except GeneratorExit:
+            outcome = 'cancelled'
+            raise
+        except Exception:
+            outcome = 'error'
+            raise
+        finally:
+            if follow_up:
+                kind = 'follow_up'
+            else:
+                kind = 'itinerary' if self.is_complete() else 'intake'
+            record_turn(kind, outcome, time.perf_counter() - started)
+
+    def _record_exchange(self, user_input: str, reply: str):
+        self.conversation_history.add("user", user_input)
+        self.conversation_history.add("assistant", reply)
+
+    def _next_slot(self) -> Optional[Slot]:
+        """Point ``conversation_state`` at the first unanswered slot and return it."""
+        for slot in SLOTS:
+            if self.user_info[slot.field] is None:
+                self.conversation_state = slot.field
+                return slot
+        return None
+
+    def _apply_input(self, user_input: str, suggested: Optional[Dict[str, object]] = None) -> Optional[str]:
+        """Store every answer the message contains, or return a re-prompt.
+
+        A message answering the current question, possibly with
+        ``SELF_EVIDENT`` values and ``STATED_ALONGSIDE`` details besides
+        ("Tokyo for 10 days"), keeps those and leaves the rest of the
+        message to that slot's own parser, which falls back to an
+        extracted value only when it rejects the rest. Any other message
+        stating two or more answers besides the one asked for describes the
+        trip: every value found by ``extract_slots`` (or ``suggested`` by
+        the model) fills its unanswered slot. Otherwise only the
+        ``SELF_EVIDENT`` values are kept besides the answer.
+        """
+        found = {**(suggested or {}), **extract_slots(user_input)}
+        found = {field: value for field, value in found.items() if self.user_info[field] is None}
+        slot = SLOTS_BY_FIELD.get(self.conversation_state)
+        others = {field: value for field, value in found.items() if slot is None or field != slot.field}
+        kept = {field: value for field, value in others.items() if field in SELF_EVIDENT}
+        answer = user_input
+        for value in kept.values():
+            answer = answer.replace(str(value), " ")
+        details = {field: value for field, value in others.items() if field in STATED_ALONGSIDE}
+        rest = None
+        if details and len(kept) + len(details) == len(others):
+            # Whatever is left once the details are cut out answers the question
+            rest = strip_details(answer, details).strip(" ,;")
+        if slot is None or len(others) >= 2 and not rest:
+            self.last_extracted = found
+            self.user_info.update(found)
+            return None
+        if rest:
+            kept.update(details)
+            answer = rest
+        self.last_extracted = kept
+        self.user_info.update(kept)
         try:
-            system_prompt = """You are TravelGenie, an expert travel planning assistant with extensive knowledge of global destinations, travel logistics, and budget optimization. Your role is to create personalized, practical, and memorable travel experiences.
-
-CORE RESPONSIBILITIES:
-- Provide comprehensive travel planning assistance
-- Create detailed, day-by-day itineraries 
-- Offer budget-conscious recommendations
-- Share insider tips and local insights
-- Ensure all suggestions are practical and actionable
-
-PERSONALITY & TONE:
-- Enthusiastic and knowledgeable about travel
-- Professional yet friendly and approachable
-- Patient when gathering user information
-- Encouraging and inspiring about travel experiences
-- Clear and organized in communication
-
-EXPERTISE AREAS:
-- Flight booking strategies and timing
-- Accommodation recommendations (hotels, hostels, Airbnb, boutique stays)
-- Local transportation options and costs
-- Must-see attractions and hidden gems
-- Cultural experiences and local customs
-- Food recommendations and dining budgets
-- Safety tips and travel advisories
-- Visa requirements and travel documentation
-- Weather considerations and packing suggestions
-- Budget optimization and money-saving tips
-
-RESPONSE GUIDELINES:
-1. Always stay focused on travel-related topics
-2. If asked about non-travel topics, politely redirect: "I specialize in travel planning! Let's get back to creating your amazing trip. What would you like to know about your travel plans?"
-3. Provide specific, actionable recommendations with estimated costs when possible
-4. Include both popular attractions and off-the-beaten-path experiences
-5. Consider different travel styles (luxury, mid-range, budget, backpacking)
-6. Mention seasonal considerations and best times to visit
-7. Include practical logistics like transportation between locations
-8. Suggest realistic daily schedules that aren't overpacked
-
-ITINERARY STRUCTURE:
-When creating full itineraries, include:
-- Executive summary of the trip
-- Pre-trip checklist (documents, vaccinations, etc.)
-- Day-by-day detailed schedule with timings
-- Transportation details and costs
-- Accommodation recommendations with price ranges
-- Restaurant and food recommendations
-- Cultural etiquette and local customs
-- Emergency contacts and important phrases
-- Budget breakdown by category
-- Packing suggestions based on weather/activities
-
-BUDGET CONSIDERATIONS:
-- Always work within the specified budget
-- Provide options at different price points when possible
-- Include hidden costs (tips, taxes, entrance fees)
-- Suggest money-saving strategies
-- Recommend budget tracking methods
-
-Remember: You are creating experiences, not just trips. Focus on what makes each destination special and how the traveler can best experience the local culture and attractions within their constraints."""
-            
-            chat_completion = self.client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": system_prompt
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                model="llama-3.1-8b-instant",
-                temperature=0.7,
-                max_tokens=2048
-            )
+            self.user_info[slot.field] = slot.parse(answer.strip(" ,;") or user_input)
+        except ValueError as e:
+            if slot.field not in found:
+                return str(e)
+            self.user_info[slot.field] = self.last_extracted[slot.field] = found[slot.field]
+        return None
+
+    def _wants_model_extraction(self, user_input: str) -> bool:
+        """Whether a long message left the rules with little to go on."""
+        if not self.llm_extraction or self.is_complete() or len(user_input.split()) < 8:
+            return False
+        return len(extract_slots(user_input)) < 2
+
+    def _extraction_prompt(self, user_input: str) -> str:
+        missing = [slot.field for slot in SLOTS if self.user_info[slot.field] is None]
+        return extraction_prompt(user_input, missing)
+
+    def _acknowledgement(self) -> str:
+        """Confirm what one message filled in when it answered several questions."""
+        if len(self.last_extracted) < 2 or self.is_complete():
+            return ""
+        return describe_extracted(self.last_extracted) + " "
+
+    def _output_mode(self) -> str:
+        """How itineraries are generated: cached ones only answer lookups of the same mode."""
+        return 'structured' if self.structured else 'sectioned' if self.sectioned else 'prose'
+
+    def _look_up(self) -> Tuple[Optional[CachedItinerary], Optional[SimilarItinerary]]:
+        """The itinerary stored for this exact profile, else the most similar stored one.
+
+        Blocking (the cache may be on disk), so the async bot runs it in a thread.
+        """
+        if self.cache is None:
+            return None, None
+        mode = self._output_mode()
+        itinerary = self.cache.get(self.user_info, mode)
+        record_cache_lookup(itinerary is not None)
+        return itinerary, self.cache.similar(self.user_info, mode) if itinerary is None else None
+
+    def _cached_itinerary(self, itinerary: Optional[CachedItinerary],
+                          similar: Optional[SimilarItinerary]) -> Optional[CachedItinerary]:
+        """The itinerary to serve as is, from the results of ``_look_up``."""
+        if itinerary is None and similar is not None and similar.reusable:
+            itinerary = CachedItinerary(similar.text, similar.plan)
+            record_reuse('reused', self._generation_tokens(itinerary.text))
+        if itinerary is not None:
+            self.cancel_speculation('cache_hit')
+        return itinerary
+
+    def _adaptation(self, similar: Optional[SimilarItinerary]) -> Optional[Adaptation]:
+        """Revision prompts that turn a similar stored itinerary into this traveler's.
+
+        Only consulted after ``_cached_itinerary`` missed; None when nothing
+        is close enough or the parts to rewrite cannot be found. A structured
+        itinerary is never adapted: rewriting its text would leave its plan stale.
+        """
+        if similar is None or similar.reusable or self.structured:
+            return None
+        document = ItineraryDocument.parse(similar.text)
+        targets = adaptation_targets(document, similar.changed)
+        if not targets:
+            return None
+        request = adaptation_request(similar.profile, self.user_info, similar.changed)
+        profile = PROFILE.render(self.user_info)
+        self.cancel_speculation('cache_hit')
+        return Adaptation(document, targets, [revision_prompt(document, key, request, profile) for key in targets])
+
+    def _adapted_itinerary(self, adaptation: Adaptation, texts: List[str]) -> str:
+        source_tokens = self._generation_tokens(adaptation.document.render())
+        itinerary = adapt(adaptation, texts)
+        spent = sum(count_message_tokens(self._build_messages(prompt, 'section')) for prompt in adaptation.prompts)
+        spent += sum(count_tokens(text) for text in texts)
+        record_reuse('adapted', max(source_tokens - spent, 0))
+        return itinerary
+
+    def _generation_tokens(self, itinerary: str) -> int:
+        """Estimated input and output tokens of generating ``itinerary`` from scratch."""
+        messages = self._build_messages(self._build_itinerary_prompt(),
+                                        'structured' if self.structured else 'itinerary')
+        return count_message_tokens(messages) + count_tokens(itinerary)
+
+    def _remember_itinerary(self, itinerary: str, plan: Optional[Dict[str, Any]] = None):
+        if self.cache is not None:
+            self.cache.put(self.user_info, itinerary, self._output_mode(), plan)
+        self._keep_itinerary(itinerary, plan)
+
+    def _keep_itinerary(self, itinerary: str, plan: Optional[Dict[str, Any]] = None):
+        """Hold on to the delivered itinerary and switch to follow-up mode."""
+        self.itinerary = ItineraryDocument.parse(itinerary)
+        self.plan = plan
+        self.conversation_state = 'follow_up'
+
+    def _plan_renderer(self) -> Optional[PlanRenderer]:
+        """A renderer for the next itinerary in structured mode, None otherwise."""
+        return PlanRenderer(self.user_info['budget']) if self.structured else None
+
+    def budget_check(self) -> Optional[BudgetCheck]:
+        """The structured itinerary's budget breakdown against the traveler's budget."""
+        return check_budget(self.plan, self.user_info['budget']) if self.plan is not None else None
+
+    def _plan_follow_up(self, user_input: str) -> FollowUp:
+        """Classify a message sent after the itinerary; new trip details go into the profile."""
+        plan = classify_follow_up(user_input, self.itinerary, self.user_info)
+        named = self.fact_store.find(user_input) if self.fact_store is not None else None
+        # Changes and messages about parts of the itinerary are on topic whatever their words
+        if (plan.kind == 'question' and not plan.targets and named is None
+                and not self.relevance.is_relevant(user_input)):
+            return FollowUp('off_topic', answer=OFF_TOPIC_REPLY)
+        if plan.kind == 'profile':
+            self.user_info.update(plan.changes)
+        elif plan.kind == 'question':
+            fields = asked_facts(user_input)
+            facts = named or self._destination_facts()
+            if fields and facts is not None:
+                return FollowUp('fact', answer=fact_answer(facts, fields))
+        return plan
+
+    def _destination_facts(self) -> Optional[Facts]:
+        if self.fact_store is None or self.user_info['destination'] is None:
+            return None
+        return self.fact_store.find(str(self.user_info['destination']))
+
+    def _answer_prompt(self, user_input: str, plan: FollowUp) -> str:
+        return answer_prompt(self.itinerary, plan.targets, user_input, PROFILE.render(self.user_info))
+
+    def _revision_prompts(self, user_input: str, plan: FollowUp) -> List[str]:
+        profile = PROFILE.render(self.user_info)
+        return [revision_prompt(self.itinerary, key, user_input, profile) for key in plan.targets]
+
+    def _apply_revisions(self, plan: FollowUp, texts: List[str]) -> str:
+        """Splice rewritten parts into the itinerary and describe the change."""
+        for key, text in zip(plan.targets, texts):
+            self.itinerary.replace(key, text)
+        # The text no longer matches the JSON plan
+        self.plan = None
+        return revision_reply(self.itinerary, plan.targets)
+
+    def _replan_prompt(self, user_input: str) -> str:
+        return replan_prompt(self._build_itinerary_prompt(), user_input)
+
+    def _build_itinerary_prompt(self) -> str:
+        if self.structured:
+            return structured_prompt(self.user_info, self._destination_facts())
+        return itinerary_prompt(self.user_info, self._destination_facts())
+
+    def _speculative_parts(self) -> List[SectionPrompt]:
+        """Sections whose prompts can already be sent while intake continues."""
+        if not self.speculative or self.structured or self.is_complete():
+            return []
+        if self.speculation is None:
+            self.speculation = Speculation()
+        return section_prompts(self.user_info, facts=self._destination_facts())
+
+    def _take_speculative(self, prompt: str):
+        return self.speculation.take(prompt) if self.speculation is not None else None
+
+    def cancel_speculation(self, outcome: str = 'cancelled'):
+        """Drop sections generated ahead of time that will not be used."""
+        if self.speculation is not None:
+            self.speculation.cancel(outcome)
+
+
+class TravelPlannerBot(BaseTravelPlanner):
+    def __init__(self, api_key: Optional[str] = None, client: Optional[Groq] = None,
+                 cache: Optional[ItineraryCache] = None,
+                 history: Optional[ConversationHistory] = None, sectioned: bool = False,
+                 llm_extraction: bool = False, speculative: bool = False,
+                 relevance: Optional[RelevanceFilter] = None, fact_store: Optional[FactStore] = None,
+                 structured: bool = False, router: Optional[ModelRouter] = None):
+        super().__init__(cache, history, sectioned=sectioned, llm_extraction=llm_extraction,
+                         speculative=speculative, relevance=relevance, fact_store=fact_store,
+                         structured=structured, router=router)
+        # Without an explicit ``client``, borrow the process-wide pooled one
+        if client is None:
+            client = get_client(api_key)
+        self.client = client if isinstance(client, ResilientClient) else ResilientClient(client)
+
+    def get_model_response(self, prompt: str, call_type: str = 'chat', max_tokens: Optional[int] = None) -> str:
+        """Return the model's answer; failures raise ``LLMError``.
+
+        The router picks the model, output cap (unless ``max_tokens`` is
+        given) and timeout for ``call_type``; a failed call is retried on the
+        route's fallback models.
+        """
+        messages = self._build_messages(prompt, call_type)
+        call = self._route(call_type, max_tokens=max_tokens)
+        while True:
+            started = time.perf_counter()
+            try:
+                chat_completion = self.client.chat.completions.create(messages=messages, **call.options())
+            except LLMError as e:
+                call = self._failover(call, e, time.perf_counter() - started)
+                continue
+            self.router.record(call, time.perf_counter() - started)
             return chat_completion.choices[0].message.content
-        except Exception as e:
-            return f"Error generating response: {str(e)}"
+
+    def stream_model_response(self, prompt: str, call_type: str = 'chat',
+                              max_tokens: Optional[int] = None) -> Iterator[str]:
+        """Yield the model response chunk by chunk as it is generated.
+
+        The delay until the first non-empty chunk is stored in
+        ``last_time_to_first_token`` (seconds). A call that fails before
+        its first chunk is retried on the route's fallback models.
+        """
+        started = time.perf_counter()
+        for content in self._stream_response(prompt, call_type, max_tokens):
+            if self.last_time_to_first_token is None:
+                self.last_time_to_first_token = time.perf_counter() - started
+            yield content
+
+    def _stream_response(self, prompt: str, call_type: str,
+                         max_tokens: Optional[int] = None) -> Iterator[str]:
+        messages = self._build_messages(prompt, call_type)
+        call = self._route(call_type, stream=True, max_tokens=max_tokens)
+        while True:
+            attempt = time.perf_counter()
+            first_token = None
+            try:
+                stream = self.client.chat.completions.create(messages=messages, **call.options())
+                try:
+                    for chunk in stream:
+                        if not chunk.choices:
+                            continue
+                        content = chunk.choices[0].delta.content
+                        if not content:
+                            continue
+                        if first_token is None:
+                            first_token = time.perf_counter() - attempt
+                            self.router.record(call, first_token)
+                        yield content
+                finally:
+                    close_stream(stream)
+            except LLMError as e:
+                if first_token is not None:
+                    raise
+                call = self._failover(call, e, time.perf_counter() - attempt)
+                continue
+            if first_token is None:
+                self.router.record(call, time.perf_counter() - attempt)
+            return
+
+    def get_stoppable_response(self, prompt: str, call_type: str, max_tokens: Optional[int],
+                               stopped: threading.Event) -> Optional[str]:
+        """The model response, streamed so the call can be abandoned between
+        chunks once ``stopped`` is set (then None)."""
+        chunks = []
+        stream = self._stream_response(prompt, call_type, max_tokens)
+        try:
+            for chunk in stream:
+                if stopped.is_set():
+                    return None
+                chunks.append(chunk)
+        finally:
+            # Closes the provider's response too, so generation stops being billed
+            stream.close()
+        return "".join(chunks)
+
+    def stream_plan(self, prompt: str, renderer: PlanRenderer) -> Iterator[str]:
+        """Stream the itinerary as a JSON plan, yielding each part as text once it is complete."""
+        for chunk in self.stream_model_response(prompt, 'structured'):
+            text = renderer.feed(chunk)
+            if text:
+                yield text
+        rest = renderer.close()
+        if rest:
+            yield rest
+
+    def _extract_with_model(self, user_input: str) -> Optional[Dict[str, object]]:
+        """Slot values from one structured model call, when the rules found too little."""
+        if not self._wants_model_extraction(user_input):
+            return None
+        try:
+            return parse_extraction(self.get_model_response(self._extraction_prompt(user_input), 'extract'))
+        except LLMError:
+            # Best effort: the message still counts as the current answer
+            return None
+
+    def _speculate(self):
+        """Start the sections the profile already supports on the shared background pool."""
+        for part in self._speculative_parts():
+            self.speculation.start(part.prompt, lambda prompt: StoppableCall(
+                self.get_stoppable_response, prompt, 'section', part.max_tokens
+            ))
 
     def get_next_question(self) -> str:
         if self.conversation_state == 'init':
             self.conversation_state = 'name'
-            return "Hello! I'm TravelGenie, your personal travel planning assistant! 🌍✈️ I'm here to help you create an amazing, personalized travel experience. To get started, what's your name?"
-        
-        questions = {
-            'email': "Perfect! To send you your complete travel itinerary and any updates, I'll need your email address. What's your email?",
-            'destination': "Exciting! Where would you like to go? You can tell me a specific city, country, or even describe the type of experience you're looking for (like 'tropical beach destination' or 'European cultural cities').",
-            'source': "Great choice! From which city or airport will you be departing for this adventure?",
-            'days': "How many days do you have for this trip? Please enter a number between 1-30 days. (This helps me pace your itinerary perfectly!)",
-            'budget': "What's your total budget for this trip in USD? Include everything - flights, accommodation, food, activities, and shopping. Don't worry, I'll help you make every dollar count!",
-            'dates': "When are you planning to travel? Please let me know the month and year (like 'March 2024' or 'Summer 2024'). This helps me suggest the best activities and prepare you for the weather!"
-        }
-        
-        for field, value in self.user_info.items():
-            if value is None:
-                self.conversation_state = field
-                return questions.get(field, self.get_model_response(f"Ask for {field} in a friendly, travel-focused way"))
-        
-        return self.generate_itinerary()
+            if not any(self.user_info.values()):
+                return GREETING
+
+        slot = self._next_slot()
+        if slot is None:
+            return self.generate_itinerary()
+        if slot.question is not None:
+            return slot.question
+        # Only slots without a canned question cost a model call
+        return self.get_model_response(fallback_prompt(slot.field), 'slot')
 
     def process_input(self, user_input: str) -> str:
-        self.conversation_history.append({"role": "user", "content": user_input})
-
-        # Process user input based on current state
-        if self.conversation_state == 'name' and self.user_info['name'] is None:
-            self.user_info['name'] = user_input.strip()
-        elif self.conversation_state == 'email':
-            if self.validate_email(user_input.strip()):
-                self.user_info['email'] = user_input.strip()
+        with self._observed_turn():
+            if self.conversation_state == 'follow_up':
+                reply = "".join(self._follow_up(user_input))
             else:
-                return "I need a valid email address to send your itinerary. Please provide an email in the format: example@email.com"
-        elif self.conversation_state == 'days':
-            try:
-                days = int(user_input.strip())
-                if 1 <= days <= 30:
-                    self.user_info['days'] = days
-                else:
-                    return "Please enter a number of days between 1 and 30. This helps me create the perfect itinerary length for you!"
-            except ValueError:
-                return "Please enter a valid number (like 5 or 10) for the number of days you'd like to travel."
+                reply = self._apply_input(user_input, self._extract_with_model(user_input))
+                self._speculate()
+                if reply is None:
+                    reply = self._acknowledgement() + self.get_next_question()
+        self._record_exchange(user_input, reply)
+        return reply
+
+    def process_input_stream(self, user_input: str) -> Iterator[str]:
+        """Streaming variant of ``process_input``.
+
+        Canned replies are yielded as a single chunk; the itinerary is
+        yielded piece by piece as the model produces it.
+        """
+        self.last_time_to_first_token = None
+        reply = []
+        with self._observed_turn():
+            for chunk in self._stream_reply(user_input):
+                reply.append(chunk)
+                yield chunk
+        self._record_exchange(user_input, "".join(reply))
+
+    def _stream_reply(self, user_input: str) -> Iterator[str]:
+        if self.conversation_state == 'follow_up':
+            yield from self._follow_up(user_input)
+            return
+        error = self._apply_input(user_input, self._extract_with_model(user_input))
+        self._speculate()
+        if error is not None:
+            yield error
+        elif not self.is_complete():
+            yield self._acknowledgement() + self.get_next_question()
         else:
-            self.user_info[self.conversation_state] = user_input.strip()
+            yield from self.generate_itinerary_stream()
+
+    def _follow_up(self, user_input: str) -> Iterator[str]:
+        """Answer or apply a message about the delivered itinerary.
+
+        Questions get a short answer and change requests rewrite only the
+        days or sections they name; new trip details or a change to the
+        whole trip regenerate the itinerary. Messages that are not about
+        travel are turned away, and simple factual questions answered from
+        ``destination_facts``, before any model call.
+        """
+        plan = self._plan_follow_up(user_input)
+        if plan.answer is not None:
+            yield plan.answer
+        elif plan.kind == 'question':
+            yield from self.stream_model_response(self._answer_prompt(user_input, plan), 'follow_up')
+        elif plan.kind == 'revise':
+            yield self._apply_revisions(plan, self._revise(self._revision_prompts(user_input, plan)))
+        elif plan.kind == 'profile':
+            yield from self.generate_itinerary_stream()
+        else:
+            renderer = self._plan_renderer()
+            if renderer is not None:
+                source = self.stream_plan(self._replan_prompt(user_input), renderer)
+            else:
+                source = self.stream_model_response(self._replan_prompt(user_input), 'itinerary')
+            chunks = []
+            for chunk in source:
+                chunks.append(chunk)
+                yield chunk
+            self._keep_itinerary("".join(chunks), renderer.plan if renderer is not None else None)
 
-        return self.get_next_question()
+    def _revise(self, prompts: List[str]) -> List[str]:
+        """Rewritten itinerary parts, one concurrent request per revision prompt."""
+        with ThreadPoolExecutor(max_workers=min(len(prompts), MAX_SECTION_WORKERS)) as executor:
+            return list(executor.map(
+                lambda prompt: self.get_model_response(prompt, 'section', REVISION_MAX_TOKENS), prompts))
 
     def generate_itinerary(self) -> str:
-        if None in self.user_info.values():
+        if not self.is_complete():
             return self.get_next_question()
 
-        prompt = f"""
-Create a comprehensive, personalized travel itinerary for:
-
-TRAVELER PROFILE:
-- Name: {self.user_info['name']}
-- Departing from: {self.user_info['source']}
-- Destination: {self.user_info['destination']}
-- Trip duration: {self.user_info['days']} days
-- Total budget: ${self.user_info['budget']} USD
-- Travel dates: {self.user_info['dates']}
-
-REQUIREMENTS:
-Please create a detailed itinerary that includes:
-
-1. TRIP OVERVIEW & HIGHLIGHTS
-   - Brief destination overview and what makes it special
-   - Top 3-5 must-do experiences for this trip
-   - Best aspects of traveling during {self.user_info['dates']}
-
-2. FLIGHT RECOMMENDATIONS
-   - Suggested flight routes and airlines
-   - Estimated flight costs
-   - Best booking timing and tips
-
-3. ACCOMMODATION STRATEGY
-   - 2-3 accommodation options within budget
-   - Recommended neighborhoods/areas to stay
-   - Estimated nightly rates
-
-4. DETAILED DAY-BY-DAY ITINERARY
-   - Specific activities with timing (morning, afternoon, evening)
-   - Transportation between locations
-   - Estimated costs for each activity
-   - Restaurant recommendations for each day
-   - Cultural tips and local etiquette
-
-5. COMPREHENSIVE BUDGET BREAKDOWN
-   - Flights: $X
-   - Accommodation: $X (per night × {self.user_info['days']} nights)
-   - Food: $X (breakdown by meal type)
-   - Activities/Attractions: $X
-   - Local transportation: $X
-   - Shopping/Miscellaneous: $X
-   - TOTAL: Should not exceed ${self.user_info['budget']}
-
-6. PRACTICAL TRAVEL TIPS
-   - Weather expectations and packing suggestions
-   - Currency and payment methods
-   - Important local customs
-   - Safety considerations
-   - Essential phrases in local language
-   - Emergency contacts and embassy information
-
-7. MONEY-SAVING TIPS
-   - How to stretch the budget further
-   - Free activities and experiences
-   - Local alternatives to tourist traps
-
-Make this itinerary exciting, practical, and perfectly tailored to {self.user_info['name']}'s {self.user_info['days']}-day adventure in {self.user_info['destination']}!
-"""
-        return self.get_model_response(prompt)
+        stored, similar = self._look_up()
+        cached = self._cached_itinerary(stored, similar)
+        if cached is not None:
+            self._keep_itinerary(cached.text, cached.plan)
+            return cached.text
+        adaptation = self._adaptation(similar)
+        renderer = None
+        if adaptation is not None:
+            itinerary = self._adapted_itinerary(adaptation, self._revise(adaptation.prompts))
+        elif self.structured:
+            renderer = self._plan_renderer()
+            itinerary = renderer.feed(self.get_model_response(self._build_itinerary_prompt(), 'structured'))
+            itinerary += renderer.close()
+        elif self.sectioned:
+            itinerary = "".join(self.generate_sections())
+        else:
+            itinerary = self.get_model_response(self._build_itinerary_prompt(), 'itinerary')
+        self._remember_itinerary(itinerary, renderer.plan if renderer is not None else None)
+        return itinerary
+
+    def generate_itinerary_stream(self) -> Iterator[str]:
+        if not self.is_complete():
+            yield self.get_next_question()
+            return
+
+        stored, similar = self._look_up()
+        cached = self._cached_itinerary(stored, similar)
+        if cached is not None:
+            self._keep_itinerary(cached.text, cached.plan)
+            yield cached.text
+            return
+        adaptation = self._adaptation(similar)
+        if adaptation is not None:
+            itinerary = self._adapted_itinerary(adaptation, self._revise(adaptation.prompts))
+            self._remember_itinerary(itinerary)
+            yield itinerary
+            return
+        renderer = self._plan_renderer()
+        if renderer is not None:
+            source = self.stream_plan(self._build_itinerary_prompt(), renderer)
+        elif self.sectioned:
+            source = self.generate_sections()
+        else:
+            source = self.stream_model_response(self._build_itinerary_prompt(), 'itinerary')
+        chunks = []
+        for chunk in source:
+            chunks.append(chunk)
+            yield chunk
+        self._remember_itinerary("".join(chunks), renderer.plan if renderer is not None else None)
+
+    def generate_sections(self) -> Iterator[str]:
+        """Generate the itinerary as concurrent per-section requests.
+
+        Sections are yielded in itinerary order, each as soon as it and every
+        section before it have finished, so wall-clock time approaches that of
+        the slowest section. Sections already started by ``speculative``
+        mode are picked up instead of being requested again.
+        """
+        started = time.perf_counter()
+        parts = section_prompts(self.user_info, facts=self._destination_facts())
+        executor = ThreadPoolExecutor(max_workers=min(len(parts), MAX_SECTION_WORKERS))
+        futures = []
+        speculative = set()
+        try:
+            for part in parts:
+                future = self._take_speculative(part.prompt)
+                if future is None:
+                    future = executor.submit(self.get_model_response, part.prompt, 'section', part.max_tokens)
+                else:
+                    speculative.add(future)
+                futures.append(future)
+            # Anything left was started for prompts the final profile no longer produces
+            self.cancel_speculation('stale')
+            for index, (part, future) in enumerate(zip(parts, futures)):
+                try:
+                    text = future.result()
+                except LLMError:
+                    if future not in speculative:
+                        raise
+                    speculative.discard(future)
+                    record_speculation('failed')
+                    text = self.get_model_response(part.prompt, 'section', part.max_tokens)
+                else:
+                    if future in speculative:
+                        speculative.discard(future)
+                        record_speculation('used')
+                if self.last_time_to_first_token is None:
+                    self.last_time_to_first_token = time.perf_counter() - started
+                yield ("\n\n" if index else "") + f"{part.heading}\n{text.strip()}"
+        finally:
+            for future in futures:
+                future.cancel()
+            if speculative:
+                # The itinerary was abandoned before these were needed
+                record_speculation('cancelled', len(speculative))
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -1,13 +1,27 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox, filedialog
+import argparse
 import os
 import re
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
+from client_registry import get_client, requires_api_key
+from itinerary_cache import ItineraryCache
+from resilient_client import LLMError, REQUESTS_PER_MINUTE, ResiliencePolicy, TOKENS_PER_MINUTE, describe_error
+from structured_itinerary import export_itinerary
 from travel_planner_bot import TravelPlannerBot
 
+# Result queue poll interval: ~60 frames per second
+POLL_INTERVAL_MS = 16
+# Upper bound on queued results handled per frame so a burst can't stall the UI
+MAX_RESULTS_PER_POLL = 200
+
+
 class TravelPlannerGUI:
-    def __init__(self, root):
+    def __init__(self, root, policy=None):
         self.root = root
         self.root.title("🌍 TravelGenie - AI Travel Planner")
         self.root.geometry("1000x700")
@@ -20,33 +34,42 @@ class TravelPlannerGUI:
         load_dotenv()
         api_key = os.getenv("GROQ_API_KEY")
         
-        if not api_key:
+        if not api_key and requires_api_key():
             messagebox.showerror("API Key Error", 
                                "GROQ_API_KEY not found in environment variables.\n"
-                               "Please add your API key to a .env file.")
+                               "Please add your API key to a .env file,\n"
+                               "or set TRAVEL_PLANNER_BACKEND=fake to run offline.")
             return
             
-        self.bot = TravelPlannerBot(api_key)
-        
-        # Enhanced travel-related keywords for better filtering
-        self.travel_keywords = [
-            'travel', 'trip', 'vacation', 'holiday', 'flight', 'hotel', 'destination',
-            'booking', 'stay', 'tour', 'visit', 'journey', 'itinerary', 'budget',
-            'accommodation', 'restaurant', 'attractions', 'activities', 'sightseeing',
-            'tourism', 'explore', 'adventure', 'backpack', 'cruise', 'resort',
-            'airport', 'visa', 'passport', 'currency', 'weather', 'climate',
-            'culture', 'museum', 'beach', 'mountain', 'city', 'country'
-        ]
-
+        # Shared across "Start New Trip" so repeated profiles skip the model
+        self.itinerary_cache = ItineraryCache(path=os.getenv("ITINERARY_CACHE_PATH"))
+        self.sectioned_var = tk.BooleanVar(value=False)
+        self.structured_var = tk.BooleanVar(value=False)
+        # Every trip of this window shares one rate-limited client
+        self.client = get_client(api_key, policy=policy)
+        self.bot = TravelPlannerBot(client=self.client, cache=self.itinerary_cache)
+        
         # Track conversation progress
         self.progress_steps = ['name', 'email', 'destination', 'source', 'days', 'budget', 'dates']
         self.current_step = 0
 
+        # Bot calls run on worker threads; their output comes back through
+        # ``results`` and is drained by ``poll_results`` on the Tk loop.
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="travelgenie")
+        self.results = queue.Queue()
+        self.bot_lock = threading.Lock()
+        self.request_id = 0
+        self.cancel_event = None
+        self.generating = False
+        self.generating_frame = 0
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
         # Create GUI elements
         self.create_widgets()
         
         # Start conversation
         self.display_bot_message(self.bot.get_next_question())
+        self.root.after(POLL_INTERVAL_MS, self.poll_results)
 
     def setup_styles(self):
         """Configure custom styles for the application"""
@@ -193,6 +216,15 @@ find the best flights and accommodations, and provide local insights - all withi
         )
         self.send_button.pack(side=tk.RIGHT)
         
+        # Cancel button, only active while a response is being generated
+        self.cancel_button = ttk.Button(
+            input_container,
+            text="⏹ Cancel",
+            command=self.cancel_request,
+            state='disabled'
+        )
+        self.cancel_button.pack(side=tk.RIGHT, padx=(0, 5))
+        
         # Bind Enter key
         self.user_input.bind("<Return>", lambda e: self.process_input())
         
@@ -235,6 +267,32 @@ find the best flights and accommodations, and provide local insights - all withi
         )
         restart_button.pack(side=tk.LEFT, padx=(0, 5))
         
+        # Export itinerary button
+        export_button = ttk.Button(
+            button_frame,
+            text="📤 Export Itinerary",
+            command=self.export_itinerary
+        )
+        export_button.pack(side=tk.LEFT, padx=(0, 5))
+        
+        # Parallel section generation toggle
+        sectioned_check = ttk.Checkbutton(
+            button_frame,
+            text="⚡ Generate sections in parallel",
+            variable=self.sectioned_var,
+            command=self.toggle_sectioned
+        )
+        sectioned_check.pack(side=tk.LEFT, padx=(10, 5))
+        
+        # Structured (JSON) itinerary toggle
+        structured_check = ttk.Checkbutton(
+            button_frame,
+            text="🧾 Compact JSON itinerary",
+            variable=self.structured_var,
+            command=self.toggle_structured
+        )
+        structured_check.pack(side=tk.LEFT, padx=(5, 5))
+        
         # Help button
         help_button = ttk.Button(
             button_frame,
@@ -243,6 +301,14 @@ find the best flights and accommodations, and provide local insights - all withi
         )
         help_button.pack(side=tk.RIGHT)
 
+    def toggle_sectioned(self):
+        """Switch the bot between single-request and per-section itineraries"""
+        self.bot.sectioned = self.sectioned_var.get()
+
+    def toggle_structured(self):
+        """Switch the bot between prose itineraries and JSON plans rendered locally"""
+        self.bot.structured = self.structured_var.get()
+
     def update_progress(self):
         """Update the progress bar and labels"""
         if self.bot.conversation_state in self.progress_steps:
@@ -257,6 +323,8 @@ find the best flights and accommodations, and provide local insights - all withi
         if self.current_step < len(self.progress_steps):
             step_name = self.progress_steps[self.current_step].replace('_', ' ').title()
             self.progress_label.config(text=f"Step {self.current_step + 1}/{len(self.progress_steps)}: {step_name}")
+        elif self.bot.conversation_state == 'follow_up':
+            self.progress_label.config(text="✅ Itinerary Ready - Ask Questions or Request Changes")
         else:
             self.progress_label.config(text="✅ Information Complete - Generating Itinerary!")
         
@@ -282,20 +350,43 @@ find the best flights and accommodations, and provide local insights - all withi
 
     def is_travel_related(self, message):
         """Enhanced travel-related message detection"""
-        message = message.lower()
-        
         # Always allow during info gathering phase
         if self.bot.conversation_state in ['name', 'email', 'destination', 'source', 'days', 'budget', 'dates']:
             return True
         
-        # Check for travel keywords
-        return any(keyword in message for keyword in self.travel_keywords)
+        # Whole words and their inflections from the shared keyword file (see ``relevance``)
+        return self.bot.relevance.is_relevant(message)
 
     def display_bot_message(self, message):
-        """Display bot message with enhanced formatting"""
+        """Display bot message with enhanced formatting.
+
+        ``message`` may be a string or an iterable of streamed chunks, which
+        are appended to the chat as they arrive.
+        """
+        self.begin_bot_message()
+        if isinstance(message, str):
+            self.append_bot_chunk(message)
+        else:
+            for chunk in message:
+                self.append_bot_chunk(chunk)
+                self.root.update_idletasks()
+        self.finish_bot_message()
+
+    def begin_bot_message(self):
+        """Write the header of a bot message that will be filled in by chunks"""
         timestamp = datetime.now().strftime("%H:%M")
         self.chat_display.insert(tk.END, f"🤖 TravelGenie [{timestamp}]:\n", "system")
-        self.chat_display.insert(tk.END, f"{message}\n\n", "bot")
+
+    def append_bot_chunk(self, chunk):
+        """Append streamed text to the current bot message"""
+        self.chat_display.insert(tk.END, chunk, "bot")
+        self.chat_display.see(tk.END)
+
+    def finish_bot_message(self, time_to_first_token=None):
+        """Close the current bot message and refresh the progress display"""
+        self.chat_display.insert(tk.END, "\n\n", "bot")
+        if time_to_first_token is not None:
+            self.chat_display.insert(tk.END, f"⏱️ First token after {time_to_first_token:.2f}s\n\n", "system")
         self.chat_display.see(tk.END)
         self.update_progress()
 
@@ -332,27 +423,97 @@ find the best flights and accommodations, and provide local insights - all withi
         self.display_user_message(user_message)
         self.user_input.delete(0, tk.END)
         
-        # Disable input while processing
-        self.send_button.config(state='disabled', text='Processing...')
-        self.user_input.config(state='disabled')
-        
-        # Process in a separate thread to avoid GUI freezing
-        self.root.after(100, lambda: self.get_bot_response(user_message))
+        # Hand the bot call to the worker pool so the Tk loop keeps running
+        self.request_id += 1
+        self.cancel_event = threading.Event()
+        self.set_generating(True)
+        self.executor.submit(self.get_bot_response, self.request_id, self.cancel_event, self.bot, user_message)
+
+    def get_bot_response(self, request_id, cancel_event, bot, user_message):
+        """Run the bot on a worker thread and post its output to the result queue"""
+        # A cancelled request may still be unwinding; never drive one bot from two threads
+        with self.bot_lock:
+            if cancel_event.is_set():
+                return
+            self.results.put(('start', request_id, None))
+            stream = bot.process_input_stream(user_message)
+            try:
+                for chunk in stream:
+                    if cancel_event.is_set():
+                        return
+                    self.results.put(('chunk', request_id, chunk))
+                self.results.put(('done', request_id, bot.last_time_to_first_token))
+            except LLMError as e:
+                self.results.put(('error', request_id, describe_error(e)))
+            except Exception as e:
+                self.results.put(('error', request_id, f"Sorry, I encountered an error: {str(e)}\nPlease try again."))
+            finally:
+                stream.close()
 
-    def get_bot_response(self, user_message):
-        """Get bot response and update GUI"""
+    def poll_results(self):
+        """Drain worker results on the Tk loop; stale (cancelled) requests are dropped"""
+        chunks = []
         try:
-            response = self.bot.process_input(user_message)
-            self.display_bot_message(response)
-        except Exception as e:
-            error_msg = f"Sorry, I encountered an error: {str(e)}\nPlease try again."
-            self.display_bot_message(error_msg)
-        finally:
-            # Re-enable input
+            for _ in range(MAX_RESULTS_PER_POLL):
+                kind, request_id, payload = self.results.get_nowait()
+                if request_id != self.request_id:
+                    continue
+                if kind == 'chunk':
+                    chunks.append(payload)
+                    continue
+                if chunks:
+                    self.append_bot_chunk("".join(chunks))
+                    chunks = []
+                if kind == 'start':
+                    self.begin_bot_message()
+                elif kind == 'done':
+                    self.finish_bot_message(payload)
+                    self.set_generating(False)
+                elif kind == 'error':
+                    self.append_bot_chunk(payload)
+                    self.finish_bot_message()
+                    self.set_generating(False)
+        except queue.Empty:
+            pass
+        if chunks:
+            self.append_bot_chunk("".join(chunks))
+
+        if self.generating:
+            self.generating_frame = (self.generating_frame + 1) % 60
+            dots = "." * (self.generating_frame // 15 + 1)
+            self.hint_label.config(text=f"⏳ TravelGenie is generating{dots}")
+        self.root.after(POLL_INTERVAL_MS, self.poll_results)
+
+    def set_generating(self, generating):
+        """Toggle the visible "generating" state of the input controls"""
+        self.generating = generating
+        if generating:
+            self.send_button.config(state='disabled', text='Generating...')
+            self.cancel_button.config(state='normal')
+            self.user_input.config(state='disabled')
+        else:
             self.send_button.config(state='normal', text='Send ✈️')
+            self.cancel_button.config(state='disabled')
             self.user_input.config(state='normal')
+            self.hint_label.config(text="💡 Tip: Be specific about your preferences for better recommendations!")
             self.user_input.focus()
 
+    def cancel_request(self):
+        """Cancel the in-flight bot request, discarding anything it still produces"""
+        if not self.generating:
+            return
+        self.cancel_event.set()
+        self.request_id += 1
+        self.chat_display.insert(tk.END, "\n\n⏹ Generation cancelled.\n\n", "system")
+        self.chat_display.see(tk.END)
+        self.set_generating(False)
+
+    def on_close(self):
+        """Stop background work and close the window"""
+        self.cancel_request()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.root.destroy()
+
     def clear_chat(self):
         """Clear the chat display"""
         if messagebox.askyesno("Clear Chat", "Are you sure you want to clear the conversation?"):
@@ -377,13 +538,36 @@ find the best flights and accommodations, and provide local insights - all withi
         except Exception as e:
             messagebox.showerror("Save Error", f"Could not save file: {str(e)}")
 
+    def export_itinerary(self):
+        """Save the current itinerary as Markdown, HTML, JSON or text"""
+        if self.bot.itinerary is None:
+            messagebox.showinfo("Export Itinerary", "There is no itinerary to export yet.")
+            return
+        filetypes = [("Markdown", "*.md"), ("HTML", "*.html"), ("Text files", "*.txt")]
+        if self.bot.plan is not None:
+            filetypes.insert(2, ("JSON", "*.json"))
+        try:
+            filename = filedialog.asksaveasfilename(
+                defaultextension=".md",
+                filetypes=filetypes,
+                title="Export Itinerary"
+            )
+            if filename:
+                export_itinerary(filename, self.bot.itinerary.render(), self.bot.plan,
+                                 self.bot.user_info['budget'],
+                                 title=f"{self.bot.user_info['destination']} itinerary")
+                messagebox.showinfo("Exported", f"Itinerary saved to {filename}")
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Export Error", f"Could not export the itinerary: {str(e)}")
+
     def restart_planning(self):
         """Restart the planning process"""
         if messagebox.askyesno("New Trip", "Start planning a new trip? This will clear current progress."):
             # Reset bot state
-            load_dotenv()
-            api_key = os.getenv("GROQ_API_KEY")
-            self.bot = TravelPlannerBot(api_key)
+            self.cancel_request()
+            self.bot = TravelPlannerBot(client=self.client, cache=self.itinerary_cache,
+                                        sectioned=self.sectioned_var.get(),
+                                        structured=self.structured_var.get())
             
             # Reset progress
             self.current_step = 0
@@ -427,6 +611,13 @@ Need more help? Just ask me during our conversation!"""
 
 
 def main():
+    parser = argparse.ArgumentParser(description="TravelGenie desktop travel planner")
+    parser.add_argument('--requests-per-minute', type=float, default=REQUESTS_PER_MINUTE,
+                        help="client-side request rate limit; raise it to match your Groq plan")
+    parser.add_argument('--tokens-per-minute', type=float, default=TOKENS_PER_MINUTE,
+                        help="client-side token rate limit; raise it to match your Groq plan")
+    args = parser.parse_args()
+
     root = tk.Tk()
     
     # Set window icon (if available)
@@ -435,7 +626,8 @@ def main():
     except:
         pass
     
-    app = TravelPlannerGUI(root)
+    app = TravelPlannerGUI(root, ResiliencePolicy(requests_per_minute=args.requests_per_minute,
+                                                  tokens_per_minute=args.tokens_per_minute))
     
     # Center the window
     root.update_idletasks()